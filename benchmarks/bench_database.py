@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк слоя хранения: время публичных методов Database на базе реального объёма.
+
+База заполняется синтетическими данными (по умолчанию 50k групп, 500 сегментов,
+100k рассылок, 1M сообщений рассылок, журнал доставки и очередь повторов);
+объём масштабируется через --scale. Для каждого метода печатается медиана,
+минимум и p95 одного вызова. Кешируемые методы (сегменты, права админов)
+измеряются дважды: из кеша и с холодным кешем («[cold]»).
+
+Результаты сохраняются в JSON (--output), а с --baseline сравниваются с
+предыдущим прогоном: метод считается регрессией, если его медиана выросла
+больше чем на --threshold и больше чем на --min-delta-ms. При регрессии
+скрипт завершается с кодом 1. Доли миллисекунды заметно плавают от прогона
+к прогону, поэтому сравнивать стоит прогоны на одной и той же ненагруженной
+машине; для самых быстрых методов устойчивее --metric min_ms.
+
+Запуск:
+    python benchmarks/bench_database.py --scale 0.1                      # быстрый прогон
+    python benchmarks/bench_database.py --output before.json
+    python benchmarks/bench_database.py --output after.json --baseline before.json
+    python benchmarks/bench_database.py --compare before.json after.json # только сравнить
+    python benchmarks/bench_database.py --db /tmp/bench.db --only get_groups  # база переиспользуется
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import CACHE_ADMINS, CACHE_SEGMENTS, DELIVERY_PENDING, DELIVERY_SENT, Database
+
+# Объёмы при --scale 1
+VOLUMES = {
+    "groups": 50_000,
+    "segments": 500,
+    "broadcasts": 100_000,
+    "broadcast_messages": 1_000_000,
+    "deliveries": 200_000,
+    "pending_retries": 1_000,
+    "admins": 20,
+    "fsm_sessions": 1_000,
+}
+# Число админов не зависит от размера базы
+UNSCALED = {"admins"}
+# Сообщений на одну отправленную рассылку (рассылки с сообщениями — самые свежие)
+MESSAGES_PER_BROADCAST = 100
+CHAT_BASE = -1001000000000
+NOW = datetime(2025, 6, 1, 12, 0)
+
+
+def chat_id(index: int) -> int:
+    return CHAT_BASE - index
+
+
+async def seed(db: Database, volumes: Dict[str, int]):
+    """Заполняет базу рекурсивными CTE: миллион строк вставляется за секунды"""
+    g, s, b = volumes["groups"], volumes["segments"], volumes["broadcasts"]
+    per = min(MESSAGES_PER_BROADCAST, g)
+    seq = "WITH RECURSIVE seq(x) AS (SELECT 0 UNION ALL SELECT x + 1 FROM seq WHERE x < ? - 1)"
+    async with db.transaction() as conn:
+        await conn.execute(f"{seq} INSERT INTO lists(id, name) SELECT x + 1, 'Сегмент ' || x FROM seq", (s,))
+        await conn.execute(
+            f"{seq} INSERT INTO groups(chat_id, title) SELECT ? - x, 'Группа ' || x FROM seq", (g, CHAT_BASE)
+        )
+        # 90% групп в одном сегменте, каждая пятая — ещё в одном, остальные не привязаны
+        await conn.execute(
+            f"{seq} INSERT OR IGNORE INTO list_groups(list_id, group_id) "
+            "SELECT x % ? + 1, ? - x FROM seq WHERE x % 10 != 0", (g, s, CHAT_BASE)
+        )
+        await conn.execute(
+            f"{seq} INSERT OR IGNORE INTO list_groups(list_id, group_id) "
+            "SELECT (x * 7 + 3) % ? + 1, ? - x FROM seq WHERE x % 5 = 1", (g, s, CHAT_BASE)
+        )
+        # Старые рассылки отправлены, каждая десятая удалена; последние 200 запланированы
+        # (половина уже просрочена); у части свежих отправленных есть срок автоудаления
+        await conn.execute(
+            f"""{seq} INSERT INTO broadcasts(id, list_id, content_type, content, date, scheduled_at, sent,
+                                            source_chat_id, source_message_id, auto_delete_at, deleted)
+            SELECT x + 1, x % ? + 1, 'text', 'Рассылка ' || x,
+                   datetime(?, '-' || (? - x) || ' minutes'),
+                   CASE WHEN x >= ? - 200 THEN datetime(?, (x - (? - 100)) || ' minutes') END,
+                   CASE WHEN x >= ? - 200 THEN 0 ELSE 1 END,
+                   1, x + 1,
+                   CASE WHEN x BETWEEN ? - 2200 AND ? - 201 AND x % 7 = 0
+                        THEN datetime(?, (x - (? - 1200)) || ' minutes') END,
+                   CASE WHEN x < ? - 200 AND x % 10 = 0 THEN 1 ELSE 0 END
+            FROM seq""",
+            (b, s, NOW.isoformat(" "), b, b, NOW.isoformat(" "), b, b, b, b, NOW.isoformat(" "), b, b),
+        )
+        await conn.execute(
+            f"""{seq} INSERT INTO broadcast_messages(broadcast_id, chat_id, message_id)
+            SELECT ? - 200 - x / ?, ? - x % ?, x + 1 FROM seq""",
+            (volumes["broadcast_messages"], b, per, CHAT_BASE, per),
+        )
+        # Журнал доставки свежих рассылок; у самой свежей часть чатов не досланы
+        await conn.execute(
+            f"""{seq} INSERT INTO broadcast_deliveries(broadcast_id, chat_id, status, message_id)
+            SELECT ? - 200 - x / ?, ? - x % ?,
+                   CASE WHEN x < ? / 2 THEN '{DELIVERY_PENDING}' ELSE '{DELIVERY_SENT}' END, x + 1
+            FROM seq""",
+            (volumes["deliveries"], b, per, CHAT_BASE, per, per),
+        )
+        await conn.execute(
+            f"""{seq} INSERT INTO pending_retries(action, broadcast_id, chat_id, message_id, attempts, next_attempt_at)
+            SELECT 'send', ? - 200 - x / ?, ? - x % ?, NULL, x % 5, ? + x FROM seq""",
+            (volumes["pending_retries"], b, per, CHAT_BASE, per, NOW.timestamp() - 500),
+        )
+        await conn.execute(
+            f"{seq} INSERT INTO admins(user_id, username, super_admin) SELECT 1000 + x, 'admin' || x, x = 0 FROM seq",
+            (volumes["admins"],),
+        )
+        await conn.execute(
+            f"""{seq} INSERT INTO fsm_storage(key, state, data, updated_at)
+            SELECT '1:' || x || ':' || x || '::default', 'MenuState:main', '{{}}', ? FROM seq""",
+            (volumes["fsm_sessions"], time.time()),
+        )
+        await conn.execute(
+            "CREATE TABLE IF NOT EXISTS bench_meta(key TEXT PRIMARY KEY, value TEXT)"
+        )
+        await conn.execute(
+            "INSERT OR REPLACE INTO bench_meta(key, value) VALUES ('volumes', ?)", (json.dumps(volumes),)
+        )
+    db._cache_changed(CACHE_SEGMENTS)
+    db._cache_changed(CACHE_ADMINS)
+
+
+async def seeded_volumes(db: Database) -> Optional[Dict[str, int]]:
+    try:
+        row = await db._fetchone("SELECT value FROM bench_meta WHERE key = 'volumes'")
+    except sqlite3.OperationalError:
+        return None
+    return json.loads(row[0]) if row else None
+
+
+class Case(NamedTuple):
+    name: str
+    call: Callable[[int], Awaitable[Any]]
+    setup: Optional[Callable[[int], Awaitable[Any]]] = None
+
+
+def build_cases(db: Database, volumes: Dict[str, int]) -> List[Case]:
+    g, s, b = volumes["groups"], volumes["segments"], volumes["broadcasts"]
+    list_id = s // 2
+    group = chat_id(g // 3)
+    recent = b - 200  # самая свежая отправленная рассылка: есть сообщения и журнал
+    # Записи, создаваемые бенчмарком, не пересекаются с засеянными и с прошлыми прогонами на --db
+    run = int(time.time())
+    new_ids = {"group": CHAT_BASE - 10 * g - (run % 1000) * 10_000}
+
+    async def cold_segments(_):
+        db._invalidate_cache(CACHE_SEGMENTS)
+
+    async def cold_admins(_):
+        db._invalidate_cache(CACHE_ADMINS)
+
+    async def new_list(i):
+        await db.create_list(f"bench-{run}-{i}")
+        return (await db.get_list_by_name(f"bench-{run}-{i}"))[0]
+
+    async def create_then_delete_list(i):
+        list_ids[i] = await new_list(i)
+
+    async def add_bench_group(i):
+        await db.add_group(new_ids["group"] - i, f"bench {i}")
+
+    async def new_broadcast(i):
+        broadcast_ids[i] = await db.record_broadcast(list_id, "text", f"bench {i}", source_chat_id=1, source_message_id=i)
+
+    list_ids: Dict[int, int] = {}
+    broadcast_ids: Dict[int, int] = {}
+    fsm_batch = [(f"bench:{n}", "MenuState:main", "{}", time.time()) for n in range(100)]
+    ledger = [chat_id(n) for n in range(min(1000, g))]
+
+    return [
+        # Сегменты и группы
+        Case("get_lists", lambda i: db.get_lists()),
+        Case("get_lists[cold]", lambda i: db.get_lists(), cold_segments),
+        Case("get_list_by_name", lambda i: db.get_list_by_name(f"Сегмент {list_id}")),
+        Case("get_groups_in_list", lambda i: db.get_groups_in_list(list_id)),
+        Case("get_groups_in_list[cold]", lambda i: db.get_groups_in_list(list_id), cold_segments),
+        Case("get_groups_in_list_detailed", lambda i: db.get_groups_in_list_detailed(list_id)),
+        Case("get_all_groups", lambda i: db.get_all_groups()),
+        Case("get_unassigned_groups", lambda i: db.get_unassigned_groups()),
+        Case("get_groups_with_lists", lambda i: db.get_groups_with_lists()),
+        Case("get_group_current_list", lambda i: db.get_group_current_list(group)),
+        Case("get_group_segments", lambda i: db.get_group_segments(group)),
+        # Рассылки
+        Case("get_recent_broadcasts", lambda i: db.get_recent_broadcasts(3)),
+        Case("get_recent_broadcasts_with_message_count", lambda i: db.get_recent_broadcasts_with_message_count(30)),
+        Case("get_last_broadcast_id", lambda i: db.get_last_broadcast_id()),
+        Case("get_broadcast_messages", lambda i: db.get_broadcast_messages(recent)),
+        Case("get_broadcast_message_count", lambda i: db.get_broadcast_message_count(recent)),
+        Case("get_due_broadcasts", lambda i: db.get_due_broadcasts(NOW)),
+        Case("get_due_auto_deletions", lambda i: db.get_due_auto_deletions(NOW)),
+        Case("get_broadcast_deadlines", lambda i: db.get_broadcast_deadlines()),
+        Case("get_broadcast_deadlines[one]", lambda i: db.get_broadcast_deadlines(b)),
+        # Журнал доставки и повторы
+        Case("get_interrupted_broadcasts", lambda i: db.get_interrupted_broadcasts()),
+        Case("get_undelivered_chats", lambda i: db.get_undelivered_chats(recent)),
+        Case("count_deliveries", lambda i: db.count_deliveries(recent, DELIVERY_SENT)),
+        Case("get_due_retries", lambda i: db.get_due_retries(NOW.timestamp())),
+        Case("get_next_retry_time", lambda i: db.get_next_retry_time()),
+        # Админы и FSM
+        Case("is_admin", lambda i: db.is_admin(1005)),
+        Case("is_admin[cold]", lambda i: db.is_admin(1005), cold_admins),
+        Case("is_super_admin", lambda i: db.is_super_admin(1000)),
+        Case("get_all_admins", lambda i: db.get_all_admins()),
+        Case("get_fsm_records", lambda i: db.get_fsm_records()),
+        # Запись
+        Case("create_list", lambda i: db.create_list(f"bench-create-{run}-{i}")),
+        Case("delete_list", lambda i: db.delete_list(list_ids.pop(i)), create_then_delete_list),
+        Case("add_group", add_bench_group),
+        Case("assign_group_to_list", lambda i: db.assign_group_to_list(new_ids["group"] - i, list_id)),
+        Case("remove_group_from_list", lambda i: db.remove_group_from_list(new_ids["group"] - i, list_id)),
+        Case("delete_group", lambda i: db.delete_group(new_ids["group"] - i)),
+        Case("record_broadcast", new_broadcast),
+        Case("set_broadcast_schedule", lambda i: db.set_broadcast_schedule(broadcast_ids[i], NOW + timedelta(days=1), 1, i)),
+        Case("set_broadcast_auto_delete", lambda i: db.set_broadcast_auto_delete(broadcast_ids[i], NOW + timedelta(days=2))),
+        Case("update_broadcast_text_content", lambda i: db.update_broadcast_text_content(broadcast_ids[i], f"edited {i}")),
+        Case("create_delivery_ledger[1000]", lambda i: db.create_delivery_ledger(broadcast_ids[i], ledger)),
+        Case("mark_delivery_sent", lambda i: db.mark_delivery_sent(broadcast_ids[i], ledger[0], i)),
+        Case("record_broadcast_message", lambda i: db.record_broadcast_message(broadcast_ids[i], ledger[1], i)),
+        Case("mark_broadcast_as_sent", lambda i: db.mark_broadcast_as_sent(broadcast_ids[i])),
+        Case("mark_broadcast_as_deleted", lambda i: db.mark_broadcast_as_deleted(broadcast_ids[i])),
+        Case("add_pending_retry", lambda i: db.add_pending_retry("send", broadcast_ids[i], group, None, 0, NOW.timestamp(), None)),
+        Case("add_admin", lambda i: db.add_admin(900000 + i, "bench")),
+        Case("remove_admin", lambda i: db.remove_admin(900000 + i)),
+        Case("save_fsm_records[100]", lambda i: db.save_fsm_records(fsm_batch, [])),
+    ]
+
+
+async def run_case(case: Case, min_iterations: int, max_iterations: int, budget: float) -> Dict[str, Any]:
+    timings: List[float] = []
+    spent = 0.0
+    i = 0
+    while i < max_iterations and (i < min_iterations or spent < budget):
+        if case.setup:
+            await case.setup(i)
+        started = time.perf_counter()
+        await case.call(i)
+        elapsed = time.perf_counter() - started
+        timings.append(elapsed * 1000)
+        spent += elapsed
+        i += 1
+    timings.sort()
+    return {
+        "median_ms": round(statistics.median(timings), 4),
+        "min_ms": round(timings[0], 4),
+        "p95_ms": round(timings[min(len(timings) - 1, int(0.95 * len(timings)))], 4),
+        "iterations": len(timings),
+    }
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float, min_delta_ms: float, metric: str = "median_ms") -> int:
+    """Печатает сравнение метрики (медиана или минимум) и возвращает число регрессий"""
+    old, new = baseline["results"], current["results"]
+    if baseline.get("volumes") != current.get("volumes"):
+        print(f"⚠️  Объёмы данных различаются: {baseline.get('volumes')} vs {current.get('volumes')}")
+    regressions = 0
+    print(f"\n{'метод':<45} {'было, мс':>10} {'стало, мс':>10} {'изменение':>10}")
+    for name in sorted(set(old) | set(new)):
+        if name not in old or name not in new:
+            print(f"{name:<45} {'—' if name not in old else old[name][metric]:>10} "
+                  f"{'—' if name not in new else new[name][metric]:>10}")
+            continue
+        before, after = old[name][metric], new[name][metric]
+        change = (after - before) / before if before else 0.0
+        mark = ""
+        if change > threshold and after - before > min_delta_ms:
+            mark = "  ❌ регрессия"
+            regressions += 1
+        elif change < -threshold and before - after > min_delta_ms:
+            mark = "  ✅ быстрее"
+        print(f"{name:<45} {before:>10.3f} {after:>10.3f} {change:>+9.0%}{mark}")
+    print(f"\nРегрессий: {regressions} ({metric}, порог {threshold:.0%}, не меньше {min_delta_ms} мс)")
+    return regressions
+
+
+async def run(args) -> Dict[str, Any]:
+    volumes = {
+        name: count if name in UNSCALED else max(1, int(count * args.scale))
+        for name, count in VOLUMES.items()
+    }
+    tmpdir = None
+    path = args.db
+    if not path:
+        tmpdir = tempfile.TemporaryDirectory()
+        path = os.path.join(tmpdir.name, "bench.db")
+    db = Database(path)
+    await db.init()
+    try:
+        existing = await seeded_volumes(db)
+        if existing is None:
+            started = time.perf_counter()
+            await seed(db, volumes)
+            print(f"База заполнена за {time.perf_counter() - started:.1f} с: {volumes}")
+        else:
+            volumes = existing
+            print(f"Используется заполненная база {path}: {volumes}")
+
+        results = {}
+        for case in build_cases(db, volumes):
+            if args.only and not any(part in case.name for part in args.only):
+                continue
+            results[case.name] = await run_case(case, args.min_iterations, args.max_iterations, args.budget)
+            r = results[case.name]
+            print(f"{case.name:<45} median {r['median_ms']:>9.3f} мс  min {r['min_ms']:>9.3f}  "
+                  f"p95 {r['p95_ms']:>9.3f}  (n={r['iterations']})")
+    finally:
+        await db.close()
+        if tmpdir is not None:
+            tmpdir.cleanup()
+    return {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "volumes": volumes,
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=float, default=1.0, help="множитель объёмов данных")
+    parser.add_argument("--db", default=None, help="файл базы; заполненная база переиспользуется (запись в неё остаётся)")
+    parser.add_argument("--only", nargs="+", default=None, help="только методы, содержащие эти подстроки")
+    parser.add_argument("--min-iterations", type=int, default=5)
+    parser.add_argument("--max-iterations", type=int, default=200)
+    parser.add_argument("--budget", type=float, default=1.0, help="секунд на один метод")
+    parser.add_argument("--output", default=None, help="куда сохранить результаты (JSON)")
+    parser.add_argument("--baseline", default=None, help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"), help="только сравнить два JSON")
+    parser.add_argument("--threshold", type=float, default=0.25, help="рост медианы, считающийся регрессией")
+    parser.add_argument("--min-delta-ms", type=float, default=0.1, help="игнорировать изменения меньше этого")
+    parser.add_argument("--metric", choices=("median_ms", "min_ms"), default="median_ms", help="что сравнивать")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        with open(args.compare[1]) as f:
+            current = json.load(f)
+        sys.exit(1 if compare(baseline, current, args.threshold, args.min_delta_ms, args.metric) else 0)
+
+    current = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены в {args.output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        sys.exit(1 if compare(baseline, current, args.threshold, args.min_delta_ms, args.metric) else 0)
+
+
+if __name__ == "__main__":
+    main()
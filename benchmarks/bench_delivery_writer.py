@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк записи результатов доставки: построчный record_broadcast_message
+(INSERT + commit на каждое сообщение) против буферизованного DeliveryWriter.
+
+Запуск:
+    python benchmarks/bench_delivery_writer.py
+    python benchmarks/bench_delivery_writer.py --sizes 10000 100000 --batch 500
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database, DELIVERY_IN_FLIGHT
+
+
+async def fresh_db(directory: str, name: str, rows: int):
+    db = Database(os.path.join(directory, name))
+    await db.init()
+    cursor = await db.conn.execute(
+        "INSERT INTO broadcasts(list_id, content_type, content) VALUES (1, 'text', 'bench')"
+    )
+    broadcast_id = cursor.lastrowid
+    await db.create_delivery_ledger(broadcast_id, list(range(rows)))
+    return db, broadcast_id
+
+
+async def bench_per_row(directory: str, rows: int) -> float:
+    db, broadcast_id = await fresh_db(directory, f"per_row_{rows}.db", rows)
+    start = time.perf_counter()
+    for chat_id in range(rows):
+        await db.record_broadcast_message(broadcast_id, chat_id, chat_id + 1)
+    elapsed = time.perf_counter() - start
+    await db.close()
+    return elapsed
+
+
+async def bench_buffered(directory: str, rows: int, batch: int) -> float:
+    db, broadcast_id = await fresh_db(directory, f"buffered_{rows}.db", rows)
+    start = time.perf_counter()
+    async with db.delivery_writer(max_batch=batch) as writer:
+        for chat_id in range(rows):
+            await writer.set_status(broadcast_id, chat_id, DELIVERY_IN_FLIGHT)
+            await writer.mark_sent(broadcast_id, chat_id, chat_id + 1)
+    elapsed = time.perf_counter() - start
+    await db.close()
+    return elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--batch", type=int, default=500)
+    args = parser.parse_args()
+
+    print(f"{'доставок':>10} | {'построчно, строк/с':>20} | {'пачками, строк/с':>18} | {'ускорение':>9}")
+    print("-" * 68)
+    with tempfile.TemporaryDirectory() as directory:
+        for rows in args.sizes:
+            per_row = await bench_per_row(directory, rows)
+            buffered = await bench_buffered(directory, rows, args.batch)
+            print(
+                f"{rows:>10} | {rows / per_row:>20.0f} | {rows / buffered:>18.0f} | {per_row / buffered:>8.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
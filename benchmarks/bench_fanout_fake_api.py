@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Нагрузочная проверка рассылки на локальном fake Bot API (tools/fake_bot_api.py).
+
+Скрипт создаёт временную базу с N синтетическими группами, направляет бота
+на fake API через TELEGRAM_API_URL и отправляет рассылку настоящим
+send_broadcast_by_id из broadcasting.py (тот же FanoutEngine, журнал доставки и очередь
+повторов). С --delete затем удаляет её через delete_broadcast_messages
+(с --emergency — как экстренное удаление, с приоритетом в общем лимите).
+
+Отчёт: пропускная способность, задержка одного вызова Bot API (p50/p99),
+разбивка ошибок и итоговые статусы журнала доставки.
+
+Запуск:
+    python benchmarks/bench_fanout_fake_api.py --groups 1000
+    python benchmarks/bench_fanout_fake_api.py --groups 5000 --rate 200 --concurrency 100 \\
+        --latency-ms 60 --max-rps 150 --kicked-ratio 0.02 --missing-ratio 0.01 --delete
+    python benchmarks/bench_fanout_fake_api.py --api-url http://127.0.0.1:8081   # внешний fake API
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+
+from aiogram.exceptions import TelegramRetryAfter
+
+from database import CACHE_SEGMENTS
+from helpers import percentiles
+from fake_bot_api import add_options_arguments, options_from_args, start_server
+
+
+class ApiCallRecorder:
+    """Мидлварь сессии aiogram: время и исход каждого вызова Bot API"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.outcomes = Counter()
+
+    async def __call__(self, make_request, bot, method):
+        name = method.__api_method__
+        started = time.perf_counter()
+        try:
+            response = await make_request(bot, method)
+        except TelegramRetryAfter as e:
+            self.outcomes[f"{name}: 429 retry_after={e.retry_after}"] += 1
+            raise
+        except Exception as e:
+            self.outcomes[f"{name}: {type(e).__name__}: {getattr(e, 'message', e)}"] += 1
+            raise
+        finally:
+            self.latencies[name].append(time.perf_counter() - started)
+        self.outcomes[f"{name}: ok"] += 1
+        return response
+
+    def reset(self):
+        self.latencies.clear()
+        self.outcomes.clear()
+
+
+def report(title: str, elapsed: float, recorder: ApiCallRecorder, method: str):
+    calls = recorder.latencies.get(method, [])
+    print(f"\n{title}")
+    print(f"  время: {elapsed:.2f} с, вызовов {method}: {len(calls)} ({len(calls) / elapsed:.1f}/с)")
+    p50, p99 = percentiles(calls, (0.5, 0.99))
+    print(f"  задержка вызова: p50 {p50 * 1000:.1f} мс, p99 {p99 * 1000:.1f} мс")
+    for outcome, count in recorder.outcomes.most_common():
+        print(f"  {outcome}: {count}")
+
+
+async def seed(db, groups: int) -> int:
+    """Сегмент из groups синтетических групп и рассылка в него; возвращает id рассылки"""
+    chat_ids = [-1001000000000 - i for i in range(groups)]
+    async with db.transaction() as conn:
+        cursor = await conn.execute("INSERT INTO lists(name) VALUES ('load-test')")
+        list_id = cursor.lastrowid
+        await conn.executemany(
+            "INSERT INTO groups(chat_id, title) VALUES (?, ?)",
+            [(chat_id, f"Load {chat_id}") for chat_id in chat_ids],
+        )
+        await conn.executemany(
+            "INSERT INTO list_groups(list_id, group_id) VALUES (?, ?)",
+            [(list_id, chat_id) for chat_id in chat_ids],
+        )
+        cursor = await conn.execute(
+            "INSERT INTO broadcasts(list_id, content_type, content, source_chat_id, source_message_id) "
+            "VALUES (?, 'text', 'load test', 1, 1)",
+            (list_id,),
+        )
+        broadcast_id = cursor.lastrowid
+    db._cache_changed(CACHE_SEGMENTS)
+    return broadcast_id
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--groups", type=int, default=1000, help="синтетических групп в сегменте")
+    parser.add_argument("--rate", type=float, default=None, help="FANOUT_RATE_PER_SEC (по умолчанию из окружения)")
+    parser.add_argument("--concurrency", type=int, default=None, help="FANOUT_CONCURRENCY (по умолчанию из окружения)")
+    parser.add_argument("--delete", action="store_true", help="после рассылки удалить её сообщения")
+    parser.add_argument("--emergency", action="store_true", help="удалять как экстренное удаление (с приоритетом)")
+    parser.add_argument("--api-url", default=None, help="внешний fake API вместо встроенного")
+    parser.add_argument("-v", "--verbose", action="store_true", help="не глушить логи бота")
+    add_options_arguments(parser)
+    args = parser.parse_args()
+
+    runner = None
+    api_url = args.api_url
+    if not api_url:
+        runner, api_url = await start_server(options_from_args(args))
+
+    tmpdir = tempfile.TemporaryDirectory()
+    # loader.py читает настройки при импорте, поэтому окружение задаётся до него
+    os.environ.update({
+        "BOT_TOKEN": "123456:fake-load-test",
+        "DATABASE_PATH": os.path.join(tmpdir.name, "load.db"),
+        "TELEGRAM_API_URL": api_url,
+        "ADMIN_IDS": "",
+    })
+    if args.rate is not None:
+        os.environ["FANOUT_RATE_PER_SEC"] = str(args.rate)
+    if args.concurrency is not None:
+        os.environ["FANOUT_CONCURRENCY"] = str(args.concurrency)
+
+    import broadcasting
+    import loader
+
+    from logging_setup import setup_logging
+
+    setup_logging("INFO" if args.verbose else "CRITICAL", os.getenv("LOG_FORMAT", "text"))
+    recorder = ApiCallRecorder()
+    loader.bot.session.middleware(recorder)
+
+    await loader.db.init()
+    try:
+        broadcast_id = await seed(loader.db, args.groups)
+        print(
+            f"Групп: {args.groups}, API: {api_url}, "
+            f"fanout: rate={loader.fanout.bucket.rate}/с, concurrency={loader.fanout.concurrency}"
+        )
+
+        started = time.perf_counter()
+        await broadcasting.send_broadcast_by_id(broadcast_id)
+        report("Рассылка (copyMessage)", time.perf_counter() - started, recorder, "copyMessage")
+        statuses = await loader.db._fetchall(
+            "SELECT status, COUNT(*) FROM broadcast_deliveries WHERE broadcast_id = ? GROUP BY status",
+            (broadcast_id,),
+        )
+        print("  журнал доставки: " + ", ".join(f"{status}: {count}" for status, count in statuses))
+
+        if args.delete:
+            recorder.reset()
+            started = time.perf_counter()
+            run = await broadcasting.delete_broadcast_messages(broadcast_id, emergency=args.emergency)
+            report(
+                f"Удаление (deleteMessage), удалено {run.deleted} из {run.total}, "
+                f"в очереди повторов {run.queued}, не удалено {run.failed}",
+                time.perf_counter() - started, recorder, "deleteMessage",
+            )
+    finally:
+        await loader.db.close()
+        await loader.bot.session.close()
+        if runner is not None:
+            await runner.cleanup()
+        tmpdir.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
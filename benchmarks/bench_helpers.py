@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарки чистых функций бота (helpers.py), которые выполняются в цикле
+событий на каждый ввод админа: разбор инструкций по сегментам, транслит,
+поиск группы по названию, часы/минуты автоудаления, нарезка длинных сообщений
+и разбор даты/времени (быстрый путь schedule_parser и dateparser).
+
+Данные синтетические: 1k сегментов, 50k названий групп, длинные инструкции.
+Время одного вызова — медиана нескольких серий (минимум выводится для справки).
+
+Результат сравнивается с сохранённым базовым прогоном
+(benchmarks/baselines/helpers.json). Чтобы сравнение не зависело от скорости
+машины, каждое время делится на время эталонной нагрузки (калибровки),
+замеренной непосредственно до и после этой функции: фоновая нагрузка на
+общей машине меняется за прогон в разы, и общая калибровка её не ловит.
+Допуск у каждой функции свой: не меньше --threshold и не меньше
+удвоенного разброса её серий в базе и в текущем прогоне.
+
+Функция, ставшая медленнее допуска, считается регрессией, и скрипт
+завершается с кодом 1. На машине с сильным фоновым шумом (общая виртуалка)
+--report-only только выводит сравнение.
+
+Запуск:
+    python benchmarks/bench_helpers.py                    # замер и сравнение с базой, код 1 при регрессии
+    python benchmarks/bench_helpers.py --report-only      # только отчёт, всегда код 0
+    python benchmarks/bench_helpers.py --save-baseline    # обновить базовый прогон
+    python benchmarks/bench_helpers.py --only search      # только часть функций
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+import timeit
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from helpers import (
+    extract_hours,
+    extract_minutes,
+    parse_datetime_ru,
+    parse_segment_instructions,
+    percentiles,
+    search_groups,
+    split_message,
+    translit_ru,
+)
+from schedule_parser import parse_datetime_fast
+
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baselines", "helpers.json")
+BASE_TIME = datetime(2025, 6, 1, 12, 0)
+WORDS = ["школа", "гимназия", "лицей", "колледж", "клиенты", "партнёры", "сотрудники", "москва",
+         "казань", "север", "юг", "родители", "учителя", "выпускники", "новости", "чат"]
+
+
+def synthetic_data(seed: int = 1) -> Dict[str, object]:
+    rnd = random.Random(seed)
+    segments = [f"{rnd.choice(WORDS).capitalize()} {rnd.choice(WORDS)} {n}" for n in range(1000)]
+    titles = [f"{rnd.choice(WORDS).capitalize()} №{n} {rnd.choice(WORDS)} {rnd.choice(WORDS)}" for n in range(50_000)]
+    groups = [(-1001000000000 - n, title) for n, title in enumerate(titles)]
+    verbs = ["добавь в", "удали из", "включи в", "убери из", "плюс", "минус"]
+    instructions = ", ".join(f"{rnd.choice(verbs)} {rnd.choice(segments)}" for _ in range(40))
+    listing = "\n".join(f"{n}. {title} — сегменты: {rnd.choice(segments)}" for n, title in enumerate(titles[:5000], 1))
+    time_inputs = ["2", "2ч", "3 часа", "через 5 часов", "40", "40 мин", "через 15 минут", "завтра", "12.05 10:00"] * 100
+    return {
+        "segments": segments,
+        "titles": titles,
+        "groups": groups,
+        "instructions": instructions,
+        "listing": listing,
+        "time_inputs": time_inputs,
+    }
+
+
+def build_cases(data: Dict[str, object]) -> List[Tuple[str, Callable[[], object]]]:
+    segments, titles, groups = data["segments"], data["titles"], data["groups"]
+    instructions, listing, time_inputs = data["instructions"], data["listing"], data["time_inputs"]
+    return [
+        ("parse_segment_instructions[1k segments, 40 ops]", lambda: parse_segment_instructions(instructions, segments)),
+        ("parse_segment_instructions[1k segments, short]", lambda: parse_segment_instructions("добавь в " + segments[500], segments)),
+        ("translit_ru[50k titles]", lambda: [translit_ru(t) for t in titles]),
+        ("search_groups[50k, no match]", lambda: search_groups(groups, "несуществующая")),
+        ("search_groups[50k, translit, limit 5]", lambda: search_groups(groups, "shkola", limit=5)),
+        ("search_groups[50k, all matches]", lambda: search_groups(groups, "№")),
+        ("extract_hours[900 inputs]", lambda: [extract_hours(t) for t in time_inputs]),
+        ("extract_minutes[900 inputs]", lambda: [extract_minutes(t) for t in time_inputs]),
+        ("split_message[5k lines]", lambda: split_message(listing)),
+        ("parse_datetime_ru[DD.MM.YYYY HH:MM]", lambda: parse_datetime_ru("15.03.2026 14:30", BASE_TIME)),
+        ("parse_datetime_ru[завтра в HH:MM]", lambda: parse_datetime_ru("завтра в 10:00", BASE_TIME)),
+        ("parse_datetime_ru[через N часов]", lambda: parse_datetime_ru("через 2 часа", BASE_TIME)),
+        ("parse_datetime_ru[сегодня в HH:MM]", lambda: parse_datetime_ru("сегодня в 18:45", BASE_TIME)),
+        ("parse_datetime_fast[DD.MM.YYYY HH:MM]", lambda: parse_datetime_fast("15.03.2026 14:30", BASE_TIME)),
+        ("parse_datetime_fast[завтра в HH:MM]", lambda: parse_datetime_fast("завтра в 10:00", BASE_TIME)),
+        ("parse_datetime_fast[через N часов]", lambda: parse_datetime_fast("через 2 часа", BASE_TIME)),
+        ("parse_datetime_fast[нераспознанное]", lambda: parse_datetime_fast("в пятницу в 9:00", BASE_TIME)),
+    ]
+
+
+def calibrate() -> float:
+    """Эталонная нагрузка на чистом Python (строки, регулярки, словари), мс; один замер"""
+    pattern = re.compile(r"(\d+)\s*(\w+)")
+    texts = [f"через {n} минут {WORDS[n % len(WORDS)]}" for n in range(2000)]
+
+    def workload():
+        counts: Dict[str, int] = {}
+        for text in texts:
+            m = pattern.search(text.lower())
+            if m:
+                counts[m.group(2)] = counts.get(m.group(2), 0) + int(m.group(1))
+        return counts
+
+    return min(timeit.repeat(workload, number=10, repeat=3)) / 10 * 1000
+
+
+def measure(fn: Callable[[], object], repeat: int) -> Dict[str, float]:
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    samples = sorted(t / number * 1000 for t in timer.repeat(repeat=repeat, number=number))
+    median = percentiles(samples, (0.5,))[0]
+    return {
+        "min_ms": round(samples[0], 5),
+        "median_ms": round(median, 5),
+        # Относительный разброс серий: из него считается допуск при сравнении
+        "spread": round((samples[-1] - samples[0]) / median, 4) if median else 0.0,
+        "number": number,
+    }
+
+
+def compare(baseline: Dict, current: Dict, threshold: float) -> int:
+    print(f"\nСравнение с базой от {baseline.get('created_at')} (с поправкой на скорость машины)")
+    regressions = 0
+    for name, result in current["results"].items():
+        if name not in baseline["results"]:
+            print(f"  {name:<50} новый")
+            continue
+        base = baseline["results"][name]
+        # Старые базы хранили только минимум и общую калибровку
+        scale = result["calibration_ms"] / base.get("calibration_ms", baseline["calibration_ms"])
+        expected = base.get("median_ms", base["min_ms"]) * scale
+        change = result["median_ms"] / expected - 1 if expected else 0.0
+        tolerance = max(threshold, 2 * max(base.get("spread", 0.0), result["spread"]))
+        mark = ""
+        if change > tolerance:
+            mark = "  ❌ регрессия"
+            regressions += 1
+        elif change < -tolerance:
+            mark = "  ✅ быстрее"
+        print(f"  {name:<50} {expected:>10.4f} → {result['median_ms']:>10.4f} мс {change:>+7.0%} (×{scale:.2f}, допуск {tolerance:.0%}){mark}")
+    print(f"Регрессий: {regressions} (порог не ниже {threshold:.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="файл базового прогона")
+    parser.add_argument("--save-baseline", action="store_true", help="записать результат как новую базу")
+    parser.add_argument("--threshold", type=float, default=0.5, help="наименьшее замедление, считающееся регрессией")
+    parser.add_argument("--repeat", type=int, default=7, help="серий на функцию")
+    parser.add_argument("--report-only", action="store_true", help="не завершаться с кодом 1 при регрессии")
+    parser.add_argument("--only", nargs="+", default=None, help="только функции, содержащие эти подстроки")
+    parser.add_argument("--output", default=None, help="сохранить результат в JSON")
+    args = parser.parse_args()
+
+    # Первый вызов dateparser загружает данные локали — измеряем его отдельно, без сравнения
+    started = time.perf_counter()
+    parse_datetime_ru("завтра в 10:00", BASE_TIME)
+    first_parse_ms = (time.perf_counter() - started) * 1000
+
+    data = synthetic_data()
+    print(f"Первый вызов dateparser: {first_parse_ms:.1f} мс")
+
+    # Калибровка до и после каждой функции: поправка берётся по соседним
+    # замерам, общая — медиана всех (для справки и старых баз)
+    calibrations = [calibrate()]
+    results = {}
+    for name, fn in build_cases(data):
+        if args.only and not any(part in name for part in args.only):
+            continue
+        results[name] = measure(fn, args.repeat)
+        calibrations.append(calibrate())
+        results[name]["calibration_ms"] = round((calibrations[-2] + calibrations[-1]) / 2, 5)
+        print(f"  {name:<50} {results[name]['median_ms']:>10.4f} мс  (min {results[name]['min_ms']:.4f}, разброс {results[name]['spread']:.0%})")
+    calibration_ms = percentiles(calibrations, (0.5,))[0]
+    print(f"Калибровка: {calibration_ms:.3f} мс (медиана {len(calibrations)} замеров, от {min(calibrations):.3f} до {max(calibrations):.3f})")
+
+    current = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "calibration_ms": round(calibration_ms, 5),
+        "first_dateparser_call_ms": round(first_parse_ms, 1),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+        print(f"Базовый прогон сохранён в {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"Базового прогона нет ({args.baseline}); создайте его с --save-baseline")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(baseline, current, args.threshold)
+    if regressions and args.report_only:
+        print("--report-only: регрессии не влияют на код возврата")
+    sys.exit(1 if regressions and not args.report_only else 0)
+
+
+if __name__ == "__main__":
+    main()
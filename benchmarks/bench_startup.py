@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Время запуска бота: стоимость импорта по модулям и время до первого опроса.
+
+1. Импорт. В отдельном процессе выполняется `python -X importtime` с импортом
+   bot.py и всех модулей роутеров из handlers.ROUTER_MODULES, и для каждого модуля
+   берётся накопленное время импорта (вместе с его зависимостями). Печатаются
+   модули проекта и самые дорогие сторонние пакеты верхнего уровня.
+2. Время до первого опроса. Поднимается локальный fake Bot API
+   (tools/fake_bot_api.py), `python bot.py` запускается на него с пустой
+   временной базой, и замеряется время от старта процесса до первого
+   getMe и первого getUpdates. Для сравнения замеряется запуск пустого
+   интерпретатора.
+
+Каждый замер повторяется --runs раз, печатаются минимум и медиана.
+
+Запуск:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 5 --top 20 --output startup.json
+    python benchmarks/bench_startup.py --skip-poll     # только стоимость импорта
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import signal
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+
+from fake_bot_api import FakeApiOptions, start_server
+
+# importlib.import_module (как в setup_routers) не попадает в отчёт -X importtime,
+# поэтому модули роутеров импортируются через __import__
+IMPORT_CODE = "import bot, handlers; [__import__(name) for name in handlers.ROUTER_MODULES]"
+IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)$")
+
+
+def project_modules() -> set:
+    """Модули проекта: *.py в корне и пакет handlers"""
+    names = {name[:-3] for name in os.listdir(ROOT) if name.endswith(".py")}
+    names.add("handlers")
+    return names
+
+
+def bot_env(tmpdir: str, api_url: Optional[str] = None) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        "BOT_TOKEN": "123456:fake-startup-bench",
+        "DATABASE_PATH": os.path.join(tmpdir, "startup.db"),
+        "ADMIN_IDS": "",
+        "BOT_MODE": "polling",
+    })
+    if api_url:
+        env["TELEGRAM_API_URL"] = api_url
+    return env
+
+
+async def measure_imports(env: Dict[str, str]) -> Dict[str, Tuple[int, int]]:
+    """{модуль: (уровень вложенности, накопленное время в мкс)} одного прогона -X importtime"""
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, "-X", "importtime", "-c", IMPORT_CODE,
+        cwd=ROOT, env=env, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+    )
+    _, stderr = await proc.communicate()
+    if proc.returncode != 0:
+        raise RuntimeError(f"импорт bot.py завершился с кодом {proc.returncode}:\n{stderr.decode()[-2000:]}")
+    result = {}
+    for line in stderr.decode().splitlines():
+        m = IMPORTTIME_RE.match(line)
+        if m:
+            result[m.group(4)] = (len(m.group(3)) // 2, int(m.group(2)))
+    return result
+
+
+async def wait_for_calls(api, started: float, methods: List[str], timeout: float) -> Dict[str, float]:
+    """Ждёт первых вызовов методов; возвращает {метод: секунды от started}"""
+    deadline = time.monotonic() + timeout
+    while not all(m in api.first_calls for m in methods):
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"за {timeout:.0f} с бот не вызвал {', '.join(m for m in methods if m not in api.first_calls)}")
+        await asyncio.sleep(0.005)
+    return {m: api.first_calls[m] - started for m in methods}
+
+
+async def measure_first_poll(tmpdir: str, timeout: float) -> Dict[str, float]:
+    runner, url = await start_server(FakeApiOptions(latency_ms=0, jitter_ms=0))
+    api = runner.app["api"]
+    db_path = os.path.join(tmpdir, "startup.db")
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    started = time.monotonic()
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, "bot.py",
+        cwd=ROOT, env=bot_env(tmpdir, url), stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        return await wait_for_calls(api, started, ["getMe", "getUpdates"], timeout)
+    except TimeoutError:
+        proc.kill()
+        _, stderr = await proc.communicate()
+        print(stderr.decode()[-2000:], file=sys.stderr)
+        raise
+    finally:
+        if proc.returncode is None:
+            proc.send_signal(signal.SIGINT)
+            try:
+                await asyncio.wait_for(proc.communicate(), 10)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.communicate()
+        await runner.cleanup()
+
+
+async def measure_interpreter() -> float:
+    started = time.monotonic()
+    proc = await asyncio.create_subprocess_exec(sys.executable, "-c", "pass")
+    await proc.wait()
+    return time.monotonic() - started
+
+
+def summary(values: List[float]) -> Dict[str, float]:
+    return {"min": round(min(values), 4), "median": round(statistics.median(values), 4)}
+
+
+def report_imports(runs: List[Dict[str, Tuple[int, int]]], top: int) -> Dict[str, Dict[str, float]]:
+    own = project_modules()
+    cumulative = defaultdict(list)
+    for run in runs:
+        for name, (level, us) in run.items():
+            cumulative[name].append(us / 1000)
+        # Модули верхнего уровня не пересекаются, их сумма — весь импорт
+        cumulative["<итого>"].append(sum(us for level, us in run.values() if level == 0) / 1000)
+    stats = {name: summary(values) for name, values in cumulative.items()}
+
+    def is_own(name: str) -> bool:
+        return name.split(".")[0] in own
+
+    print(f"\nИмпорт ({IMPORT_CODE}), накопленное время, мс: min / median")
+    print(f"  {'итого':<40} {stats['<итого>']['min']:>9.1f} / {stats['<итого>']['median']:.1f}")
+    print("  Модули проекта:")
+    for name in sorted((n for n in stats if is_own(n)), key=lambda n: -stats[n]["min"]):
+        print(f"    {name:<38} {stats[name]['min']:>9.1f} / {stats[name]['median']:.1f}")
+    print(f"  Сторонние пакеты верхнего уровня (топ {top}):")
+    third_party = [n for n in stats if not is_own(n) and "." not in n and not n.startswith("<")]
+    for name in sorted(third_party, key=lambda n: -stats[n]["min"])[:top]:
+        print(f"    {name:<38} {stats[name]['min']:>9.1f} / {stats[name]['median']:.1f}")
+    return stats
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="повторов каждого замера")
+    parser.add_argument("--top", type=int, default=12, help="сколько сторонних пакетов показать")
+    parser.add_argument("--timeout", type=float, default=60, help="сколько ждать первого опроса, с")
+    parser.add_argument("--skip-poll", action="store_true", help="не запускать бота, только импорт")
+    parser.add_argument("--output", default=None, help="сохранить результат в JSON")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.TemporaryDirectory()
+    result = {"created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": sys.version.split()[0]}
+    try:
+        interpreter = [await measure_interpreter() for _ in range(args.runs)]
+        result["interpreter_s"] = summary(interpreter)
+        print(f"Пустой интерпретатор: {result['interpreter_s']['min'] * 1000:.0f} мс")
+
+        # Первый прогон прогревает кеш файлов и .pyc и в замер не входит
+        await measure_imports(bot_env(tmpdir.name))
+        runs = [await measure_imports(bot_env(tmpdir.name)) for _ in range(args.runs)]
+        result["imports_ms"] = report_imports(runs, args.top)
+
+        if not args.skip_poll:
+            polls = [await measure_first_poll(tmpdir.name, args.timeout) for _ in range(args.runs)]
+            result["first_get_me_s"] = summary([p["getMe"] for p in polls])
+            result["first_get_updates_s"] = summary([p["getUpdates"] for p in polls])
+            print("\nОт запуска процесса bot.py, с: min / median")
+            print(f"  первый getMe        {result['first_get_me_s']['min']:>7.3f} / {result['first_get_me_s']['median']:.3f}")
+            print(f"  первый getUpdates   {result['first_get_updates_s']['min']:>7.3f} / {result['first_get_updates_s']['median']:.3f}")
+    finally:
+        tmpdir.cleanup()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,344 @@
+"""
+Отправка и удаление рассылок: журнал доставки, очередь повторов
+и планировщик публикаций и автоудаления.
+"""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from config import DELETE_PROGRESS_INTERVAL, LOG_TRACEBACK_SAMPLES, SCHEDULER_MAX_CONCURRENT_JOBS
+from database import (
+    DELETION_DELETED,
+    DELETION_FAILED,
+    DELETION_PENDING,
+    DELIVERY_IN_FLIGHT,
+    DELIVERY_PENDING,
+    DELIVERY_FAILED,
+    DELIVERY_SENT,
+)
+from helpers import now_msk_naive
+from loader import bot, db, fanout, retry_queue
+from logging_setup import ChatErrorSummary
+from metrics import DELETIONS, MESSAGES
+from retry_queue import ACTION_SEND, ACTION_DELETE
+from scheduler import DeadlineScheduler
+
+logger = logging.getLogger(__name__)
+
+
+# Рассылки, которые отправляются прямо сейчас (защита от параллельного запуска
+# одной и той же рассылки планировщиком, /resend и возобновлением после сбоя)
+_running_broadcasts: Dict[int, asyncio.Task] = {}
+
+# Рассылки, которые сейчас удаляются: их отправка останавливается перед следующим copy_message
+_cancelled_broadcasts: set = set()
+
+
+async def send_broadcast_by_id(broadcast_id: int):
+    """Отправляет рассылку во все группы и отмечает её как отправленную.
+
+    Получатели сначала фиксируются в журнале доставки, поэтому после сбоя
+    рассылка продолжается только по тем чатам, куда пост ещё не дошёл.
+    Если рассылка уже отправляется, вызов дожидается окончания этой отправки.
+    """
+    task = _running_broadcasts.get(broadcast_id)
+    if task is not None:
+        logger.info(f"Broadcast {broadcast_id} is already being sent, waiting for it")
+        # Отмена ожидающего не должна прерывать чужую отправку
+        await asyncio.shield(task)
+        return
+    task = asyncio.create_task(_send_broadcast(broadcast_id))
+    _running_broadcasts[broadcast_id] = task
+    try:
+        await task
+    finally:
+        _running_broadcasts.pop(broadcast_id, None)
+
+
+async def _send_broadcast(broadcast_id: int):
+    # Получаем данные рассылки
+    cursor = await db.conn.execute(
+        "SELECT list_id, source_chat_id, source_message_id, deleted FROM broadcasts WHERE id = ?",
+        (broadcast_id,)
+    )
+    row = await cursor.fetchone()
+    if not row:
+        logger.error(f"Broadcast {broadcast_id} not found")
+        return
+    list_id, source_chat_id, source_message_id, deleted = row
+    if deleted or broadcast_id in _cancelled_broadcasts:
+        logger.info(f"Broadcast {broadcast_id} is deleted, not sending")
+        return
+
+    # Получаем все группы сегмента и фиксируем их в журнале до начала отправки
+    groups = await db.get_groups_in_list(list_id)
+    await db.create_delivery_ledger(broadcast_id, groups)
+    targets = await db.get_undelivered_chats(broadcast_id)
+
+    # Результаты доставки пишутся пачками и гарантированно сбрасываются в конце рассылки
+    async with db.delivery_writer() as writer:
+        async def send_one(chat_id: int):
+            await writer.set_status(broadcast_id, chat_id, DELIVERY_IN_FLIGHT)
+            sent_message = await bot.copy_message(chat_id, from_chat_id=source_chat_id, message_id=source_message_id)
+            await writer.mark_sent(broadcast_id, chat_id, sent_message.message_id)
+
+        result = await fanout.run(targets, send_one, stop=lambda: broadcast_id in _cancelled_broadcasts)
+        queued = 0
+        # Ошибки по чатам сворачиваются в одну строку лога на рассылку
+        errors = ChatErrorSummary(logger, "отправка", broadcast_id, traceback_samples=LOG_TRACEBACK_SAMPLES)
+        for chat_id, e in result.failed:
+            if await retry_queue.schedule(ACTION_SEND, broadcast_id, chat_id, e):
+                queued += 1
+                await writer.set_status(broadcast_id, chat_id, DELIVERY_PENDING, str(e))
+                errors.add(chat_id, e, "retry")
+                MESSAGES.inc(result="retry", error=type(e).__name__)
+            else:
+                await writer.set_status(broadcast_id, chat_id, DELIVERY_FAILED, str(e))
+                errors.add(chat_id, e)
+                MESSAGES.inc(result="failed", error=type(e).__name__)
+        errors.flush()
+    sent = result.sent
+    MESSAGES.inc(sent, result="sent", error="")
+    delivered = await db.count_deliveries(broadcast_id, DELIVERY_SENT)
+    # Отмечаем как отправленную, если хоть куда-то ушло или досылается через очередь повторов.
+    # Если же ни одна доставка не удалась, но и делать больше нечего (все чаты
+    # отказали насовсем или сегмент пуст), рассылка тоже завершена: иначе
+    # планировщик повторял бы её без конца
+    if delivered > 0 or queued > 0:
+        await db.mark_broadcast_as_sent(broadcast_id)
+    elif broadcast_id not in _cancelled_broadcasts and not await db.get_undelivered_chats(broadcast_id):
+        failed = await db.count_deliveries(broadcast_id, DELIVERY_FAILED)
+        await db.mark_broadcast_as_sent(broadcast_id)
+        logger.warning(
+            f"Broadcast {broadcast_id} finished without deliveries: {failed} groups failed",
+            extra={"broadcast_id": broadcast_id, "failed": failed},
+        )
+    logger.info(
+        f"Broadcast {broadcast_id} sent to {sent} groups "
+        f"({delivered} delivered in total), {queued} queued for retry",
+        extra={"broadcast_id": broadcast_id, "sent": sent, "delivered": delivered, "queued": queued},
+    )
+
+
+async def resume_interrupted_broadcasts():
+    """Продолжает рассылки, прерванные остановкой бота, по журналу доставки"""
+    for b_id in await db.get_interrupted_broadcasts():
+        logger.info(f"Resuming interrupted broadcast {b_id}")
+        await send_broadcast_by_id(b_id)
+
+
+async def retry_send(broadcast_id: int, chat_id: int, message_id: Optional[int]):
+    """Повторная отправка рассылки в один чат из очереди повторов"""
+    cursor = await db.conn.execute(
+        "SELECT source_chat_id, source_message_id, deleted FROM broadcasts WHERE id = ?",
+        (broadcast_id,)
+    )
+    row = await cursor.fetchone()
+    if not row or row[2]:
+        # Рассылку удалили, пока повтор ждал своей очереди
+        return
+    source_chat_id, source_message_id, _ = row
+    sent_message = await bot.copy_message(chat_id, from_chat_id=source_chat_id, message_id=source_message_id)
+    await db.mark_delivery_sent(broadcast_id, chat_id, sent_message.message_id)
+    MESSAGES.inc(result="sent", error="")
+
+
+async def retry_send_give_up(broadcast_id: int, chat_id: int, message_id: Optional[int], error: BaseException):
+    await db.set_delivery_status(broadcast_id, chat_id, DELIVERY_FAILED, str(error))
+    MESSAGES.inc(result="failed", error=type(error).__name__)
+
+
+async def retry_delete(broadcast_id: int, chat_id: int, message_id: Optional[int]):
+    """Повторное удаление сообщения рассылки из очереди повторов"""
+    await bot.delete_message(chat_id, message_id)
+    await db.set_deletion_status(broadcast_id, chat_id, DELETION_DELETED)
+    DELETIONS.inc(result="deleted", error="")
+
+
+async def retry_delete_give_up(broadcast_id: int, chat_id: int, message_id: Optional[int], error: BaseException):
+    await db.set_deletion_status(broadcast_id, chat_id, DELETION_FAILED, str(error))
+    DELETIONS.inc(result="failed", error=type(error).__name__)
+
+
+retry_queue.register(ACTION_SEND, retry_send, on_give_up=retry_send_give_up)
+retry_queue.register(ACTION_DELETE, retry_delete, on_give_up=retry_delete_give_up)
+
+
+class BroadcastDeletion:
+    """Ход удаления одной рассылки: счётчики для сообщения о прогрессе и итог.
+
+    errors — ошибки по ходу удаления; после завершения они разделены
+    на queued (отложено в очередь повторов) и failed (не удалось окончательно).
+    """
+
+    def __init__(self, broadcast_id: int, emergency: bool):
+        self.broadcast_id = broadcast_id
+        self.emergency = emergency
+        self.total = 0
+        self.deleted = 0
+        self.errors = 0
+        self.queued = 0
+        self.failed = 0
+        self.finished = False
+        self.started = time.monotonic()
+        self.listeners: List[Callable[["BroadcastDeletion"], Awaitable[None]]] = []
+        self._done = asyncio.Event()
+
+    @property
+    def done(self) -> int:
+        return self.deleted + self.errors
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    async def notify(self):
+        for listener in list(self.listeners):
+            try:
+                await listener(self)
+            except Exception as e:
+                logger.warning(f"Broadcast {self.broadcast_id}: deletion progress callback failed: {e}")
+
+
+# Рассылки, которые удаляются прямо сейчас: повторный вызов присоединяется к идущему удалению
+_running_deletions: Dict[int, BroadcastDeletion] = {}
+
+
+async def delete_broadcast_messages(
+    broadcast_id: int,
+    emergency: bool = False,
+    on_progress: Optional[Callable[[BroadcastDeletion], Awaitable[None]]] = None,
+) -> BroadcastDeletion:
+    """Удаляет сообщения рассылки параллельно через движок рассылки и помечает её удалённой.
+
+    emergency=True — ручное удаление: токены общего лимита Bot API достаются
+    ему раньше идущих рассылок и автоудалений. on_progress вызывается каждые
+    DELETE_PROGRESS_INTERVAL секунд, пока идёт удаление.
+
+    Исход по каждому чату пишется в broadcast_messages.delete_status, поэтому
+    повторный вызов удаляет только оставшиеся сообщения. Временные ошибки
+    уходят в очередь повторов.
+    """
+    run = _running_deletions.get(broadcast_id)
+    if run is not None:
+        # Например, автоудаление уже идёт: экстренный вызов поднимает его приоритет
+        run.emergency = run.emergency or emergency
+        if on_progress:
+            run.listeners.append(on_progress)
+        await run._done.wait()
+        return run
+
+    run = BroadcastDeletion(broadcast_id, emergency)
+    if on_progress:
+        run.listeners.append(on_progress)
+    _running_deletions[broadcast_id] = run
+    try:
+        await _delete_broadcast(run)
+    finally:
+        run.finished = True
+        _running_deletions.pop(broadcast_id, None)
+        run._done.set()
+    return run
+
+
+async def _delete_broadcast(run: BroadcastDeletion):
+    broadcast_id = run.broadcast_id
+    # Сначала останавливаем отправку: новые копии не уходят, а уже отправленные
+    # попадают в broadcast_messages до того, как берётся список на удаление
+    _cancelled_broadcasts.add(broadcast_id)
+    try:
+        await db.mark_broadcast_as_deleted(broadcast_id)
+        sending = _running_broadcasts.get(broadcast_id)
+        if sending is not None:
+            logger.info(f"Broadcast {broadcast_id} is being sent, stopping it before deletion")
+            # Отправка завершается сама и сбрасывает журнал доставки; отмена ожидающего её не прерывает
+            await asyncio.wait([sending])
+        # Недосланные копии больше не нужны, а отложенные удаления выполняются прямо сейчас
+        await db.delete_pending_retries_for_broadcast(broadcast_id)
+        await _delete_messages(run)
+    finally:
+        _cancelled_broadcasts.discard(broadcast_id)
+    logger.info(
+        f"Broadcast {broadcast_id} deleted from {run.deleted} of {run.total} groups in {run.elapsed:.1f}s, "
+        f"{run.queued} queued for retry, {run.failed} failed",
+        extra={
+            "broadcast_id": broadcast_id,
+            "emergency": run.emergency,
+            "deleted": run.deleted,
+            "total": run.total,
+            "queued": run.queued,
+            "failed": run.failed,
+        },
+    )
+
+
+async def _delete_messages(run: BroadcastDeletion, max_passes: int = 3):
+    broadcast_id = run.broadcast_id
+    attempted = set()
+    progress = asyncio.create_task(_report_progress(run))
+    errors = ChatErrorSummary(logger, "удаление", broadcast_id, traceback_samples=LOG_TRACEBACK_SAMPLES)
+    try:
+        # Повтор из очереди, начатый до отмены, может записать сообщение уже после
+        # первого списка — такие строки подбирают следующие проходы
+        for _ in range(max_passes):
+            messages = [m for m in await db.get_undeleted_messages(broadcast_id) if m not in attempted]
+            if not messages:
+                break
+            attempted.update(messages)
+            run.total += len(messages)
+            await _delete_pass(run, messages, errors)
+    finally:
+        progress.cancel()
+        errors.flush()
+
+
+async def _delete_pass(run: BroadcastDeletion, messages: List[Tuple[int, int]], errors: ChatErrorSummary):
+    broadcast_id = run.broadcast_id
+    deleted_before = run.deleted
+    async with db.delivery_writer() as writer:
+        async def delete_one(message):
+            chat_id, msg_id = message
+            try:
+                await bot.delete_message(chat_id, msg_id)
+            except Exception:
+                run.errors += 1
+                raise
+            run.deleted += 1
+            await writer.set_deletion_status(broadcast_id, chat_id, DELETION_DELETED)
+
+        result = await fanout.run(messages, delete_one, key=lambda message: message[0], urgent=lambda: run.emergency)
+        for (chat_id, msg_id), e in result.failed:
+            if await retry_queue.schedule(ACTION_DELETE, broadcast_id, chat_id, e, message_id=msg_id):
+                run.queued += 1
+                await writer.set_deletion_status(broadcast_id, chat_id, DELETION_PENDING, str(e))
+                errors.add(chat_id, e, "retry")
+                DELETIONS.inc(result="retry", error=type(e).__name__)
+            else:
+                run.failed += 1
+                await writer.set_deletion_status(broadcast_id, chat_id, DELETION_FAILED, str(e))
+                errors.add(chat_id, e)
+                DELETIONS.inc(result="failed", error=type(e).__name__)
+    DELETIONS.inc(run.deleted - deleted_before, result="deleted", error="")
+
+
+async def _report_progress(run: BroadcastDeletion):
+    while True:
+        await asyncio.sleep(DELETE_PROGRESS_INTERVAL)
+        await run.notify()
+
+
+# Планировщик спит до ближайшего срока; изменения расписания в БД будят его сразу
+scheduler = DeadlineScheduler(
+    db,
+    now=now_msk_naive,
+    publish=send_broadcast_by_id,
+    auto_delete=delete_broadcast_messages,
+    max_concurrent_jobs=SCHEDULER_MAX_CONCURRENT_JOBS,
+)
+db.add_schedule_listener(scheduler.notify)
+
+
+async def broadcast_scheduler():
+    """Фоновая задача, запускающая запланированные рассылки и автоудаление точно в срок"""
+    await scheduler.run()
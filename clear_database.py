@@ -16,23 +16,33 @@ async def clear_all_data(db: Database):
     """Полная очистка всех данных из базы. ВНИМАНИЕ: необратимая операция!"""
     print("🗑️  Очищаю базу данных...")
     
-    # Очищаем таблицы в правильном порядке (с учётом FK)
-    await db.conn.execute("DELETE FROM broadcast_messages")
-    print("   ✅ Очищена таблица broadcast_messages")
+    async with db.transaction():
+        # Очищаем таблицы в правильном порядке (с учётом FK).
+        # Сначала очередь повторов: иначе отложенные отправки и удаления сработают после очистки
+        await db.conn.execute("DELETE FROM pending_retries")
+        print("   ✅ Очищена таблица pending_retries")
     
-    await db.conn.execute("DELETE FROM broadcasts")
-    print("   ✅ Очищена таблица broadcasts")
+        await db.conn.execute("DELETE FROM broadcast_deliveries")
+        print("   ✅ Очищена таблица broadcast_deliveries")
     
-    await db.conn.execute("DELETE FROM list_groups")
-    print("   ✅ Очищена таблица list_groups")
+        await db.conn.execute("DELETE FROM fsm_storage")
+        print("   ✅ Очищена таблица fsm_storage")
     
-    await db.conn.execute("DELETE FROM groups")
-    print("   ✅ Очищена таблица groups")
+        await db.conn.execute("DELETE FROM broadcast_messages")
+        print("   ✅ Очищена таблица broadcast_messages")
     
-    await db.conn.execute("DELETE FROM lists")
-    print("   ✅ Очищена таблица lists")
+        await db.conn.execute("DELETE FROM broadcasts")
+        print("   ✅ Очищена таблица broadcasts")
+    
+        await db.conn.execute("DELETE FROM list_groups")
+        print("   ✅ Очищена таблица list_groups")
+    
+        await db.conn.execute("DELETE FROM groups")
+        print("   ✅ Очищена таблица groups")
+    
+        await db.conn.execute("DELETE FROM lists")
+        print("   ✅ Очищена таблица lists")
     
-    await db.conn.commit()
     print("🎉 База данных полностью очищена!")
 
 
@@ -60,6 +70,14 @@ async def get_database_stats(db: Database) -> dict:
     cursor = await db.conn.execute("SELECT COUNT(*) FROM broadcast_messages")
     stats['messages'] = (await cursor.fetchone())[0]
     
+    # Журнал доставки, очередь повторов и сохранённые диалоги
+    cursor = await db.conn.execute("SELECT COUNT(*) FROM broadcast_deliveries")
+    stats['deliveries'] = (await cursor.fetchone())[0]
+    cursor = await db.conn.execute("SELECT COUNT(*) FROM pending_retries")
+    stats['retries'] = (await cursor.fetchone())[0]
+    cursor = await db.conn.execute("SELECT COUNT(*) FROM fsm_storage")
+    stats['fsm'] = (await cursor.fetchone())[0]
+    
     return stats
 
 
@@ -74,6 +92,7 @@ def confirm_action() -> bool:
     print("• Все рассылки")
     print("• Вся история сообщений")
     print("• Все связи между группами и сегментами")
+    print("• Журнал доставки, очередь повторов и незавершённые диалоги")
     print("\n🚨 ЭТА ОПЕРАЦИЯ НЕОБРАТИМА!")
     print("="*60)
     
@@ -106,7 +125,7 @@ async def main():
         return
     
     # Инициализируем подключение к БД
-    db = Database(DATABASE_PATH)
+    db = Database(DATABASE_PATH, read_pool_size=0)
     await db.init()
     
     try:
@@ -119,6 +138,9 @@ async def main():
         print(f"   🔗 Связей: {stats['connections']}")
         print(f"   📬 Рассылок: {stats['broadcasts']}")
         print(f"   💬 Сообщений: {stats['messages']}")
+        print(f"   📒 Записей журнала доставки: {stats['deliveries']}")
+        print(f"   🔁 Повторов в очереди: {stats['retries']}")
+        print(f"   💭 Сохранённых диалогов: {stats['fsm']}")
         
         # Если база уже пустая
         total_records = sum(stats.values())
@@ -151,8 +173,7 @@ async def main():
     
     finally:
         # Закрываем соединение
-        if hasattr(db, 'conn') and db.conn:
-            await db.conn.close()
+        await db.close()
 
 
 if __name__ == "__main__":
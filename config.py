@@ -21,6 +21,66 @@ def parse_admin_ids():
 
 ADMIN_IDS = parse_admin_ids()
 DATABASE_PATH = os.getenv("DATABASE_PATH")
+# Другой сервер Bot API (локальный telegram-bot-api или tools/fake_bot_api.py для нагрузочных проверок)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")
+
+# Настройки SQLite: один пишущий и несколько читающих соединений в режиме WAL
+SQLITE_READ_POOL_SIZE = int(os.getenv("SQLITE_READ_POOL_SIZE", "2"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "16384"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(64 * 1024 * 1024)))
+
+# Настройки параллельной рассылки (лимит Bot API ~30 сообщений/с, ~20 сообщений/мин в одну группу)
+FANOUT_CONCURRENCY = int(os.getenv("FANOUT_CONCURRENCY", "20"))
+FANOUT_RATE_PER_SEC = float(os.getenv("FANOUT_RATE_PER_SEC", "28"))
+FANOUT_PER_CHAT_LIMIT = int(os.getenv("FANOUT_PER_CHAT_LIMIT", "20"))
+FANOUT_PER_CHAT_WINDOW = float(os.getenv("FANOUT_PER_CHAT_WINDOW", "60"))
+# Как часто обновлять сообщение с ходом ручного удаления рассылки, с
+DELETE_PROGRESS_INTERVAL = float(os.getenv("DELETE_PROGRESS_INTERVAL", "2"))
+
+# Повторы неудачных вызовов Bot API (429, сетевые ошибки, 5xx)
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "6"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "2"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "600"))
+
+# Сколько рассылок и автоудалений планировщик выполняет одновременно
+SCHEDULER_MAX_CONCURRENT_JOBS = int(os.getenv("SCHEDULER_MAX_CONCURRENT_JOBS", "4"))
+
+# Через сколько часов бездействия незавершённый диалог (состояние FSM) удаляется
+FSM_STATE_TTL_HOURS = float(os.getenv("FSM_STATE_TTL_HOURS", "24"))
+
+# Логи: уровень, формат (json — одна JSON-строка на запись, text — прежний текстовый)
+# и сколько полных трейсбеков каждого вида ошибки писать на одну рассылку
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").strip().lower()
+LOG_TRACEBACK_SAMPLES = int(os.getenv("LOG_TRACEBACK_SAMPLES", "1"))
+
+# Сторож цикла событий: как часто замерять задержку и с какой задержки считать цикл заблокированным
+LOOP_LAG_INTERVAL_MS = float(os.getenv("LOOP_LAG_INTERVAL_MS", "100"))
+LOOP_LAG_THRESHOLD_MS = float(os.getenv("LOOP_LAG_THRESHOLD_MS", "250"))
+
+# /perf: с какого времени обработки обновления писать его в лог как медленное и сколько последних замеров держать на обработчик
+PERF_SLOW_HANDLER_MS = float(os.getenv("PERF_SLOW_HANDLER_MS", "1000"))
+PERF_WINDOW = int(os.getenv("PERF_WINDOW", "500"))
+
+# Профилирование по команде: частота выборок /profile, предельная длительность сеанса, глубина стеков /memsnap
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+PROFILE_MAX_SECONDS = int(os.getenv("PROFILE_MAX_SECONDS", "300"))
+TRACEMALLOC_FRAMES = int(os.getenv("TRACEMALLOC_FRAMES", "25"))
+
+# Метрики в формате Prometheus: бот отдаёт /metrics на METRICS_HOST:METRICS_PORT (0 — не поднимать сервер)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# Режим получения обновлений: polling (по умолчанию) или webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling").strip().lower()
+# Публичный адрес, на который Telegram шлёт обновления; без него вебхук не регистрируется
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_MAX_CONCURRENCY = int(os.getenv("WEBHOOK_MAX_CONCURRENCY", "32"))
 
 # Настройки веб-интерфейса
 WEBAPP_USERNAME = os.getenv("WEBAPP_USERNAME")
@@ -1,163 +1,301 @@
+import asyncio
+import logging
+import time
 import aiosqlite
-from typing import Optional, List, Tuple
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, Optional, List, Tuple
 from datetime import datetime
 
+from metrics import DB_QUERY_SECONDS, instrument_methods
+from migrations import migrate
+from perf import note_db_call
+
+logger = logging.getLogger(__name__)
+
+# Статусы доставки рассылки в конкретный чат (таблица broadcast_deliveries)
+DELIVERY_PENDING = "pending"
+DELIVERY_IN_FLIGHT = "in_flight"
+DELIVERY_SENT = "sent"
+DELIVERY_FAILED = "failed"
+
+# Исход удаления сообщения рассылки в конкретном чате (broadcast_messages.delete_status;
+# NULL — удаление ещё не запускалось)
+DELETION_DELETED = "deleted"
+DELETION_PENDING = "pending"
+DELETION_FAILED = "failed"
+
+# Кеши в памяти; имена совпадают со счётчиками в таблице cache_versions
+CACHE_SEGMENTS = "segments"
+CACHE_ADMINS = "admins"
+
+
 class Database:
-    def __init__(self, path: str):
+    """Доступ к SQLite.
+
+    self.conn — единственное пишущее соединение: через него идут все
+    изменения и чтения, которым нужны ещё не зафиксированные данные.
+    Остальные чтения берут соединение из небольшого пула читателей:
+    в режиме WAL они не ждут писателя и не блокируют его.
+    read_pool_size=0 отключает пул — тогда всё идёт через self.conn.
+
+    Изменения выполняются внутри transaction(): методы, вызванные из уже
+    открытой транзакции, присоединяются к ней, и всё фиксируется одним коммитом.
+
+    Редко меняющиеся данные (сегменты и их состав, права админов) кешируются в памяти.
+    Свои изменения сбрасывают кеш сразу, изменения другого процесса
+    замечаются по PRAGMA data_version не реже раза в cache_check_interval секунд.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        read_pool_size: int = 2,
+        busy_timeout_ms: int = 5000,
+        cache_size_kb: int = 16384,
+        mmap_size: int = 0,
+        cache_check_interval: float = 1.0,
+    ):
         self.path = path
+        self.read_pool_size = max(0, read_pool_size)
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
         self.conn: Optional[aiosqlite.Connection] = None
-
-    async def init(self):
-        self.conn = await aiosqlite.connect(self.path)
-        # Включаем каскадное удаление внешних ключей
-        await self.conn.execute("PRAGMA foreign_keys = ON")
-        
-        # Проверяем и добавляем поле deleted если его нет
-        await self._migrate_add_deleted_field()
-        await self.conn.execute("""
-        CREATE TABLE IF NOT EXISTS lists (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT UNIQUE
-        )
-        """)
-        await self.conn.execute("""
-        CREATE TABLE IF NOT EXISTS groups (
-            chat_id INTEGER PRIMARY KEY,
-            title TEXT
-        )
-        """)
-        await self.conn.execute("""
-        CREATE TABLE IF NOT EXISTS list_groups (
-            list_id INTEGER,
-            group_id INTEGER,
-            PRIMARY KEY (list_id, group_id),
-            FOREIGN KEY (list_id) REFERENCES lists(id) ON DELETE CASCADE,
-            FOREIGN KEY (group_id) REFERENCES groups(chat_id) ON DELETE CASCADE
-        )
-        """)
-        await self.conn.execute("""
-        CREATE TABLE IF NOT EXISTS broadcasts (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            list_id INTEGER,
-            content_type TEXT,
-            content TEXT,
-            date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            scheduled_at TIMESTAMP,
-            sent INTEGER DEFAULT 0,
-            source_chat_id INTEGER,
-            source_message_id INTEGER,
-            auto_delete_at TIMESTAMP,
-            deleted INTEGER DEFAULT 0
-        )
-        """)
-        await self.conn.execute("""
-        CREATE TABLE IF NOT EXISTS broadcast_messages (
-            broadcast_id INTEGER,
-            chat_id INTEGER,
-            message_id INTEGER,
-            PRIMARY KEY (broadcast_id, chat_id)
-        )
-        """)
-        await self.conn.execute("""
-        CREATE TABLE IF NOT EXISTS admins (
-            user_id INTEGER PRIMARY KEY,
-            username TEXT,
-            first_name TEXT,
-            added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            added_by INTEGER,
-            super_admin INTEGER DEFAULT 0
-        )
-        """)
-        await self.conn.commit()
-        # Проверяем и добавляем поле super_admin если его нет
-        await self._migrate_add_super_admin_field()
-        # Проверяем и добавляем поля планирования рассылок если их нет
-        await self._migrate_add_schedule_fields()
-
-    async def _migrate_add_deleted_field(self):
-        """Миграция для добавления поля deleted в таблицу broadcasts"""
-        try:
-            # Проверяем, есть ли уже поле deleted
-            cursor = await self.conn.execute("PRAGMA table_info(broadcasts)")
-            columns = await cursor.fetchall()
-            column_names = [col[1] for col in columns]
-            
-            if 'deleted' not in column_names:
-                await self.conn.execute("ALTER TABLE broadcasts ADD COLUMN deleted INTEGER DEFAULT 0")
+        self._readers: List[aiosqlite.Connection] = []
+        self._idle_readers: Optional[asyncio.Queue] = None
+        # Пишущее соединение общее для всех задач: транзакции идут по очереди
+        self._write_lock = asyncio.Lock()
+        self._tx_owner: Optional[asyncio.Task] = None
+        self._after_commit: List[Callable[[], None]] = []
+        # Кеши: имя -> {ключ: значение}; поколение растёт при каждом сбросе
+        self.cache_check_interval = cache_check_interval
+        self._caches: Dict[str, Dict[Hashable, Any]] = {}
+        self._cache_generations: Dict[str, int] = {}
+        self._cache_versions: Dict[str, int] = {}
+        self._data_version: Optional[int] = None
+        self._cache_checked_at = 0.0
+        # Отдельное соединение только для PRAGMA data_version: оно само ничего
+        # не пишет, поэтому видит коммиты и нашего писателя, и других процессов
+        self._watcher: Optional[aiosqlite.Connection] = None
+        # Подписчики на изменение сроков публикации/автоудаления (планировщик)
+        self._schedule_listeners: List[Callable[[int], None]] = []
+
+    def add_schedule_listener(self, listener: Callable[[int], None]):
+        """Регистрирует функцию, которая вызывается с ID рассылки при изменении её расписания"""
+        self._schedule_listeners.append(listener)
+
+    def _schedule_changed(self, broadcast_id: int):
+        # Внутри транзакции планировщик узнаёт об изменении только после коммита:
+        # до него читатели ещё не видят новых сроков
+        if self._in_transaction():
+            self._after_commit.append(lambda: self._schedule_changed(broadcast_id))
+            return
+        for listener in self._schedule_listeners:
+            listener(broadcast_id)
+
+    def _in_transaction(self) -> bool:
+        return self._tx_owner is not None and self._tx_owner is asyncio.current_task()
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Единица работы: всё внутри фиксируется одним коммитом или откатывается.
+
+        Вложенные вызовы из той же задачи присоединяются к внешней транзакции,
+        поэтому методы Database можно свободно комбинировать:
+
+            async with db.transaction():
+                await db.create_list(name)
+                await db.assign_group_to_list(chat_id, list_id)
+
+        Другие задачи ждут завершения транзакции, прежде чем начать свою.
+        """
+        if self._in_transaction():
+            yield self.conn
+            return
+        started = time.perf_counter()
+        async with self._write_lock:
+            self._tx_owner = asyncio.current_task()
+            try:
+                if not self.conn.in_transaction:
+                    await self.conn.execute("BEGIN IMMEDIATE")
+                yield self.conn
                 await self.conn.commit()
-                print("✅ Поле 'deleted' добавлено в таблицу broadcasts")
-        except Exception as e:
-            print(f"❌ Ошибка миграции: {e}")
-
-    async def _migrate_add_schedule_fields(self):
-        """Миграция для добавления полей планирования в broadcasts"""
-        try:
-            cursor = await self.conn.execute("PRAGMA table_info(broadcasts)")
-            columns = await cursor.fetchall()
-            column_names = [col[1] for col in columns]
-            # scheduled_at
-            if 'scheduled_at' not in column_names:
-                await self.conn.execute("ALTER TABLE broadcasts ADD COLUMN scheduled_at TIMESTAMP")
-                print("✅ Поле 'scheduled_at' добавлено в таблицу broadcasts")
-            # sent flag
-            if 'sent' not in column_names:
-                await self.conn.execute("ALTER TABLE broadcasts ADD COLUMN sent INTEGER DEFAULT 0")
-                print("✅ Поле 'sent' добавлено в таблицу broadcasts")
-            # source_chat_id
-            if 'source_chat_id' not in column_names:
-                await self.conn.execute("ALTER TABLE broadcasts ADD COLUMN source_chat_id INTEGER")
-                print("✅ Поле 'source_chat_id' добавлено в таблицу broadcasts")
-            # source_message_id
-            if 'source_message_id' not in column_names:
-                await self.conn.execute("ALTER TABLE broadcasts ADD COLUMN source_message_id INTEGER")
-                print("✅ Поле 'source_message_id' добавлено в таблицу broadcasts")
-            # auto_delete_at
-            if 'auto_delete_at' not in column_names:
-                await self.conn.execute("ALTER TABLE broadcasts ADD COLUMN auto_delete_at TIMESTAMP")
-                print("✅ Поле 'auto_delete_at' добавлено в таблицу broadcasts")
-            await self.conn.commit()
-        except Exception as e:
-            print(f"❌ Ошибка миграции schedule_fields: {e}")
+            except BaseException:
+                self._after_commit.clear()
+                await self.conn.rollback()
+                raise
+            finally:
+                self._tx_owner = None
+                # Для /perf транзакция — одно обращение к БД, вместе с ожиданием блокировки
+                note_db_call(time.perf_counter() - started)
+        callbacks, self._after_commit = self._after_commit, []
+        for callback in callbacks:
+            callback()
+
+    async def _connect(self, read_only: bool = False) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(self.path)
+        # Ждём освобождения блокировки вместо мгновенного «database is locked»
+        await conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        # Отрицательное значение cache_size задаётся в килобайтах
+        await conn.execute(f"PRAGMA cache_size = {-int(self.cache_size_kb)}")
+        await conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        # Включаем каскадное удаление внешних ключей
+        await conn.execute("PRAGMA foreign_keys = ON")
+        if read_only:
+            await conn.execute("PRAGMA query_only = ON")
+        return conn
 
-    async def _migrate_add_super_admin_field(self):
-        """Миграция для добавления поля super_admin в таблицу admins"""
+    async def init(self):
+        self.conn = await self._connect()
+        # WAL: читатели (включая веб-интерфейс в другом процессе) не блокируют
+        # писателя; режим сохраняется в файле базы. В WAL synchronous=NORMAL
+        # не теряет целостность, а fsync делается только на контрольных точках
+        await self.conn.execute("PRAGMA journal_mode = WAL")
+        await self.conn.execute("PRAGMA synchronous = NORMAL")
+
+        # Схема: применяем только недостающие миграции (см. migrations.py)
+        await migrate(self.conn)
+        self._watcher = await self._connect(read_only=True)
+        await self._open_readers()
+
+    async def _open_readers(self):
+        self._idle_readers = asyncio.Queue()
+        for _ in range(self.read_pool_size):
+            reader = await self._connect(read_only=True)
+            self._readers.append(reader)
+            self._idle_readers.put_nowait(reader)
+
+    async def close(self):
+        """Закрывает пул читателей и пишущее соединение"""
+        for reader in self._readers:
+            await reader.close()
+        self._readers.clear()
+        self._idle_readers = None
+        if self._watcher is not None:
+            await self._watcher.close()
+            self._watcher = None
+        if self.conn is not None:
+            await self.conn.close()
+            self.conn = None
+
+    @asynccontextmanager
+    async def _read(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Соединение для чтения: свободный читатель из пула или self.conn,
+        если пула нет или идёт транзакция (она должна видеть свои изменения)"""
+        if not self._readers or self._in_transaction():
+            yield self.conn
+            return
+        reader = await self._idle_readers.get()
         try:
-            cursor = await self.conn.execute("PRAGMA table_info(admins)")
-            columns = await cursor.fetchall()
-            column_names = [col[1] for col in columns]
-            if 'super_admin' not in column_names:
-                await self.conn.execute("ALTER TABLE admins ADD COLUMN super_admin INTEGER DEFAULT 0")
-                await self.conn.commit()
-                print("✅ Поле 'super_admin' добавлено в таблицу admins")
-        except Exception as e:
-            print(f"❌ Ошибка миграции super_admin: {e}")
+            yield reader
+        finally:
+            self._idle_readers.put_nowait(reader)
+
+    async def _fetchall(self, sql: str, params=()) -> List[Tuple]:
+        async with self._read() as conn:
+            started = time.perf_counter()
+            try:
+                cursor = await conn.execute(sql, params)
+                return await cursor.fetchall()
+            finally:
+                self._note_read(started)
+
+    async def _fetchone(self, sql: str, params=()) -> Optional[Tuple]:
+        async with self._read() as conn:
+            started = time.perf_counter()
+            try:
+                cursor = await conn.execute(sql, params)
+                return await cursor.fetchone()
+            finally:
+                self._note_read(started)
+
+    def _note_read(self, started: float):
+        # Обращения к БД для /perf считаются по запросам, а не по методам: попадания
+        # в кеш и вложенные вызовы методов не учитываются. Чтение внутри
+        # транзакции входит в её время и отдельно не считается
+        if not self._in_transaction():
+            note_db_call(time.perf_counter() - started)
+
+    # ---- Кеши в памяти ---- #
+
+    def _invalidate_cache(self, name: str):
+        self._caches.pop(name, None)
+        self._cache_generations[name] = self._cache_generations.get(name, 0) + 1
+
+    def _cache_changed(self, name: str):
+        """Сбрасывает кеш после собственного изменения данных"""
+        self._invalidate_cache(name)
+        # До коммита другие задачи могут успеть закешировать старые данные — сбросим ещё раз
+        if self._in_transaction():
+            self._after_commit.append(lambda: self._invalidate_cache(name))
+
+    async def _sync_caches(self):
+        """Сбрасывает кеши, данные которых изменились в другом соединении или процессе"""
+        now = time.monotonic()
+        if self._watcher is None or now - self._cache_checked_at < self.cache_check_interval:
+            return
+        self._cache_checked_at = now
+        cursor = await self._watcher.execute("PRAGMA data_version")
+        (data_version,) = await cursor.fetchone()
+        if data_version == self._data_version:
+            return
+        self._data_version = data_version
+        # Что-то закоммичено; по счётчикам cache_versions узнаём, что именно
+        cursor = await self._watcher.execute("SELECT name, version FROM cache_versions")
+        for name, version in await cursor.fetchall():
+            if self._cache_versions.get(name) != version:
+                self._cache_versions[name] = version
+                self._invalidate_cache(name)
+
+    async def _cached(self, name: str, key: Hashable, load: Callable[[], Awaitable[Any]]) -> Any:
+        """Значение из кеша name по ключу key; при промахе — результат load()"""
+        if self._in_transaction():
+            # Транзакция должна видеть свои незафиксированные изменения
+            return await load()
+        await self._sync_caches()
+        cache = self._caches.get(name)
+        if cache is not None and key in cache:
+            return cache[key]
+        generation = self._cache_generations.get(name, 0)
+        value = await load()
+        # Если кеш сбросили, пока шёл запрос, результат мог устареть — не сохраняем
+        if self._cache_generations.get(name, 0) == generation:
+            self._caches.setdefault(name, {})[key] = value
+        return value
 
     async def create_list(self, name: str):
-        await self.conn.execute("INSERT OR IGNORE INTO lists(name) VALUES (?)", (name,))
-        await self.conn.commit()
+        async with self.transaction():
+            await self.conn.execute("INSERT OR IGNORE INTO lists(name) VALUES (?)", (name,))
+        self._cache_changed(CACHE_SEGMENTS)
 
     async def get_lists(self):
-        cursor = await self.conn.execute("SELECT id, name FROM lists")
-        return await cursor.fetchall()
+        rows = await self._cached(CACHE_SEGMENTS, "lists", lambda: self._fetchall("SELECT id, name FROM lists"))
+        return list(rows)
 
     async def get_list_by_name(self, name: str):
-        cursor = await self.conn.execute("SELECT id FROM lists WHERE name = ?", (name,))
-        return await cursor.fetchone()
+        # Сегментов немного: ищем по закешированному списку, а не отдельным запросом
+        for list_id, list_name in await self.get_lists():
+            if list_name == name:
+                return (list_id,)
+        return None
 
     async def add_group_to_list(self, list_name: str, chat_id: int, title: str):
-        lst = await self.get_list_by_name(list_name)
-        if not lst:
-            await self.create_list(list_name)
+        async with self.transaction():
             lst = await self.get_list_by_name(list_name)
-        list_id = lst[0]
-        await self.conn.execute("INSERT OR IGNORE INTO groups(chat_id, title) VALUES (?, ?)", (chat_id, title))
-        await self.conn.execute("INSERT OR IGNORE INTO list_groups(list_id, group_id) VALUES (?, ?)", (list_id, chat_id))
-        await self.conn.commit()
+            if not lst:
+                await self.create_list(list_name)
+                lst = await self.get_list_by_name(list_name)
+            list_id = lst[0]
+            await self.conn.execute("INSERT OR IGNORE INTO groups(chat_id, title) VALUES (?, ?)", (chat_id, title))
+            await self.conn.execute("INSERT OR IGNORE INTO list_groups(list_id, group_id) VALUES (?, ?)", (list_id, chat_id))
+        self._cache_changed(CACHE_SEGMENTS)
 
     async def get_groups_in_list(self, list_id: int):
-        cursor = await self.conn.execute("SELECT group_id FROM list_groups WHERE list_id = ?", (list_id,))
-        rows = await cursor.fetchall()
-        return [row[0] for row in rows]
+        async def load():
+            rows = await self._fetchall("SELECT group_id FROM list_groups WHERE list_id = ?", (list_id,))
+            return tuple(row[0] for row in rows)
+
+        return list(await self._cached(CACHE_SEGMENTS, ("members", list_id), load))
 
     async def record_broadcast(
         self,
@@ -169,86 +307,201 @@ class Database:
         source_message_id: Optional[int] = None,
     ):
         """Создаёт запись о рассылке и возвращает её ID"""
-        cursor = await self.conn.execute(
-            "INSERT INTO broadcasts(list_id, content_type, content, scheduled_at, source_chat_id, source_message_id) VALUES (?, ?, ?, ?, ?, ?)",
-            (
-                list_id,
-                content_type,
-                content,
-                scheduled_at.isoformat() if scheduled_at else None,
-                source_chat_id,
-                source_message_id,
-            ),
-        )
-        await self.conn.commit()
+        async with self.transaction():
+            cursor = await self.conn.execute(
+                "INSERT INTO broadcasts(list_id, content_type, content, scheduled_at, source_chat_id, source_message_id) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    list_id,
+                    content_type,
+                    content,
+                    scheduled_at.isoformat() if scheduled_at else None,
+                    source_chat_id,
+                    source_message_id,
+                ),
+            )
         return cursor.lastrowid
 
     async def record_broadcast_message(self, broadcast_id: int, chat_id: int, message_id: int):
-        await self.conn.execute(
-            "INSERT OR REPLACE INTO broadcast_messages(broadcast_id, chat_id, message_id) VALUES (?, ?, ?)",
-            (broadcast_id, chat_id, message_id),
+        async with self.transaction():
+            await self.conn.execute(
+                "INSERT OR REPLACE INTO broadcast_messages(broadcast_id, chat_id, message_id) VALUES (?, ?, ?)",
+                (broadcast_id, chat_id, message_id),
+            )
+
+    def delivery_writer(self, max_batch: int = 500, max_delay: float = 0.5) -> "DeliveryWriter":
+        """Буферизованный писатель результатов доставки (см. DeliveryWriter)"""
+        return DeliveryWriter(self, max_batch=max_batch, max_delay=max_delay)
+
+    # ---- Журнал доставки ---- #
+
+    async def create_delivery_ledger(self, broadcast_id: int, chat_ids: List[int]):
+        """Фиксирует получателей рассылки до начала отправки.
+
+        Уже существующие записи не трогаем; доставки, сделанные до появления
+        журнала, переносим из broadcast_messages как отправленные.
+        """
+        async with self.transaction():
+            await self.conn.execute(
+                """
+                INSERT OR IGNORE INTO broadcast_deliveries(broadcast_id, chat_id, status, message_id)
+                SELECT broadcast_id, chat_id, ?, message_id FROM broadcast_messages WHERE broadcast_id = ?
+                """,
+                (DELIVERY_SENT, broadcast_id),
+            )
+            await self.conn.executemany(
+                "INSERT OR IGNORE INTO broadcast_deliveries(broadcast_id, chat_id, status) VALUES (?, ?, ?)",
+                [(broadcast_id, chat_id, DELIVERY_PENDING) for chat_id in chat_ids],
+            )
+
+    async def get_undelivered_chats(self, broadcast_id: int) -> List[int]:
+        """Чаты, куда рассылка ещё не доставлена и не ждёт в очереди повторов"""
+        rows = await self._fetchall(
+            """
+            SELECT d.chat_id FROM broadcast_deliveries d
+            WHERE d.broadcast_id = ? AND d.status IN (?, ?)
+              AND NOT EXISTS (
+                  SELECT 1 FROM pending_retries r
+                  WHERE r.action = 'send' AND r.broadcast_id = d.broadcast_id AND r.chat_id = d.chat_id
+              )
+            """,
+            (broadcast_id, DELIVERY_PENDING, DELIVERY_IN_FLIGHT),
         )
-        await self.conn.commit()
+        return [row[0] for row in rows]
+
+    async def set_delivery_status(self, broadcast_id: int, chat_id: int, status: str, error: Optional[str] = None):
+        async with self.transaction():
+            await self.conn.execute(
+                "UPDATE broadcast_deliveries SET status = ?, error = ?, updated_at = CURRENT_TIMESTAMP WHERE broadcast_id = ? AND chat_id = ?",
+                (status, error, broadcast_id, chat_id),
+            )
+
+    async def mark_delivery_sent(self, broadcast_id: int, chat_id: int, message_id: int):
+        """Записывает успешную доставку в журнал и в broadcast_messages одним коммитом"""
+        async with self.transaction():
+            await self.conn.execute(
+                "INSERT OR REPLACE INTO broadcast_messages(broadcast_id, chat_id, message_id) VALUES (?, ?, ?)",
+                (broadcast_id, chat_id, message_id),
+            )
+            await self.conn.execute(
+                """
+                INSERT INTO broadcast_deliveries(broadcast_id, chat_id, status, message_id) VALUES (?, ?, ?, ?)
+                ON CONFLICT(broadcast_id, chat_id) DO UPDATE SET
+                    status = excluded.status, message_id = excluded.message_id, error = NULL, updated_at = CURRENT_TIMESTAMP
+                """,
+                (broadcast_id, chat_id, DELIVERY_SENT, message_id),
+            )
+
+    async def reset_failed_deliveries(self, broadcast_id: int):
+        """Возвращает неудавшиеся доставки в очередь (для /resend)"""
+        async with self.transaction():
+            await self.conn.execute(
+                "UPDATE broadcast_deliveries SET status = ?, error = NULL WHERE broadcast_id = ? AND status = ?",
+                (DELIVERY_PENDING, broadcast_id, DELIVERY_FAILED),
+            )
+
+    async def count_deliveries(self, broadcast_id: int, status: str) -> int:
+        row = await self._fetchone(
+            "SELECT COUNT(*) FROM broadcast_deliveries WHERE broadcast_id = ? AND status = ?",
+            (broadcast_id, status),
+        )
+        return row[0] if row else 0
+
+    async def get_interrupted_broadcasts(self) -> List[int]:
+        """Рассылки, отправка которых оборвалась (остались недоставленные получатели)"""
+        rows = await self._fetchall(
+            """
+            SELECT DISTINCT d.broadcast_id FROM broadcast_deliveries d
+            JOIN broadcasts b ON b.id = d.broadcast_id
+            WHERE b.deleted = 0 AND d.status IN ('pending', 'in_flight')
+              AND NOT EXISTS (
+                  SELECT 1 FROM pending_retries r
+                  WHERE r.action = 'send' AND r.broadcast_id = d.broadcast_id AND r.chat_id = d.chat_id
+              )
+            """
+        )
+        return [row[0] for row in rows]
 
     # ---- Scheduling helper methods ---- #
 
     async def set_broadcast_schedule(self, broadcast_id: int, scheduled_at: datetime, source_chat_id: int, source_message_id: int):
         """Устанавливает время отправки и источник сообщения для рассылки"""
-        await self.conn.execute(
-            "UPDATE broadcasts SET scheduled_at = ?, source_chat_id = ?, source_message_id = ? WHERE id = ?",
-            (scheduled_at.isoformat(), source_chat_id, source_message_id, broadcast_id)
-        )
-        await self.conn.commit()
+        async with self.transaction():
+            await self.conn.execute(
+                "UPDATE broadcasts SET scheduled_at = ?, source_chat_id = ?, source_message_id = ? WHERE id = ?",
+                (scheduled_at.isoformat(), source_chat_id, source_message_id, broadcast_id)
+            )
+        self._schedule_changed(broadcast_id)
 
     async def mark_broadcast_as_sent(self, broadcast_id: int):
-        await self.conn.execute("UPDATE broadcasts SET sent = 1 WHERE id = ?", (broadcast_id,))
-        await self.conn.commit()
+        async with self.transaction():
+            await self.conn.execute("UPDATE broadcasts SET sent = 1 WHERE id = ?", (broadcast_id,))
+        # После отправки становится актуальным срок автоудаления
+        self._schedule_changed(broadcast_id)
 
     async def reset_broadcast_sent_flag(self, broadcast_id: int):
         """Сбрасывает флаг отправки, чтобы можно было повторить рассылку"""
-        await self.conn.execute("UPDATE broadcasts SET sent = 0 WHERE id = ?", (broadcast_id,))
-        await self.conn.commit()
+        async with self.transaction():
+            await self.conn.execute("UPDATE broadcasts SET sent = 0 WHERE id = ?", (broadcast_id,))
+        self._schedule_changed(broadcast_id)
 
     async def set_broadcast_auto_delete(self, broadcast_id: int, auto_delete_at: Optional[datetime]):
         """Устанавливает время автоудаления (или None для отключения)"""
-        await self.conn.execute(
-            "UPDATE broadcasts SET auto_delete_at = ? WHERE id = ?",
-            (auto_delete_at.isoformat() if auto_delete_at else None, broadcast_id)
+        async with self.transaction():
+            await self.conn.execute(
+                "UPDATE broadcasts SET auto_delete_at = ? WHERE id = ?",
+                (auto_delete_at.isoformat() if auto_delete_at else None, broadcast_id)
+            )
+        self._schedule_changed(broadcast_id)
+
+    async def get_broadcast_deadlines(self, broadcast_id: Optional[int] = None) -> List[Tuple]:
+        """Сроки для планировщика: (id, scheduled_at, sent, deleted, auto_delete_at).
+
+        Без broadcast_id возвращает только рассылки, у которых есть что планировать.
+        """
+        if broadcast_id is not None:
+            return await self._fetchall(
+                "SELECT id, scheduled_at, sent, deleted, auto_delete_at FROM broadcasts WHERE id = ?",
+                (broadcast_id,),
+            )
+        return await self._fetchall(
+            """
+            SELECT id, scheduled_at, sent, deleted, auto_delete_at FROM broadcasts
+            WHERE deleted = 0 AND sent = 0 AND scheduled_at IS NOT NULL
+            UNION ALL
+            SELECT id, scheduled_at, sent, deleted, auto_delete_at FROM broadcasts
+            WHERE deleted = 0 AND sent = 1 AND auto_delete_at IS NOT NULL
+            """
         )
-        await self.conn.commit()
 
     async def get_due_auto_deletions(self, before_dt: datetime) -> List[Tuple]:
         """Получить рассылки, требующие автоудаления к указанному моменту"""
-        cursor = await self.conn.execute(
+        return await self._fetchall(
             "SELECT id FROM broadcasts WHERE sent = 1 AND deleted = 0 AND auto_delete_at IS NOT NULL AND auto_delete_at <= ?",
             (before_dt.isoformat(),)
         )
-        return await cursor.fetchall()
 
     async def get_due_broadcasts(self, before_dt: datetime) -> List[Tuple]:
         """Получить все рассылки, запланированные до указанного момента и ещё не отправленные"""
-        cursor = await self.conn.execute(
+        return await self._fetchall(
             "SELECT id, list_id, content_type, content, source_chat_id, source_message_id FROM broadcasts WHERE sent = 0 AND deleted = 0 AND scheduled_at IS NOT NULL AND scheduled_at <= ?",
             (before_dt.isoformat(),)
         )
-        return await cursor.fetchall()
 
     async def update_broadcast_text_content(self, broadcast_id: int, new_text: str):
         """Обновляет поле content у рассылки. Тип контента не меняем."""
-        await self.conn.execute(
-            "UPDATE broadcasts SET content = ? WHERE id = ?",
-            (new_text, broadcast_id)
-        )
-        await self.conn.commit()
+        async with self.transaction():
+            await self.conn.execute(
+                "UPDATE broadcasts SET content = ? WHERE id = ?",
+                (new_text, broadcast_id)
+            )
 
     async def get_last_broadcast_id(self):
-        cursor = await self.conn.execute("SELECT id FROM broadcasts ORDER BY id DESC LIMIT 1")
-        row = await cursor.fetchone()
+        row = await self._fetchone("SELECT id FROM broadcasts ORDER BY id DESC LIMIT 1")
         return row[0] if row else None
 
     async def get_recent_broadcasts(self, limit: int = 3):
         """Получить последние N рассылок вместе с названием сегмента"""
-        cursor = await self.conn.execute(
+        return await self._fetchall(
             """
             SELECT b.id, b.date, l.name, b.content_type, b.content
             FROM broadcasts b
@@ -258,39 +511,124 @@ class Database:
             """,
             (limit,),
         )
-        return await cursor.fetchall()
+
+    # ---- Очередь повторов ---- #
+
+    async def add_pending_retry(
+        self,
+        action: str,
+        broadcast_id: int,
+        chat_id: int,
+        message_id: Optional[int],
+        attempts: int,
+        next_attempt_at: float,
+        last_error: Optional[str],
+    ):
+        """Сохраняет задание на повтор (unix-время следующей попытки)"""
+        async with self.transaction():
+            await self.conn.execute(
+                """
+                INSERT OR REPLACE INTO pending_retries(action, broadcast_id, chat_id, message_id, attempts, next_attempt_at, last_error)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (action, broadcast_id, chat_id, message_id, attempts, next_attempt_at, last_error),
+            )
+
+    async def get_due_retries(self, now_ts: float, limit: int = 100) -> List[Tuple]:
+        """Повторы, время которых наступило: (id, action, broadcast_id, chat_id, message_id, attempts)"""
+        return await self._fetchall(
+            """
+            SELECT id, action, broadcast_id, chat_id, message_id, attempts
+            FROM pending_retries
+            WHERE next_attempt_at <= ?
+            ORDER BY next_attempt_at
+            LIMIT ?
+            """,
+            (now_ts, limit),
+        )
+
+    async def get_next_retry_time(self) -> Optional[float]:
+        row = await self._fetchone("SELECT MIN(next_attempt_at) FROM pending_retries")
+        return row[0] if row else None
+
+    async def update_pending_retry(self, retry_id: int, attempts: int, next_attempt_at: float, last_error: Optional[str]):
+        async with self.transaction():
+            await self.conn.execute(
+                "UPDATE pending_retries SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                (attempts, next_attempt_at, last_error, retry_id),
+            )
+
+    async def delete_pending_retry(self, retry_id: int):
+        async with self.transaction():
+            await self.conn.execute("DELETE FROM pending_retries WHERE id = ?", (retry_id,))
+
+    async def delete_pending_retries_for_broadcast(self, broadcast_id: int, action: Optional[str] = None):
+        """Отменяет повторы рассылки (например, если её удалили)"""
+        async with self.transaction():
+            if action:
+                await self.conn.execute(
+                    "DELETE FROM pending_retries WHERE broadcast_id = ? AND action = ?", (broadcast_id, action)
+                )
+            else:
+                await self.conn.execute("DELETE FROM pending_retries WHERE broadcast_id = ?", (broadcast_id,))
 
     async def get_broadcast_messages(self, broadcast_id: int):
-        cursor = await self.conn.execute(
+        return await self._fetchall(
             "SELECT chat_id, message_id FROM broadcast_messages WHERE broadcast_id = ?",
             (broadcast_id,),
         )
-        return await cursor.fetchall()
+
+    async def get_undeleted_messages(self, broadcast_id: int) -> List[Tuple[int, int]]:
+        """(chat_id, message_id) сообщений рассылки, которые ещё не удалены"""
+        return await self._fetchall(
+            """
+            SELECT chat_id, message_id FROM broadcast_messages
+            WHERE broadcast_id = ? AND (delete_status IS NULL OR delete_status != ?)
+            """,
+            (broadcast_id, DELETION_DELETED),
+        )
+
+    async def count_undeleted_messages(self, broadcast_id: int) -> int:
+        row = await self._fetchone(
+            """
+            SELECT COUNT(*) FROM broadcast_messages
+            WHERE broadcast_id = ? AND (delete_status IS NULL OR delete_status != ?)
+            """,
+            (broadcast_id, DELETION_DELETED),
+        )
+        return row[0] if row else 0
+
+    async def set_deletion_status(self, broadcast_id: int, chat_id: int, status: str, error: Optional[str] = None):
+        async with self.transaction():
+            await self.conn.execute(
+                "UPDATE broadcast_messages SET delete_status = ?, delete_error = ? WHERE broadcast_id = ? AND chat_id = ?",
+                (status, error, broadcast_id, chat_id),
+            )
 
     async def get_all_groups(self):
-        cursor = await self.conn.execute("SELECT chat_id, title FROM groups")
-        return await cursor.fetchall()
+        return await self._fetchall("SELECT chat_id, title FROM groups")
 
     async def get_unassigned_groups(self):
-        cursor = await self.conn.execute("""
+        return await self._fetchall("""
             SELECT g.chat_id, g.title 
             FROM groups g 
             LEFT JOIN list_groups lg ON g.chat_id = lg.group_id 
             WHERE lg.group_id IS NULL
         """)
-        return await cursor.fetchall()
 
     async def assign_group_to_list(self, chat_id: int, list_id: int):
-        await self.conn.execute("INSERT OR IGNORE INTO list_groups(list_id, group_id) VALUES (?, ?)", (list_id, chat_id))
-        await self.conn.commit()
+        async with self.transaction():
+            await self.conn.execute("INSERT OR IGNORE INTO list_groups(list_id, group_id) VALUES (?, ?)", (list_id, chat_id))
+        self._cache_changed(CACHE_SEGMENTS)
 
     async def delete_list(self, list_id: int):
-        await self.conn.execute("DELETE FROM lists WHERE id = ?", (list_id,))
-        await self.conn.commit()
+        async with self.transaction():
+            await self.conn.execute("DELETE FROM lists WHERE id = ?", (list_id,))
+        self._cache_changed(CACHE_SEGMENTS)
 
     async def get_groups_with_lists(self):
         """Получить все группы с информацией о привязанных списках"""
-        cursor = await self.conn.execute("""
+        return await self._fetchall("""
             SELECT g.chat_id, g.title, GROUP_CONCAT(l.name, ', ') as list_names
             FROM groups g
             LEFT JOIN list_groups lg ON g.chat_id = lg.group_id
@@ -298,38 +636,38 @@ class Database:
             GROUP BY g.chat_id, g.title
             ORDER BY g.title
         """)
-        return await cursor.fetchall()
 
     async def remove_group_from_list(self, chat_id: int, list_id: int):
         """Удалить группу из списка"""
-        await self.conn.execute("DELETE FROM list_groups WHERE group_id = ? AND list_id = ?", (chat_id, list_id))
-        await self.conn.commit()
+        async with self.transaction():
+            await self.conn.execute("DELETE FROM list_groups WHERE group_id = ? AND list_id = ?", (chat_id, list_id))
+        self._cache_changed(CACHE_SEGMENTS)
 
     async def delete_group(self, chat_id: int):
         """Полностью удалить группу из базы данных вместе с привязками"""
-        # Удаляем привязки вручную (на случай если foreign_keys=OFF)
-        await self.conn.execute("DELETE FROM list_groups WHERE group_id = ?", (chat_id,))
-        await self.conn.execute("DELETE FROM groups WHERE chat_id = ?", (chat_id,))
-        await self.conn.commit()
+        async with self.transaction():
+            # Удаляем привязки вручную (на случай если foreign_keys=OFF)
+            await self.conn.execute("DELETE FROM list_groups WHERE group_id = ?", (chat_id,))
+            await self.conn.execute("DELETE FROM groups WHERE chat_id = ?", (chat_id,))
+        self._cache_changed(CACHE_SEGMENTS)
 
     async def add_group(self, chat_id: int, title: str):
         """Добавить группу в базу данных без привязки к списку"""
-        await self.conn.execute("INSERT OR IGNORE INTO groups(chat_id, title) VALUES (?, ?)", (chat_id, title))
-        await self.conn.commit()
+        async with self.transaction():
+            await self.conn.execute("INSERT OR IGNORE INTO groups(chat_id, title) VALUES (?, ?)", (chat_id, title))
 
     async def get_group_current_list(self, chat_id: int):
         """Получить текущий список группы"""
-        cursor = await self.conn.execute("""
+        return await self._fetchone("""
             SELECT l.id, l.name 
             FROM lists l
             JOIN list_groups lg ON l.id = lg.list_id
             WHERE lg.group_id = ?
         """, (chat_id,))
-        return await cursor.fetchone()
 
     async def get_group_segments(self, chat_id: int):
         """Вернуть все сегменты для указанной группы"""
-        cursor = await self.conn.execute(
+        rows = await self._fetchall(
             """
             SELECT l.name FROM lists l
             JOIN list_groups lg ON l.id = lg.list_id
@@ -338,32 +676,29 @@ class Database:
             """,
             (chat_id,),
         )
-        rows = await cursor.fetchall()
         return [r[0] for r in rows]
 
     async def get_groups_in_list_detailed(self, list_id: int):
         """Получить подробную информацию о группах в списке"""
-        cursor = await self.conn.execute("""
+        return await self._fetchall("""
             SELECT g.chat_id, g.title
             FROM groups g
             JOIN list_groups lg ON g.chat_id = lg.group_id
             WHERE lg.list_id = ?
             ORDER BY g.title
         """, (list_id,))
-        return await cursor.fetchall()
 
     async def get_broadcast_message_count(self, broadcast_id: int):
         """Получить количество сообщений в рассылке"""
-        cursor = await self.conn.execute(
+        row = await self._fetchone(
             "SELECT COUNT(*) FROM broadcast_messages WHERE broadcast_id = ?",
             (broadcast_id,)
         )
-        row = await cursor.fetchone()
         return row[0] if row else 0
 
     async def get_recent_broadcasts_with_message_count(self, limit: int = 10):
         """Получить последние N рассылок вместе с количеством сообщений и статусом"""
-        cursor = await self.conn.execute(
+        return await self._fetchall(
             """
             SELECT 
                 b.id, 
@@ -371,84 +706,240 @@ class Database:
                 l.name, 
                 b.content_type, 
                 b.content,
-                COALESCE(msg_count.count, 0) as message_count,
+                (SELECT COUNT(*) FROM broadcast_messages bm WHERE bm.broadcast_id = b.id) as message_count,
                 b.deleted
             FROM broadcasts b
             LEFT JOIN lists l ON b.list_id = l.id
-            LEFT JOIN (
-                SELECT broadcast_id, COUNT(*) as count 
-                FROM broadcast_messages 
-                GROUP BY broadcast_id
-            ) msg_count ON b.id = msg_count.broadcast_id
             ORDER BY b.id DESC
             LIMIT ?
             """,
             (limit,),
         )
-        return await cursor.fetchall()
 
     async def mark_broadcast_as_deleted(self, broadcast_id: int):
         """Пометить рассылку как удаленную"""
-        await self.conn.execute(
-            "UPDATE broadcasts SET deleted = 1 WHERE id = ?",
-            (broadcast_id,)
-        )
-        await self.conn.commit()
+        async with self.transaction():
+            await self.conn.execute(
+                "UPDATE broadcasts SET deleted = 1 WHERE id = ?",
+                (broadcast_id,)
+            )
+        # Сроки публикации и автоудаления больше не нужны — снимем их с планировщика
+        self._schedule_changed(broadcast_id)
 
     # ---- Методы для работы с админами ---- #
 
     async def add_admin(self, user_id: int, username: str = None, first_name: str = None, added_by: int = None, super_admin: int = 0):
         """Добавить администратора"""
-        await self.conn.execute(
-            "INSERT OR REPLACE INTO admins (user_id, username, first_name, added_by, super_admin) VALUES (?, ?, ?, ?, ?)",
-            (user_id, username, first_name, added_by, super_admin)
-        )
-        await self.conn.commit()
+        async with self.transaction():
+            await self.conn.execute(
+                "INSERT OR REPLACE INTO admins (user_id, username, first_name, added_by, super_admin) VALUES (?, ?, ?, ?, ?)",
+                (user_id, username, first_name, added_by, super_admin)
+            )
+        self._cache_changed(CACHE_ADMINS)
 
     async def remove_admin(self, user_id: int):
         """Удалить администратора"""
-        await self.conn.execute("DELETE FROM admins WHERE user_id = ?", (user_id,))
-        await self.conn.commit()
+        async with self.transaction():
+            await self.conn.execute("DELETE FROM admins WHERE user_id = ?", (user_id,))
+        self._cache_changed(CACHE_ADMINS)
+
+    async def _admin_roles(self) -> Dict[int, bool]:
+        """Все админы из кеша: user_id -> является ли супер админом"""
+        async def load():
+            rows = await self._fetchall("SELECT user_id, super_admin FROM admins")
+            return {user_id: super_admin == 1 for user_id, super_admin in rows}
+
+        return await self._cached(CACHE_ADMINS, "roles", load)
+
+    async def load_admins(self) -> int:
+        """Загружает права админов в память (при старте) и возвращает число админов"""
+        return len(await self._admin_roles())
 
     async def is_admin(self, user_id: int) -> bool:
         """Проверить, является ли пользователь администратором"""
-        cursor = await self.conn.execute("SELECT user_id FROM admins WHERE user_id = ?", (user_id,))
-        row = await cursor.fetchone()
-        return row is not None
+        return user_id in await self._admin_roles()
 
     async def is_super_admin(self, user_id: int) -> bool:
-        cursor = await self.conn.execute("SELECT super_admin FROM admins WHERE user_id = ?", (user_id,))
-        row = await cursor.fetchone()
-        return row is not None and row[0] == 1
+        return (await self._admin_roles()).get(user_id, False)
 
     async def get_all_admins(self):
         """Получить всех администраторов"""
-        cursor = await self.conn.execute(
+        return await self._fetchall(
             "SELECT user_id, username, first_name, added_at FROM admins ORDER BY added_at"
         )
-        return await cursor.fetchall()
 
     async def set_super_admin(self, new_super_id: int):
         """Передает статус супер админа другому пользователю"""
-        # Снимаем текущий супер флаг
-        await self.conn.execute("UPDATE admins SET super_admin = 0 WHERE super_admin = 1")
-        # Назначаем нового
-        await self.conn.execute("UPDATE admins SET super_admin = 1 WHERE user_id = ?", (new_super_id,))
-        await self.conn.commit()
+        # Обе операции в одной транзакции: база не останется без супер админа
+        async with self.transaction():
+            # Снимаем текущий супер флаг
+            await self.conn.execute("UPDATE admins SET super_admin = 0 WHERE super_admin = 1")
+            # Назначаем нового
+            await self.conn.execute("UPDATE admins SET super_admin = 1 WHERE user_id = ?", (new_super_id,))
+        self._cache_changed(CACHE_ADMINS)
 
     async def migrate_admins_from_config(self, admin_ids: list):
         """Миграция админов из конфига в базу данных"""
-        # Проверяем, есть ли уже супер-администратор в базе
-        cursor = await self.conn.execute("SELECT user_id FROM admins WHERE super_admin = 1 LIMIT 1")
-        row = await cursor.fetchone()
-        has_super = row is not None
-
-        for idx, admin_id in enumerate(admin_ids):
-            # Если супер-админ уже есть – не назначаем нового при миграции
-            super_flag = 1 if (idx == 0 and not has_super) else 0
-            if not await self.is_admin(admin_id):
-                await self.add_admin(admin_id, username="from_config", first_name="Legacy Admin", super_admin=super_flag)
-            else:
-                if super_flag == 1:
-                    await self.set_super_admin(admin_id)
-        await self.conn.commit() 
\ No newline at end of file
+        async with self.transaction():
+            # Проверяем, есть ли уже супер-администратор в базе
+            row = await self._fetchone("SELECT user_id FROM admins WHERE super_admin = 1 LIMIT 1")
+            has_super = row is not None
+
+            for idx, admin_id in enumerate(admin_ids):
+                # Если супер-админ уже есть – не назначаем нового при миграции
+                super_flag = 1 if (idx == 0 and not has_super) else 0
+                if not await self.is_admin(admin_id):
+                    await self.add_admin(admin_id, username="from_config", first_name="Legacy Admin", super_admin=super_flag)
+                else:
+                    if super_flag == 1:
+                        await self.set_super_admin(admin_id)
+
+
+    # ---- Хранилище FSM ---- #
+
+    async def get_fsm_records(self) -> List[Tuple]:
+        """Все сохранённые состояния диалогов: (key, state, data, updated_at)"""
+        return await self._fetchall("SELECT key, state, data, updated_at FROM fsm_storage")
+
+    async def save_fsm_records(self, upserts: List[Tuple], deletes: List[str]):
+        """Записывает пачку состояний (key, state, data, updated_at) и удаляет пустые — одной транзакцией"""
+        async with self.transaction():
+            if upserts:
+                await self.conn.executemany(
+                    """
+                    INSERT INTO fsm_storage(key, state, data, updated_at) VALUES (?, ?, ?, ?)
+                    ON CONFLICT(key) DO UPDATE SET
+                        state = excluded.state, data = excluded.data, updated_at = excluded.updated_at
+                    """,
+                    upserts,
+                )
+            if deletes:
+                await self.conn.executemany("DELETE FROM fsm_storage WHERE key = ?", [(key,) for key in deletes])
+
+    async def delete_fsm_records_before(self, updated_before: float) -> int:
+        """Удаляет брошенные сессии, не менявшиеся с указанного момента (unix-время)"""
+        async with self.transaction():
+            cursor = await self.conn.execute("DELETE FROM fsm_storage WHERE updated_at < ?", (updated_before,))
+        return cursor.rowcount
+
+
+# Время каждого публичного метода попадает в метрику teleblast_db_query_seconds{method=...}
+instrument_methods(Database, DB_QUERY_SECONDS)
+
+
+class DeliveryWriter:
+    """Копит результаты доставки (и удаления) и записывает их пачками.
+
+    Вместо INSERT + commit на каждое сообщение строки собираются в буфер
+    и сбрасываются через executemany одной транзакцией: при достижении
+    max_batch строк, через max_delay секунд после первой записи и
+    обязательно при закрытии (в конце рассылки или удаления). Если запись
+    не удалась, строки возвращаются в буфер и пишутся следующей пачкой.
+
+        async with db.delivery_writer() as writer:
+            await writer.mark_sent(broadcast_id, chat_id, message_id)
+    """
+
+    def __init__(self, db: Database, max_batch: int = 500, max_delay: float = 0.5):
+        self.db = db
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._statuses: List[Tuple] = []
+        self._sent: List[Tuple] = []
+        self._deletions: List[Tuple] = []
+        self._lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+
+    def __len__(self):
+        return len(self._statuses) + len(self._sent) + len(self._deletions)
+
+    async def set_status(self, broadcast_id: int, chat_id: int, status: str, error: Optional[str] = None):
+        self._statuses.append((status, error, broadcast_id, chat_id))
+        await self._maybe_flush()
+
+    async def mark_sent(self, broadcast_id: int, chat_id: int, message_id: int):
+        self._sent.append((broadcast_id, chat_id, message_id))
+        await self._maybe_flush()
+
+    async def set_deletion_status(self, broadcast_id: int, chat_id: int, status: str, error: Optional[str] = None):
+        self._deletions.append((status, error, broadcast_id, chat_id))
+        await self._maybe_flush()
+
+    async def _maybe_flush(self):
+        if len(self) >= self.max_batch:
+            try:
+                await self.flush()
+                return
+            except Exception as e:
+                # Сообщение уже отправлено: ошибку записи не отдаём вызывающему,
+                # строки остались в буфере и будут записаны по таймеру
+                logger.error(f"DeliveryWriter flush failed: {e}")
+        if self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.max_delay)
+        # Сбрасываем ссылку до записи, чтобы close() не отменил идущий flush
+        self._timer = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"DeliveryWriter flush failed: {e}")
+            # Строки вернулись в буфер: повторим запись через max_delay
+            if len(self) and self._timer is None:
+                self._timer = asyncio.create_task(self._flush_later())
+
+    async def flush(self):
+        async with self._lock:
+            statuses, self._statuses = self._statuses, []
+            sent, self._sent = self._sent, []
+            deletions, self._deletions = self._deletions, []
+            if not statuses and not sent and not deletions:
+                return
+            try:
+                await self._write(statuses, sent, deletions)
+            except BaseException:
+                # Не теряем результаты: вернём их в начало буферов, перед
+                # накопившимися за время записи, чтобы порядок сохранился
+                self._statuses = statuses + self._statuses
+                self._sent = sent + self._sent
+                self._deletions = deletions + self._deletions
+                raise
+
+    async def _write(self, statuses: List[Tuple], sent: List[Tuple], deletions: List[Tuple]):
+        async with self.db.transaction() as conn:
+            if statuses:
+                await conn.executemany(
+                    "UPDATE broadcast_deliveries SET status = ?, error = ?, updated_at = CURRENT_TIMESTAMP WHERE broadcast_id = ? AND chat_id = ?",
+                    statuses,
+                )
+            if sent:
+                await conn.executemany(
+                    "INSERT OR REPLACE INTO broadcast_messages(broadcast_id, chat_id, message_id) VALUES (?, ?, ?)",
+                    sent,
+                )
+                await conn.executemany(
+                    """
+                    INSERT INTO broadcast_deliveries(broadcast_id, chat_id, status, message_id) VALUES (?, ?, ?, ?)
+                    ON CONFLICT(broadcast_id, chat_id) DO UPDATE SET
+                        status = excluded.status, message_id = excluded.message_id, error = NULL, updated_at = CURRENT_TIMESTAMP
+                    """,
+                    [(b_id, chat_id, DELIVERY_SENT, msg_id) for b_id, chat_id, msg_id in sent],
+                )
+            if deletions:
+                await conn.executemany(
+                    "UPDATE broadcast_messages SET delete_status = ?, delete_error = ? WHERE broadcast_id = ? AND chat_id = ?",
+                    deletions,
+                )
+
+    async def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await self.flush()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
@@ -0,0 +1,197 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from metrics import FANOUT_IN_FLIGHT, FANOUT_QUEUE_DEPTH
+
+
+class TokenBucket:
+    """Глобальный токен-бакет: не больше `rate` операций в секунду с запасом `capacity`.
+
+    Срочные запросы (экстренное удаление рассылки) получают токены раньше
+    обычных: пока хоть один срочный запрос ждёт, обычные не забирают токены.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+        self._urgent_lock = asyncio.Lock()
+        self._urgent_waiting = 0
+        self._no_urgent = asyncio.Event()
+        self._no_urgent.set()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def pause(self, seconds: float):
+        """Останавливает выдачу токенов (например, после 429 с retry_after)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self, urgent: bool = False):
+        # Локи гарантируют честную очередь: токены раздаются в порядке запроса
+        # (срочные — в своей очереди, впереди обычных)
+        if not urgent:
+            async with self._lock:
+                await self._take(yield_to_urgent=True)
+            return
+        self._urgent_waiting += 1
+        self._no_urgent.clear()
+        try:
+            async with self._urgent_lock:
+                await self._take(yield_to_urgent=False)
+        finally:
+            self._urgent_waiting -= 1
+            if not self._urgent_waiting:
+                self._no_urgent.set()
+
+    async def _take(self, yield_to_urgent: bool):
+        while True:
+            if yield_to_urgent and self._urgent_waiting:
+                await self._no_urgent.wait()
+                continue
+            delay = self._paused_until - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class PerChatLimiter:
+    """Ограничение на один чат: не больше `limit` сообщений за `window` секунд.
+
+    Telegram разрешает боту около 20 сообщений в минуту в одну группу.
+    """
+
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+        self._sent: Dict[int, Deque[float]] = {}
+        self._locks: Dict[int, asyncio.Lock] = {}
+
+    async def acquire(self, chat_id: int):
+        lock = self._locks.setdefault(chat_id, asyncio.Lock())
+        async with lock:
+            stamps = self._sent.setdefault(chat_id, deque())
+            while True:
+                now = time.monotonic()
+                while stamps and now - stamps[0] >= self.window:
+                    stamps.popleft()
+                if len(stamps) < self.limit:
+                    stamps.append(now)
+                    return
+                await asyncio.sleep(self.window - (now - stamps[0]))
+
+    def prune(self):
+        """Удаляет записи о чатах, по которым окно уже истекло"""
+        now = time.monotonic()
+        for chat_id in list(self._sent):
+            stamps = self._sent[chat_id]
+            lock = self._locks.get(chat_id)
+            if lock and lock.locked():
+                continue
+            if not stamps or now - stamps[-1] >= self.window:
+                del self._sent[chat_id]
+                self._locks.pop(chat_id, None)
+
+
+class FanoutResult:
+    """Итог рассылки: успешные отправки и ошибки по чатам"""
+
+    def __init__(self):
+        self.succeeded: List[Tuple[Any, Any]] = []
+        self.failed: List[Tuple[Any, BaseException]] = []
+
+    @property
+    def sent(self) -> int:
+        return len(self.succeeded)
+
+
+class FanoutEngine:
+    """Параллельная отправка во множество чатов.
+
+    Ограниченный пул воркеров разбирает очередь чатов; каждая отправка
+    сначала ждёт бюджет конкретного чата, затем токен глобального бакета.
+    Бакет общий для всех запусков, поэтому одновременные рассылки
+    делят между собой лимит Bot API.
+    """
+
+    def __init__(self, concurrency: int, rate: float, per_chat_limit: int, per_chat_window: float):
+        self.concurrency = max(1, concurrency)
+        self.bucket = TokenBucket(rate)
+        self.per_chat = PerChatLimiter(per_chat_limit, per_chat_window)
+
+    async def run(
+        self,
+        items: Iterable[Any],
+        send: Callable[[Any], Awaitable[Any]],
+        concurrency: Optional[int] = None,
+        key: Optional[Callable[[Any], int]] = None,
+        urgent: Optional[Callable[[], bool]] = None,
+        stop: Optional[Callable[[], bool]] = None,
+    ) -> FanoutResult:
+        """Вызывает `send(item)` для каждого элемента и собирает результаты.
+
+        Элементом по умолчанию считается chat_id; для составных элементов
+        `key` возвращает чат, к которому применяется лимит на группу.
+        `urgent` проверяется перед каждым вызовом: пока он возвращает True,
+        токены общего бакета достаются этому запуску раньше остальных.
+        `stop` проверяется перед взятием элемента и непосредственно перед
+        `send`: когда он вернёт True, воркеры завершаются, не трогая
+        оставшиеся элементы (их нет ни в succeeded, ни в failed).
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        for item in items:
+            queue.put_nowait(item)
+        result = FanoutResult()
+        if queue.empty():
+            return result
+
+        async def worker():
+            while True:
+                if stop and stop():
+                    return
+                try:
+                    item = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                FANOUT_QUEUE_DEPTH.dec()
+                FANOUT_IN_FLIGHT.inc()
+                try:
+                    await self.per_chat.acquire(key(item) if key else item)
+                    await self.bucket.acquire(urgent=bool(urgent and urgent()))
+                    # Пока ждали лимитов, запуск могли остановить
+                    if stop and stop():
+                        continue
+                    value = await send(item)
+                    result.succeeded.append((item, value))
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # 429 относится ко всему боту: притормаживаем общий бакет
+                    retry_after = getattr(e, "retry_after", None)
+                    if retry_after:
+                        self.bucket.pause(retry_after)
+                    result.failed.append((item, e))
+                finally:
+                    FANOUT_IN_FLIGHT.dec()
+
+        workers = min(concurrency or self.concurrency, queue.qsize())
+        FANOUT_QUEUE_DEPTH.inc(queue.qsize())
+        try:
+            await asyncio.gather(*(worker() for _ in range(workers)))
+        finally:
+            # При отмене в очереди остаются невзятые чаты — они больше не ждут
+            FANOUT_QUEUE_DEPTH.dec(queue.qsize())
+        self.per_chat.prune()
+        return result
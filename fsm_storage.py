@@ -0,0 +1,176 @@
+import asyncio
+import json
+import logging
+import time
+from datetime import date, datetime
+from typing import Any, Dict, Optional, Set
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from database import Database
+
+logger = logging.getLogger(__name__)
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, date):
+        return {"__date__": value.isoformat()}
+    raise TypeError(
+        f"FSM data: значение типа {type(value).__name__} не сериализуется в JSON — "
+        "храните в состоянии только простые поля (id, строки, числа, даты)"
+    )
+
+
+def _decode(obj: Dict[str, Any]) -> Any:
+    if "__datetime__" in obj:
+        return datetime.fromisoformat(obj["__datetime__"])
+    if "__date__" in obj:
+        return date.fromisoformat(obj["__date__"])
+    return obj
+
+
+def dumps(data: Dict[str, Any]) -> str:
+    return json.dumps(data, default=_encode, ensure_ascii=False)
+
+
+def loads(raw: Optional[str]) -> Dict[str, Any]:
+    return json.loads(raw, object_hook=_decode) if raw else {}
+
+
+def storage_key_id(key: StorageKey) -> str:
+    return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:{key.destiny}"
+
+
+class _Record:
+    __slots__ = ("state", "data", "raw", "updated_at")
+
+    def __init__(self, state: Optional[str] = None, data: Optional[Dict[str, Any]] = None, raw: Optional[str] = None, updated_at: float = 0.0):
+        self.state = state
+        self.data = data if data is not None else {}
+        self.raw = raw
+        self.updated_at = updated_at
+
+    @property
+    def empty(self) -> bool:
+        return self.state is None and not self.data
+
+
+class SQLiteStorage(BaseStorage):
+    """Хранилище FSM в таблице fsm_storage базы бота.
+
+    Состояния переживают перезапуск. Чтение идёт из памяти (все живые
+    сессии загружаются при старте), изменения копятся и записываются
+    пачкой одной транзакцией через flush_delay секунд. Сессии, которые не
+    менялись дольше ttl секунд, удаляются из памяти и из базы.
+
+    Данные хранятся в JSON (datetime и date поддерживаются), поэтому класть
+    в состояние можно только простые значения, а не объекты aiogram.
+    """
+
+    def __init__(self, db: Database, ttl: float = 24 * 3600, flush_delay: float = 1.0, evict_interval: float = 600):
+        self.db = db
+        self.ttl = ttl
+        self.flush_delay = flush_delay
+        self.evict_interval = evict_interval
+        self._records: Dict[str, _Record] = {}
+        self._dirty: Set[str] = set()
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+        self._evicted_at = 0.0
+
+    async def load(self):
+        """Загружает живые сессии из базы (вызывается при старте или при первом обращении)"""
+        async with self._load_lock:
+            if self._loaded:
+                return
+            await self._evict_expired()
+            for key_id, state, raw, updated_at in await self.db.get_fsm_records():
+                self._records[key_id] = _Record(state, loads(raw), raw, updated_at)
+            self._loaded = True
+            logger.info(f"FSM: восстановлено сессий: {len(self._records)}")
+
+    async def _record(self, key: StorageKey) -> _Record:
+        if not self._loaded:
+            await self.load()
+        record = self._records.get(storage_key_id(key))
+        if record is not None and time.time() - record.updated_at > self.ttl:
+            # Брошенная сессия: ведём себя так, будто её нет
+            return _Record()
+        return record or _Record()
+
+    def _store(self, key: StorageKey, record: _Record):
+        key_id = storage_key_id(key)
+        record.updated_at = time.time()
+        self._records[key_id] = record
+        self._dirty.add(key_id)
+        if self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        current = await self._record(key)
+        new_state = state.state if isinstance(state, State) else state
+        self._store(key, _Record(new_state, current.data, current.raw))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._record(key)).state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        current = await self._record(key)
+        # Сериализуем сразу: несериализуемое значение — ошибка в обработчике, а не при записи
+        raw = dumps(data)
+        self._store(key, _Record(current.state, data.copy(), raw))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._record(key)).data.copy()
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_delay)
+        self._timer = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"FSM flush failed: {e}")
+
+    async def flush(self):
+        """Записывает накопленные изменения одной транзакцией"""
+        async with self._flush_lock:
+            dirty, self._dirty = self._dirty, set()
+            upserts = []
+            deletes = []
+            for key_id in dirty:
+                record = self._records.get(key_id)
+                if record is None or record.empty:
+                    self._records.pop(key_id, None)
+                    deletes.append(key_id)
+                else:
+                    upserts.append((key_id, record.state, record.raw, record.updated_at))
+            try:
+                if upserts or deletes:
+                    await self.db.save_fsm_records(upserts, deletes)
+            except Exception:
+                # Не теряем изменения: запишем их следующей пачкой
+                self._dirty |= dirty
+                raise
+            if time.time() - self._evicted_at >= self.evict_interval:
+                await self._evict_expired()
+
+    async def _evict_expired(self):
+        cutoff = time.time() - self.ttl
+        self._evicted_at = time.time()
+        for key_id in [k for k, r in self._records.items() if r.updated_at < cutoff and k not in self._dirty]:
+            del self._records[key_id]
+        removed = await self.db.delete_fsm_records_before(cutoff)
+        if removed:
+            logger.info(f"FSM: удалено брошенных сессий: {removed}")
+
+    async def close(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._dirty and self.db.conn is not None:
+            await self.flush()
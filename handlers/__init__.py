@@ -0,0 +1,42 @@
+"""
+Обработчики бота, разбитые на роутеры aiogram.
+
+Модули импортируются только в setup_routers(), то есть при запуске бота:
+импорт bot.py (бенчмарки, инструменты, проверки) их не загружает.
+Роутеры разделены, но не ленивые: все подключаются до первого опроса.
+Все модули handlers вместе импортируются примерно за 20 мс, а весь запуск до
+первого getUpdates занимает около 2,7 с, из них ~2,3 с — aiogram, который
+нужен loader в любом случае (benchmarks/bench_startup.py). Отложенное
+подключение сэкономило бы меньше 1 % и рисковало бы порядком фильтров
+и изменением диспетчера во время опроса.
+Порядок в ROUTER_MODULES — это порядок проверки фильтров: первым срабатывает
+обработчик из роутера, подключённого раньше.
+"""
+import importlib
+import logging
+import time
+
+from aiogram import Dispatcher
+
+logger = logging.getLogger(__name__)
+
+ROUTER_MODULES = (
+    "handlers.commands",
+    "handlers.debug",
+    "handlers.profiling",
+    "handlers.broadcast",
+    "handlers.panel",
+    "handlers.broadcast_menu",
+    "handlers.segments",
+    "handlers.settings",
+    "handlers.group_edit",
+    "handlers.broadcast_content",
+)
+
+
+def setup_routers(dispatcher: Dispatcher):
+    """Импортирует модули обработчиков и подключает их роутеры к диспетчеру"""
+    started = time.perf_counter()
+    for name in ROUTER_MODULES:
+        dispatcher.include_router(importlib.import_module(name).router)
+    logger.info(f"Подключено роутеров: {len(ROUTER_MODULES)} за {(time.perf_counter() - started) * 1000:.0f} мс")
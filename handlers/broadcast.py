@@ -0,0 +1,467 @@
+"""Создание рассылки: сообщение, сегмент, время публикации и автоудаления; /resend и /delete_last."""
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from aiogram import F, Router, types
+from aiogram.filters import Command, CommandObject
+from aiogram.fsm.context import FSMContext
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup
+
+import schedule_parser
+from broadcasting import BroadcastDeletion, send_broadcast_by_id, delete_broadcast_messages
+from handlers.common import admin_reply_keyboard, admin_required, build_lists_keyboard
+from handlers.screens import show_broadcast_manage_screen, show_broadcast_menu
+from helpers import now_msk_naive, extract_hours, extract_minutes
+from loader import db
+from states import BroadcastState, MenuState
+
+logger = logging.getLogger(__name__)
+router = Router(name=__name__)
+
+
+@router.message(Command("broadcast"))
+@admin_required
+async def cmd_broadcast(message: types.Message, state: FSMContext):
+    await state.set_state(BroadcastState.waiting_for_message)
+    await message.answer("Отправьте сообщение (текст, фото, видео, документ), которое нужно разослать.")
+
+
+@router.message(BroadcastState.waiting_for_message)
+async def broadcast_save_message(message: types.Message, state: FSMContext):
+    # В состоянии храним только то, что нужно для записи рассылки, а не весь Message
+    await state.update_data(
+        source_chat_id=message.chat.id,
+        source_message_id=message.message_id,
+        source_content_type=message.content_type,
+        # Для медиа-сообщений текст содержится в caption
+        source_text=message.text if message.content_type == "text" else message.caption,
+    )
+    keyboard = await build_lists_keyboard()
+    await message.answer("Выберите список, куда отправить сообщение:", reply_markup=keyboard)
+    await state.set_state(BroadcastState.waiting_for_list_choice)
+
+
+@router.callback_query(F.data.startswith("choose_list"))
+async def process_list_choice(callback: types.CallbackQuery, state: FSMContext):
+    list_id = int(callback.data.split(":")[1])
+    data = await state.get_data()
+    
+    if not data.get("source_message_id"):
+        await callback.answer("Источник сообщения не найден", show_alert=True)
+        return
+
+    # Создаём запись о рассылке (пока без даты)
+    broadcast_id = await db.record_broadcast(
+        list_id=list_id,
+        content_type=data["source_content_type"],
+        content=data.get("source_text"),
+        scheduled_at=None,
+        source_chat_id=data["source_chat_id"],
+        source_message_id=data["source_message_id"],
+    )
+
+    # Сохраняем в FSM
+    await state.update_data(broadcast_id=broadcast_id)
+
+    await callback.answer()
+    await callback.message.answer(
+        "Когда отправить рассылку? Укажите дату и время (по МСК).\n\n"
+        "Примеры:\n"
+        "— 13.08.2025 17:00\n"
+        "— 13 августа 17:00\n"
+        "— через 2 дня в 17:00\n"
+        "— 5 вечера\n"
+        "— сейчас\n"
+        "— сегодня в 17:00\n"
+    )
+    await state.set_state(BroadcastState.waiting_for_schedule_input)
+
+
+@router.callback_query(F.data == "cancel")
+async def cancel_callback(callback: types.CallbackQuery, state: FSMContext):
+    await state.clear()
+    await callback.message.edit_reply_markup()
+    await callback.message.answer("⛔️ Рассылка отменена.")
+    await callback.answer()
+
+
+# ---- Шаг ввода времени ---- #
+@router.message(BroadcastState.waiting_for_schedule_input)
+async def process_schedule_input(message: types.Message, state: FSMContext):
+    text = message.text.strip().lower()
+    # Обработка "сейчас"
+    if text in ["сейчас", "now"]:
+        # Всегда используем наивное время в МСК, чтобы избежать сравнений aware vs naive
+        scheduled_dt = now_msk_naive()
+    else:
+        scheduled_dt = await schedule_parser.parse_datetime(text, now_msk_naive())
+    if not scheduled_dt:
+        await message.answer("Не удалось распознать дату/время. Попробуйте ещё раз.")
+        return
+    # Если дата без года и она уже прошла – добавляем год +1
+    if scheduled_dt < now_msk_naive():
+        # Оставляем как есть, пользователь возможно хочет прошлое время для немедленного запуска
+        pass
+
+    await state.update_data(scheduled_dt=scheduled_dt)
+
+    # Подтверждение
+    confirm_kb = InlineKeyboardMarkup(
+        inline_keyboard=[
+            [
+                InlineKeyboardButton(text="✅ Подтвердить", callback_data="schedule_confirm"),
+                InlineKeyboardButton(text="❌ Отмена", callback_data="cancel"),
+            ]
+        ]
+    )
+    await message.answer(
+        f"Опубликовать рассылку {scheduled_dt.strftime('%d.%m.%Y %H:%M')} по МСК?",
+        reply_markup=confirm_kb,
+    )
+    await state.set_state(BroadcastState.waiting_for_schedule_confirm)
+
+
+# ---- Подтверждение времени ---- #
+@router.callback_query(F.data == "schedule_confirm")
+async def confirm_schedule_callback(callback: types.CallbackQuery, state: FSMContext):
+    data = await state.get_data()
+    broadcast_id = data.get("broadcast_id")
+    scheduled_dt: datetime = data.get("scheduled_dt")
+    if not broadcast_id or not scheduled_dt:
+        await callback.answer("Данные потеряны", show_alert=True)
+        await state.clear()
+        return
+    # Время публикации записывается в базу только в конце диалога (save_schedule):
+    # иначе планировщик отправил бы пост «сейчас» до выбора автоудаления
+
+    # Переходим к шагу автоудаления
+    await state.update_data(broadcast_id=broadcast_id, scheduled_dt=scheduled_dt, schedule_pending=True)
+    kb = InlineKeyboardMarkup(
+        inline_keyboard=[[InlineKeyboardButton(text="🚫 Не удалять автоматически", callback_data="auto_del_skip")]]
+    )
+    # Лимит считаем от времени публикации (фактического или планируемого)
+    limit_dt = scheduled_dt + timedelta(hours=48)
+    await callback.message.answer(
+        "Через сколько часов удалить пост?\n" \
+        "— до 48 часов (например: 1, 6, 24)\n" \
+        f"— или укажите дату и время (МСК), не позже чем через 48 часов ({limit_dt.strftime('%d.%m.%Y %H:%M')})\n\n" \
+        "Нажмите кнопку, если не нужно удалять автоматически.",
+        reply_markup=kb,
+    )
+    await state.set_state(BroadcastState.waiting_for_auto_delete)
+    await callback.answer()
+
+
+@router.message(BroadcastState.waiting_for_auto_delete)
+async def process_auto_delete_input(message: types.Message, state: FSMContext):
+    text = message.text.strip().lower()
+    
+    # Обрабатываем команды навигации
+    if text in ("назад", "⬅️ назад", "отмена", "❌", "cancel"):
+        data = await state.get_data()
+        broadcast_id = data.get("broadcast_id") or data.get("manage_broadcast_id") or data.get("edit_broadcast_id")
+        
+        if broadcast_id:
+            # Проверяем, откуда мы пришли: из создания рассылки или из управления
+            if data.get("manage_broadcast_id"):
+                # Пришли из управления существующей рассылкой - возвращаемся к экрану управления
+                await state.update_data(manage_broadcast_id=broadcast_id)
+                await state.set_state(MenuState.broadcast_manage_show)
+                await show_broadcast_manage_screen(message, state, broadcast_id)
+            else:
+                # Пришли из создания новой рассылки - возвращаемся в меню рассылок
+                await state.clear()
+                await show_broadcast_menu(message, state)
+        else:
+            # Если ID потерян, возвращаемся в главное меню
+            await state.clear()
+            await message.answer("🏠 Вернулись в главное меню", reply_markup=admin_reply_keyboard())
+        return
+    
+    data = await state.get_data()
+    scheduled_dt: datetime = data.get("scheduled_dt")
+    broadcast_id = data.get("broadcast_id")
+    if not broadcast_id:
+        # Фолбэк: пробуем достать из manage_broadcast_id / edit_broadcast_id
+        candidate_id = data.get("manage_broadcast_id") or data.get("edit_broadcast_id")
+        if candidate_id:
+            broadcast_id = candidate_id
+            await state.update_data(broadcast_id=broadcast_id)
+            logger.warning("process_auto_delete_input: восстановил broadcast_id из fallback, id=%s", broadcast_id)
+        else:
+            logger.error("process_auto_delete_input: broadcast_id отсутствует в FSM; data=%s", data)
+            await message.answer("Данные потеряны (нет ID). Начните заново /broadcast")
+            await state.clear()
+            return
+    # Если по какой-то причине scheduled_dt отсутствует в FSM, пробуем достать из БД
+    if scheduled_dt is None:
+        row = await db.conn.execute("SELECT scheduled_at FROM broadcasts WHERE id = ?", (broadcast_id,))
+        r = await row.fetchone()
+        if r and r[0]:
+            try:
+                dt = datetime.fromisoformat(r[0])
+                if dt.tzinfo is not None:
+                    dt = dt.astimezone(ZoneInfo("Europe/Moscow")).replace(tzinfo=None)
+                scheduled_dt = dt
+            except Exception:
+                scheduled_dt = now_msk_naive()
+        else:
+            scheduled_dt = now_msk_naive()
+
+    max_delta_hours = 48
+    # Максимальное время автоудаления отталкивается от времени публикации
+    max_deadline = scheduled_dt + timedelta(hours=max_delta_hours)
+
+    auto_delete_dt = None
+    hours = extract_hours(text)
+    mins = extract_minutes(text)
+    if hours is not None or mins is not None:
+        total_minutes = (hours or 0) * 60 + (mins or 0)
+        if total_minutes <= 0:
+            await message.answer("Укажите положительное время. Попробуйте ещё раз или нажмите кнопку не удалять.")
+            return
+        if total_minutes > max_delta_hours * 60:
+            await message.answer("Нельзя указывать больше 48 часов. Попробуйте ещё раз.")
+            return
+        auto_delete_dt = scheduled_dt + timedelta(minutes=total_minutes)
+    else:
+        # Относительные формулировки (например, "через час") должны считаться
+        # от времени публикации, а не от текущего времени
+        dt = await schedule_parser.parse_datetime(text, scheduled_dt or now_msk_naive())
+        if not dt:
+            await message.answer("Не удалось распознать время. Укажите часы/минуты (напр. '2 часа', '40 минут') или дату/время по МСК.")
+            return
+        if dt > max_deadline:
+            await message.answer("Нельзя указывать больше 48 часов от времени публикации. Попробуйте ещё раз.")
+            return
+        auto_delete_dt = dt
+
+    await state.update_data(auto_delete_dt=auto_delete_dt)
+    kb = InlineKeyboardMarkup(
+        inline_keyboard=[[InlineKeyboardButton(text="✅ Подтвердить", callback_data="auto_del_confirm"), InlineKeyboardButton(text="❌ Изменить", callback_data="auto_del_change")]]
+    )
+    await message.answer(
+        f"Удалить пост {auto_delete_dt.strftime('%d.%m.%Y %H:%M')} (МСК)?",
+        reply_markup=kb,
+    )
+    await state.set_state(BroadcastState.waiting_for_auto_delete_confirm)
+
+
+async def save_schedule(broadcast_id: int, scheduled_dt: datetime, auto_delete_dt: Optional[datetime]) -> bool:
+    """Записывает время публикации и автоудаления новой рассылки одним коммитом.
+
+    Планировщик узнаёт о рассылке только после коммита, то есть когда выбраны оба срока.
+    Возвращает False, если рассылка не найдена.
+    """
+    row = await db.conn.execute("SELECT source_chat_id, source_message_id FROM broadcasts WHERE id = ?", (broadcast_id,))
+    src = await row.fetchone()
+    if not src:
+        return False
+    async with db.transaction():
+        await db.set_broadcast_schedule(broadcast_id, scheduled_dt, src[0], src[1])
+        await db.set_broadcast_auto_delete(broadcast_id, auto_delete_dt)
+    return True
+
+
+@router.callback_query(F.data == "auto_del_skip")
+async def auto_delete_skip(callback: types.CallbackQuery, state: FSMContext):
+    data = await state.get_data()
+    broadcast_id = data.get("broadcast_id")
+    scheduled_dt: datetime = data.get("scheduled_dt")
+    if not broadcast_id or not scheduled_dt:
+        await callback.answer("Данные потеряны", show_alert=True)
+        await state.clear()
+        return
+    if data.get("schedule_pending") and not await save_schedule(broadcast_id, scheduled_dt, None):
+        await callback.answer("Рассылка не найдена", show_alert=True)
+        await state.clear()
+        return
+    # Узнаём, был ли пост уже отправлен
+    row = await db.conn.execute("SELECT sent FROM broadcasts WHERE id = ?", (broadcast_id,))
+    r = await row.fetchone()
+    is_sent = bool(r and r[0])
+
+    if is_sent:
+        await callback.message.answer("🧹 Автоудаление отключено. Пост уже был отправлен ранее.")
+    else:
+        if scheduled_dt <= now_msk_naive():
+            await send_broadcast_by_id(broadcast_id)
+            await callback.message.answer("✅ Пост отправлен сразу. Автоудаление: нет.")
+        else:
+            await callback.message.answer(
+                f"✅ Пост запланирован на {scheduled_dt.strftime('%d.%m.%Y %H:%M')} (МСК).\n🗑️ Автоудаление: нет.",
+            )
+    # Возвращаем пользователя в меню рассылок, где новая рассылка уже доступна в списке
+    await state.clear()
+    await show_broadcast_menu(callback.message, state)
+    await callback.answer()
+
+
+@router.callback_query(F.data == "auto_del_confirm")
+async def auto_delete_confirm(callback: types.CallbackQuery, state: FSMContext):
+    data = await state.get_data()
+    broadcast_id = data.get("broadcast_id") or data.get("manage_broadcast_id") or data.get("edit_broadcast_id")
+    scheduled_dt: datetime = data.get("scheduled_dt")
+    auto_delete_dt: datetime = data.get("auto_delete_dt")
+    if scheduled_dt is None:
+        row = await db.conn.execute("SELECT scheduled_at FROM broadcasts WHERE id = ?", (broadcast_id,))
+        r = await row.fetchone()
+        if r and r[0]:
+            try:
+                dt = datetime.fromisoformat(r[0])
+                if dt.tzinfo is not None:
+                    dt = dt.astimezone(ZoneInfo("Europe/Moscow")).replace(tzinfo=None)
+                scheduled_dt = dt
+            except Exception:
+                scheduled_dt = now_msk_naive()
+        else:
+            scheduled_dt = now_msk_naive()
+    if not broadcast_id or not auto_delete_dt:
+        logger.error("auto_del_confirm: missing data: %s", data)
+        await callback.answer("Данные потеряны", show_alert=True)
+        await state.clear()
+        return
+
+    if data.get("schedule_pending"):
+        # Создание новой рассылки: время публикации ещё не записано
+        if not await save_schedule(broadcast_id, scheduled_dt, auto_delete_dt):
+            await callback.answer("Рассылка не найдена", show_alert=True)
+            await state.clear()
+            return
+    else:
+        await db.set_broadcast_auto_delete(broadcast_id, auto_delete_dt)
+
+    # Узнаём, был ли пост уже отправлен
+    row = await db.conn.execute("SELECT sent FROM broadcasts WHERE id = ?", (broadcast_id,))
+    r = await row.fetchone()
+    is_sent = bool(r and r[0])
+
+    if is_sent:
+        await callback.message.answer(
+            f"🗑️ Автоудаление установлено: {auto_delete_dt.strftime('%d.%m.%Y %H:%M')} (МСК). Пост уже был отправлен ранее."
+        )
+    else:
+        if scheduled_dt <= now_msk_naive():
+            await send_broadcast_by_id(broadcast_id)
+            await callback.message.answer(
+                f"✅ Пост отправлен сразу. Автоудаление в {auto_delete_dt.strftime('%d.%m.%Y %H:%M')} (МСК)."
+            )
+        else:
+            await callback.message.answer(
+                f"✅ Пост запланирован на {scheduled_dt.strftime('%d.%m.%Y %H:%M')} (МСК).\n🗑️ Автоудаление в {auto_delete_dt.strftime('%d.%m.%Y %H:%M')} (МСК)."
+            )
+    # После подтверждения возвращаемся в список рассылок, чтобы сразу была доступна кнопка создания новой
+    await state.clear()
+    await show_broadcast_menu(callback.message, state)
+    await callback.answer()
+
+
+@router.callback_query(F.data == "auto_del_change")
+async def auto_delete_change(callback: types.CallbackQuery, state: FSMContext):
+    # Возвращаем пользователя к повторному вводу времени автоудаления
+    limit_dt = now_msk_naive() + timedelta(hours=48)
+    await callback.message.answer(
+        "Введите время автоудаления ещё раз:\n" \
+        "— до 48 часов (например: 1, 6, 24)\n" \
+        f"— или дата/время по МСК, не позже чем ({limit_dt.strftime('%d.%m.%Y %H:%M')})",
+    )
+    await state.set_state(BroadcastState.waiting_for_auto_delete)
+    await callback.answer()
+@router.callback_query(F.data == "edit_schedule_confirm")
+async def confirm_edit_schedule_callback(callback: types.CallbackQuery, state: FSMContext):
+    data = await state.get_data()
+    b_id = data.get("edit_broadcast_id")
+    dt: datetime = data.get("edit_new_dt")
+    if not b_id or not dt:
+        await callback.answer("Данные потеряны", show_alert=True)
+        await state.clear()
+        return
+    row = await db.conn.execute("SELECT source_chat_id, source_message_id FROM broadcasts WHERE id = ?", (b_id,))
+    src = await row.fetchone()
+    if not src:
+        await callback.answer("Рассылка не найдена", show_alert=True)
+        await state.clear()
+        return
+    await db.set_broadcast_schedule(b_id, dt, src[0], src[1])
+    await callback.message.answer(f"✅ Время рассылки обновлено на {dt.strftime('%d.%m.%Y %H:%M')} (МСК). Укажите при необходимости автоудаление через /panel → 📢 Рассылка → выбранная рассылка.")
+    await state.clear()
+    await callback.answer()
+
+def deletion_status_text(run: BroadcastDeletion) -> str:
+    """Текст сообщения о ходе удаления рассылки"""
+    if not run.finished:
+        text = f"🗑 Удаляю рассылку #{run.broadcast_id}: {run.done} из {run.total}"
+        if run.errors:
+            text += f", ошибок: {run.errors}"
+        return text + f" · {run.elapsed:.0f} с"
+    if not run.total:
+        return f"🗑 Сообщений рассылки #{run.broadcast_id} для удаления нет. Рассылка помечена как удаленная."
+    lines = [
+        f"🗑 Удалено {run.deleted} из {run.total} сообщений рассылки #{run.broadcast_id} "
+        f"за {run.elapsed:.0f} с. Рассылка помечена как удаленная."
+    ]
+    if run.queued:
+        lines.append(f"⏳ Отложено для повтора (временные ошибки): {run.queued}")
+    if run.failed:
+        lines.append(f"❌ Не удалось удалить: {run.failed}. Повторное удаление затронет только оставшиеся сообщения.")
+    return "\n".join(lines)
+
+
+async def delete_with_progress(message: types.Message, broadcast_id: int, reply_markup: Optional[ReplyKeyboardMarkup] = None) -> BroadcastDeletion:
+    """Экстренно удаляет рассылку, обновляя одно сообщение с ходом удаления"""
+    status = await message.answer(f"🗑 Удаляю рассылку #{broadcast_id}…", reply_markup=reply_markup)
+    shown = status.text
+
+    async def show(run: BroadcastDeletion):
+        nonlocal shown
+        text = deletion_status_text(run)
+        # Telegram отвечает ошибкой на правку без изменений
+        if text != shown:
+            await status.edit_text(text)
+            shown = text
+
+    run = await delete_broadcast_messages(broadcast_id, emergency=True, on_progress=show)
+    await show(run)
+    return run
+
+
+@router.callback_query(F.data.startswith("delete_broadcast"))
+async def delete_broadcast_callback(callback: types.CallbackQuery):
+    broadcast_id = int(callback.data.split(":")[1])
+    await callback.answer()
+    # Удаляем сообщения и помечаем рассылку как удаленную
+    await delete_with_progress(callback.message, broadcast_id)
+
+
+# Команда для повторной отправки рассылки админом
+@router.message(Command("resend"))
+@admin_required
+async def cmd_resend(message: types.Message, command: CommandObject):
+    if not command.args:
+        await message.answer("Формат: /resend <id>")
+        return
+    try:
+        b_id = int(command.args.strip())
+    except ValueError:
+        await message.answer("ID должен быть числом")
+        return
+    # сбрасываем флаг, чтобы планировщик не игнорировал;
+    # повторно отправляем только туда, куда пост ещё не дошёл
+    async with db.transaction():
+        await db.reset_broadcast_sent_flag(b_id)
+        await db.reset_failed_deliveries(b_id)
+    await send_broadcast_by_id(b_id)
+    await message.answer(f"♻️ Перезапуск рассылки #{b_id} выполнен")
+
+
+@router.message(Command("delete_last"))
+@admin_required
+async def cmd_delete_last(message: types.Message):
+    broadcast_id = await db.get_last_broadcast_id()
+    if not broadcast_id:
+        await message.answer("Нет прошлых рассылок.")
+        return
+    # Удаляем сообщения и помечаем рассылку как удаленную
+    await delete_with_progress(message, broadcast_id)
@@ -0,0 +1,55 @@
+"""Правка текста рассылки, в том числе уже отправленных сообщений."""
+import logging
+
+from aiogram import Router, types
+from aiogram.fsm.context import FSMContext
+
+from config import LOG_TRACEBACK_SAMPLES
+from handlers.common import admin_reply_keyboard, admin_required
+from loader import bot, db
+from logging_setup import ChatErrorSummary
+from states import MenuState
+
+logger = logging.getLogger(__name__)
+# Подключается последним: состояние ввода нового текста не должно перехватывать
+# кнопки и команды других роутеров
+router = Router(name=__name__)
+
+
+@router.message(MenuState.broadcast_edit_content_wait)
+@admin_required
+async def process_broadcast_edit_content(message: types.Message, state: FSMContext):
+    data = await state.get_data()
+    b_id = data.get("edit_broadcast_id") or data.get("manage_broadcast_id")
+    if not b_id:
+        await message.answer("ID рассылки потерян.")
+        await state.clear()
+        return
+    new_text = message.text
+    if not new_text:
+        await message.answer("Нужно отправить текстовое сообщение.")
+        return
+
+    # Обновляем контент для будущих отправок
+    await db.update_broadcast_text_content(b_id, new_text)
+
+    # Пытаемся обновить уже отправленные сообщения
+    messages = await db.get_broadcast_messages(b_id)
+    updated = 0
+    errors = ChatErrorSummary(logger, "правка текста", b_id, traceback_samples=LOG_TRACEBACK_SAMPLES)
+    for chat_id, msg_id in messages:
+        try:
+            await bot.edit_message_text(chat_id=chat_id, message_id=msg_id, text=new_text, disable_web_page_preview=True)
+            updated += 1
+        except Exception as e:
+            errors.add(chat_id, e)
+    errors.flush()
+    # Определяем статус рассылки
+    row = await db.conn.execute("SELECT sent FROM broadcasts WHERE id = ?", (b_id,))
+    r = await row.fetchone()
+    is_sent = bool(r and r[0])
+    if not is_sent:
+        await message.answer("✅ Содержимое обновлено.", reply_markup=admin_reply_keyboard())
+    else:
+        await message.answer(f"✅ Содержимое обновлено в {updated} группах", reply_markup=admin_reply_keyboard())
+    await state.clear()
@@ -0,0 +1,183 @@
+"""Меню «📢 Рассылка»: список рассылок, управление выбранной, перенос времени."""
+import logging
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from aiogram import F, Router, types
+from aiogram.fsm.context import FSMContext
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+import schedule_parser
+from handlers.broadcast import broadcast_save_message, cmd_broadcast, delete_with_progress
+from handlers.common import admin_reply_keyboard, admin_required
+from handlers.screens import show_broadcast_manage_screen, show_broadcast_menu
+from helpers import now_msk_naive
+from loader import db
+from states import BroadcastState, MenuState
+
+logger = logging.getLogger(__name__)
+router = Router(name=__name__)
+
+
+# ---- Глобальная кнопка Назад ---- #
+
+@router.message(F.text.contains("Назад"))
+@admin_required
+async def handle_back_button(message: types.Message, state: FSMContext):
+    current_state = await state.get_state()
+    logger.debug("handle_back_button: current state=%s", current_state)
+    await state.clear()
+    await message.answer("🏠 Вернулись в главное меню", reply_markup=admin_reply_keyboard())
+
+
+# ---- Обработчики меню (кнопки) ---- #
+
+# Рассылка
+@router.message(F.text == "📢 Рассылка")
+@admin_required
+async def handle_broadcast_button(message: types.Message, state: FSMContext):
+    await show_broadcast_menu(message, state)
+
+
+# ----- Меню управления рассылками ----- #
+
+@router.message(MenuState.broadcast_menu)
+@admin_required
+async def process_broadcast_menu(message: types.Message, state: FSMContext):
+    # Если в меню рассылок пользователь сразу присылает сообщение (текст/медиа),
+    # воспринимаем это как создание новой рассылки без нажатия кнопки
+    if message.content_type != "text":
+        await broadcast_save_message(message, state)
+        return
+
+    txt = message.text or ""
+    if txt not in ("⬅️ Назад", "➕ Новая рассылка") and not txt.startswith("№") and txt.strip():
+        # Текст, который не является кнопкой и не выбором рассылки —
+        # трактуем как сообщение новой рассылки
+        await broadcast_save_message(message, state)
+        return
+    if txt == "⬅️ Назад":
+        await state.clear()
+        await message.answer("🏠 Вернулись в главное меню", reply_markup=admin_reply_keyboard())
+        return
+    if txt == "➕ Новая рассылка":
+        await cmd_broadcast(message, state)  # запускаем процесс новой рассылки
+        return
+    if txt.startswith("№"):
+        try:
+            b_id = int(txt.split(".", 1)[0][1:])
+        except (ValueError, IndexError):
+            await message.answer("Неверный формат номера рассылки.")
+            return
+        
+        await show_broadcast_manage_screen(message, state, b_id)
+        return
+    
+    await message.answer("Пожалуйста, используйте кнопки.")
+
+
+# ----- Удаление выбранной рассылки ----- #
+
+@router.message(MenuState.broadcast_manage_show)
+@admin_required
+async def process_broadcast_manage(message: types.Message, state: FSMContext):
+    if message.text == "⬅️ Назад":
+        # возвращаемся к списку рассылок
+        await handle_broadcast_button(message, state)
+        return
+    if message.text in ("⏰ Изменить время", "⏰ Изменить время публикации"):
+        b_id = (await state.get_data()).get("manage_broadcast_id")
+        if not b_id:
+            await message.answer("ID рассылки потерян.")
+            await state.clear()
+            return
+        await state.update_data(edit_broadcast_id=b_id)
+        await message.answer("Введите новую дату/время для рассылки (МСК):")
+        await state.set_state(MenuState.broadcast_manage_edit_time)
+        return
+
+    if message.text in ("🧹 Установить время удаления", "🧹 Изменить время удаления", "🗑️ Изменить время удаления"):
+        b_id = (await state.get_data()).get("manage_broadcast_id")
+        if not b_id:
+            await message.answer("ID рассылки потерян.")
+            await state.clear()
+            return
+        # Берём scheduled_at из БД, чтобы считать лимит от времени публикации
+        row = await db.conn.execute("SELECT scheduled_at FROM broadcasts WHERE id = ?", (b_id,))
+        r = await row.fetchone()
+        scheduled_dt = None
+        if r and r[0]:
+            try:
+                dt = datetime.fromisoformat(r[0])
+                if dt.tzinfo is not None:
+                    dt = dt.astimezone(ZoneInfo("Europe/Moscow")).replace(tzinfo=None)
+                scheduled_dt = dt
+            except Exception:
+                scheduled_dt = None
+        await state.update_data(broadcast_id=b_id, scheduled_dt=scheduled_dt, schedule_pending=False)
+        limit_dt = (scheduled_dt or now_msk_naive()) + timedelta(hours=48)
+        kb = InlineKeyboardMarkup(
+            inline_keyboard=[[InlineKeyboardButton(text="🚫 Не удалять автоматически", callback_data="auto_del_skip")]]
+        )
+        await message.answer(
+            "Через сколько часов удалить пост?\n" \
+            "— до 48 часов (например: 1, 6, 24)\n" \
+            f"— или укажите дату и время (МСК), не позже чем через 48 часов ({limit_dt.strftime('%d.%m.%Y %H:%M')})\n\n" \
+            "Нажмите кнопку, если не нужно удалять автоматически.",
+            reply_markup=kb,
+        )
+        await state.set_state(BroadcastState.waiting_for_auto_delete)
+        return
+
+    if message.text == "✏️ Изменить содержимое":
+        b_id = (await state.get_data()).get("manage_broadcast_id")
+        if not b_id:
+            await message.answer("ID рассылки потерян.")
+            await state.clear()
+            return
+        await state.update_data(edit_broadcast_id=b_id)
+        await message.answer("Отправьте новый текст для замены содержимого поста.")
+        await state.set_state(MenuState.broadcast_edit_content_wait)
+        return
+
+    if message.text == "🗑 Удалить рассылку":
+        data = await state.get_data()
+        b_id = data.get("manage_broadcast_id")
+        if not b_id:
+            await message.answer("ID рассылки потерян.")
+            await state.clear()
+            return
+
+        # Удаляем сообщения и помечаем рассылку как удаленную
+        await state.clear()
+        await delete_with_progress(message, b_id, reply_markup=admin_reply_keyboard())
+        return
+
+    await message.answer("Используйте кнопки управления рассылкой.")
+
+
+# ---- Изменение времени рассылки ---- #
+@router.message(MenuState.broadcast_manage_edit_time)
+@admin_required
+async def process_broadcast_edit_time(message: types.Message, state: FSMContext):
+    text = message.text.strip()
+    dt = await schedule_parser.parse_datetime(text, now_msk_naive())
+    if not dt:
+        await message.answer("Не удалось распознать дату/время. Попробуйте ещё раз.")
+        return
+    data = await state.get_data()
+    b_id = data.get("edit_broadcast_id")
+    if not b_id:
+        await message.answer("ID рассылки потерян.")
+        await state.clear()
+        return
+
+    # Сохраняем выбранное время в FSM и спрашиваем подтверждение
+    await state.update_data(edit_new_dt=dt)
+    confirm_kb = InlineKeyboardMarkup(
+        inline_keyboard=[[InlineKeyboardButton(text="✅ Подтвердить", callback_data="edit_schedule_confirm"), InlineKeyboardButton(text="❌ Отмена", callback_data="cancel")]]
+    )
+    await message.answer(
+        f"Подтвердить новое время: {dt.strftime('%d.%m.%Y %H:%M')} (МСК)?",
+        reply_markup=confirm_kb,
+    )
@@ -0,0 +1,83 @@
+"""Команды администратора: /start, /help, /myid, сегменты."""
+import logging
+
+from aiogram import Router, types
+from aiogram.filters import Command, CommandObject
+from aiogram.utils.keyboard import ReplyKeyboardBuilder
+
+from handlers.common import admin_reply_keyboard, admin_required, is_admin
+from loader import db
+
+logger = logging.getLogger(__name__)
+router = Router(name=__name__)
+
+
+# ---- Команды администратора ---- #
+
+@router.message(Command("start"))
+async def cmd_start(message: types.Message):
+    if await is_admin(message.from_user.id):
+        await message.answer(
+            "🏠 Добро пожаловать в админ-панель бота!\n\n"
+            "Используйте кнопки ниже для управления ⬇️",
+            reply_markup=admin_reply_keyboard()
+        )
+    else:
+        await message.answer("Привет! Это бот для рассылки сообщений в группы.")
+
+
+@router.message(Command("myid"))
+async def cmd_myid(message: types.Message):
+    await message.answer(f"Ваш Telegram ID: <code>{message.from_user.id}</code>")
+
+
+@router.message(Command("help"))
+async def cmd_help(message: types.Message):
+    if await is_admin(message.from_user.id):
+        await message.answer(
+            (
+                "🔧 <b>Команды администратора:</b>\n\n"
+                "/create_list &lt;название&gt; — создать список групп\n"
+                "/lists — показать все сегменты\n"
+                "/groups — показать все группы и их привязки\n"
+                "/assign &lt;chat_id&gt; &lt;список&gt; — привязать группу к списку\n"
+                "/broadcast — начать рассылку\n"
+                "/delete_last — удалить последнюю рассылку\n"
+                "/panel — панель управления с кнопками\n"
+                "/debug — задержка цикла событий и последние зависания\n"
+                "/perf — время обработчиков (p50/p95/p99) и медленные обновления\n"
+                "/profile, /memsnap — профиль CPU и рост памяти (только супер-админ)\n\n"
+                "📋 <b>Как работать:</b>\n"
+                "1. Добавьте бота в группы (он автоматически зарегистрируется)\n"
+                "2. Используйте /groups чтобы увидеть все группы\n"
+                "3. Привяжите группы к спискам через /assign\n"
+                "4. Делайте рассылки через /panel или /broadcast"
+            )
+        )
+    else:
+        await message.answer("Привет! Это бот для рассылки сообщений в группы.")
+
+
+@router.message(Command("create_list"))
+@admin_required
+async def cmd_create_list(message: types.Message, command: CommandObject):
+    if not command.args:
+        await message.answer("Укажите название: /create_list &lt;название&gt;")
+        return
+    await db.create_list(command.args.strip())
+    await message.answer(f"✅ Список <b>{command.args.strip()}</b> создан или уже существовал.")
+
+
+@router.message(Command("segments"))
+@admin_required
+async def cmd_lists(message: types.Message):
+    lists = await db.get_lists()
+    kb = ReplyKeyboardBuilder()
+    kb.button(text="➕ Создать сегмент")
+    kb.button(text="⬅️ Назад")
+    kb.adjust(1)
+    if not lists:
+        await message.answer("Пока нет ни одного сегмента. Используйте ➕ Создать сегмент.", reply_markup=kb.as_markup(resize_keyboard=True))
+        return
+    text = "\n".join([f"<b>{list_id}</b> — {name}" for list_id, name in lists])
+    await message.answer(f"📂 Сегменты групп:\n{text}", reply_markup=kb.as_markup(resize_keyboard=True))
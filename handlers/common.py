@@ -0,0 +1,93 @@
+"""Проверка прав, клавиатуры и отправка длинных ответов — общее для всех роутеров."""
+import functools
+from typing import List, Optional
+
+from aiogram import types
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup
+from aiogram.utils.keyboard import ReplyKeyboardBuilder
+
+from helpers import split_message
+from loader import db
+
+
+# ---- Вспомогательные функции ---- #
+
+async def is_admin(user_id: int) -> bool:
+    """Проверяет, является ли пользователь администратором в базе данных"""
+    return await db.is_admin(user_id)
+
+async def is_super_admin(user_id: int) -> bool:
+    """Проверяет, является ли пользователь супер-админом"""
+    return await db.is_super_admin(user_id)
+
+
+def admin_required(func):
+    """Декоратор для проверки прав администратора и фильтра лишних аргументов."""
+
+    import inspect
+    sig = inspect.signature(func)
+    allowed_params = set(sig.parameters.keys())
+
+    # wraps сохраняет имя исходной функции (нужно метрикам обработчиков), __doc__ и __wrapped__
+    @functools.wraps(func)
+    async def wrapper(message: types.Message, *args, **kwargs):
+        if not await is_admin(message.from_user.id):
+            await message.answer("⛔️ У вас нет доступа к этой команде.")
+            return
+        # Оставляем только те kwargs, которые реально есть в целевой функции
+        filtered_kwargs = {k: v for k, v in kwargs.items() if k in allowed_params}
+        return await func(message, *args, **filtered_kwargs)
+
+    return wrapper
+
+
+def super_admin_required(func):
+    """Как admin_required, но только для супер-админа."""
+
+    import inspect
+    sig = inspect.signature(func)
+    allowed_params = set(sig.parameters.keys())
+
+    @functools.wraps(func)
+    async def wrapper(message: types.Message, *args, **kwargs):
+        if not await is_super_admin(message.from_user.id):
+            await message.answer("⛔️ Команда доступна только супер-админу.")
+            return
+        filtered_kwargs = {k: v for k, v in kwargs.items() if k in allowed_params}
+        return await func(message, *args, **filtered_kwargs)
+
+    return wrapper
+
+
+async def build_lists_keyboard() -> InlineKeyboardMarkup:
+    lists: List[tuple] = await db.get_lists()
+    if not lists:
+        return InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="Нет списков", callback_data="noop")]])
+    keyboard = [
+        [InlineKeyboardButton(text=name, callback_data=f"choose_list:{list_id}")]
+        for list_id, name in lists
+    ]
+    keyboard.append([InlineKeyboardButton(text="❌ Отмена", callback_data="cancel")])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
+async def send_long_message_with_keyboard(message: types.Message, text: str, reply_markup: Optional[ReplyKeyboardMarkup] = None, chunk_size: int = 4000):
+    """Отправляет длинный текст несколькими сообщениями, чтобы не превышать лимит Telegram.
+
+    Первый фрагмент отправляется с переданной клавиатурой (если она есть),
+    остальные уже без неё, чтобы не дублировать клавиатуру.
+    """
+    chunks = split_message(text, chunk_size)
+    for i, chunk in enumerate(chunks):
+        await message.answer(chunk, reply_markup=reply_markup if i == 0 else None)
+
+
+def admin_reply_keyboard() -> ReplyKeyboardMarkup:
+    """Фиксированная клавиатура администратора"""
+    kb = ReplyKeyboardBuilder()
+    kb.button(text="📢 Рассылка")
+    kb.button(text="📂 Сегменты")
+    kb.button(text="🎓 Группы") 
+    kb.button(text="⚙️ Настройки")
+    kb.adjust(2, 2)  # два ряда
+    return kb.as_markup(resize_keyboard=True, persistent=True)
@@ -0,0 +1,105 @@
+"""Диагностика: /debug — задержка цикла событий и зависания со стеком, /perf — время обработчиков."""
+import asyncio
+import html
+import logging
+from typing import List
+
+from aiogram import Router, types
+from aiogram.filters import Command, CommandObject
+
+from handlers.common import admin_required
+from loader import loop_monitor, perf_monitor
+
+logger = logging.getLogger(__name__)
+router = Router(name=__name__)
+
+# Сколько последних кадров стека показывать в чате (полный стек — в логе)
+STACK_FRAMES_SHOWN = 6
+MESSAGE_LIMIT = 4000
+
+
+@router.message(Command("debug"))
+@admin_required
+async def cmd_debug(message: types.Message, command: CommandObject):
+    """/debug [N] — статистика задержки цикла и N последних зависаний (по умолчанию 5)"""
+    arg = (command.args or "").strip()
+    limit = int(arg) if arg.isdigit() else 5
+
+    stats = loop_monitor.stats()
+    started = loop_monitor.started_at.strftime("%d.%m %H:%M:%S") if loop_monitor.started_at else "не запущен"
+    lines = [
+        "🩺 <b>Цикл событий</b>",
+        f"Сторож работает с {started}, замер каждые {loop_monitor.interval * 1000:.0f} мс, "
+        f"порог зависания {loop_monitor.threshold * 1000:.0f} мс",
+        f"Задержка за последние {stats['samples']} замеров: p50 {stats['p50'] * 1000:.1f} мс, "
+        f"p99 {stats['p99'] * 1000:.1f} мс, max {stats['window_max'] * 1000:.0f} мс",
+        f"Максимум с запуска: {stats['max'] * 1000:.0f} мс, зависаний: {stats['stalls']}",
+        f"Задач asyncio: {len(asyncio.all_tasks())}",
+    ]
+    stalls = list(loop_monitor.stalls)[-limit:] if limit else []
+    if stalls:
+        lines.append(f"\n<b>Последние зависания ({len(stalls)}):</b>")
+    # Каждое зависание — целый блок: <pre> нельзя разрезать между сообщениями
+    blocks = ["\n".join(lines)]
+    for stall in reversed(stalls):
+        block = (
+            f"⏱ {stall.at.strftime('%d.%m %H:%M:%S')} — {stall.lag * 1000:.0f} мс\n"
+            f"Где: <code>{html.escape(stall.culprit)}</code>\n"
+            f"Задача: <code>{html.escape(stall.task)}</code>"
+        )
+        if stall.stack:
+            frames = "".join(stall.stack[-STACK_FRAMES_SHOWN:]).rstrip()
+            block += f"\n<pre>{html.escape(frames[-3000:])}</pre>"
+        blocks.append(block)
+
+    await answer_blocks(message, blocks)
+
+
+@router.message(Command("perf"))
+@admin_required
+async def cmd_perf(message: types.Message, command: CommandObject):
+    """/perf [N] — N самых медленных по p95 обработчиков (по умолчанию 15) и последние медленные обновления; /perf reset — сброс"""
+    arg = (command.args or "").strip().lower()
+    if arg == "reset":
+        perf_monitor.reset()
+        await message.answer("🧹 Статистика обработчиков сброшена")
+        return
+    limit = int(arg) if arg.isdigit() else 15
+
+    rows = perf_monitor.report()
+    lines = [
+        "📈 <b>Обработчики</b>",
+        f"С {perf_monitor.started_at.strftime('%d.%m %H:%M:%S')}, окно {perf_monitor.window} замеров, "
+        f"медленные — от {perf_monitor.slow_threshold * 1000:.0f} мс",
+    ]
+    if not rows:
+        lines.append("Замеров пока нет")
+    blocks = ["\n".join(lines)]
+    for handler, state, s in rows[:limit]:
+        blocks.append(
+            f"<code>{html.escape(handler)}</code> [{html.escape(state)}]\n"
+            f"{s['count']}×, p50 {s['p50'] * 1000:.0f} / p95 {s['p95'] * 1000:.0f} / "
+            f"p99 {s['p99'] * 1000:.0f} мс, max {s['max'] * 1000:.0f} мс, медленных {s['slow']}\n"
+            f"На обновление: запросов к БД {s['db_per_update']:.1f}, вызовов Bot API {s['api_per_update']:.1f}"
+        )
+    slow = list(perf_monitor.slow)
+    if slow:
+        blocks.append(f"<b>Последние медленные ({len(slow)}):</b>")
+    for item in reversed(slow):
+        blocks.append(
+            f"⏱ {item.at.strftime('%d.%m %H:%M:%S')} — <code>{html.escape(item.handler)}</code> "
+            f"[{html.escape(item.state)}]: {item.duration * 1000:.0f} мс\n"
+            f"БД: {item.db_calls} ({item.db_time * 1000:.0f} мс), Bot API: {item.api_calls} ({item.api_time * 1000:.0f} мс)"
+        )
+    await answer_blocks(message, blocks)
+
+
+async def answer_blocks(message: types.Message, blocks: List[str]):
+    """Отправляет блоки, собирая их в сообщения до MESSAGE_LIMIT символов; блок не разрезается"""
+    text = ""
+    for block in blocks:
+        if text and len(text) + len(block) + 2 > MESSAGE_LIMIT:
+            await message.answer(text)
+            text = ""
+        text = f"{text}\n\n{block}" if text else block
+    await message.answer(text)
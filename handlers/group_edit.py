@@ -0,0 +1,431 @@
+"""Редактирование группы: поиск, сегменты группы, просмотр сегмента, правки через ИИ."""
+import logging
+
+from aiogram import F, Router, types
+from aiogram.fsm.context import FSMContext
+from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
+from aiogram.utils.keyboard import ReplyKeyboardBuilder
+
+from handlers.common import admin_reply_keyboard, admin_required, send_long_message_with_keyboard
+from handlers.segments import handle_create_segment_button, handle_groups_button, handle_lists_button
+from helpers import parse_segment_instructions, search_groups
+from loader import bot, db
+from states import MenuState
+
+logger = logging.getLogger(__name__)
+router = Router(name=__name__)
+
+
+# --- Редактирование группы --- #
+
+@router.message(F.text == "✏️ Редактировать группу")
+@admin_required
+async def edit_school_start(message: types.Message, state: FSMContext):
+    await message.answer(
+        "Введите часть названия группы (рус/eng/транслит):",
+        reply_markup=ReplyKeyboardMarkup(keyboard=[[KeyboardButton(text="❌ Отмена")]], resize_keyboard=True)
+    )
+    await state.set_state(MenuState.edit_search)
+
+
+@router.message(MenuState.edit_search)
+async def edit_school_search(message: types.Message, state: FSMContext):
+    if message.text == "❌ Отмена":
+        await state.clear()
+        await message.answer("✅ Действие отменено.", reply_markup=admin_reply_keyboard())
+        return
+    
+    # Показываем не больше 5 совпадений, поэтому перебор останавливается на пятом
+    matches = search_groups(await db.get_all_groups(), message.text, limit=5)
+
+    if not matches:
+        await message.answer("Не нашёл похожих групп. Попробуйте ещё раз.")
+        return
+    await state.update_data(search_matches=matches)
+
+    if len(matches) == 1:
+        cid, title = matches[0]
+        await state.update_data(selected_group_id=cid, selected_group_title=title)
+        yes_no_kb = ReplyKeyboardMarkup(keyboard=[[KeyboardButton(text="✅ Да"), KeyboardButton(text="❌ Нет")]], resize_keyboard=True)
+        await message.answer(f"Вы имели ввиду <b>{title}</b>?", reply_markup=yes_no_kb)
+        await state.set_state(MenuState.edit_confirm)
+    else:
+        lines = ["Найдены группы:"]
+        for idx, (_, title) in enumerate(matches, 1):
+            lines.append(f"{idx}. {title}")
+        lines.append("\nНапишите номер нужной группы или ❌ Отмена")
+        await message.answer("\n".join(lines))
+        await state.set_state(MenuState.edit_confirm)
+
+
+# ===== Helper: показать меню действий группы ===== #
+
+async def show_edit_actions(message: types.Message, state: FSMContext, group_id: int, title: str):
+    """Отобразить карточку группы с действиями."""
+    segments = await db.get_group_segments(group_id)
+    if segments:
+        seg_text = ", ".join(segments)
+    else:
+        seg_text = "-"
+
+    text = (
+        f"🏫 <b>{title}</b> (ID: <code>{group_id}</code>)\n"
+        f"📂 Сегменты: <b>{seg_text}</b>\n\n"
+        "Выберите действие:"
+    )
+
+    kb = ReplyKeyboardBuilder()
+    kb.button(text="🗑 Удалить группу")
+    kb.button(text="➕ Добавить в сегмент")
+    kb.button(text="❌ Удалить из сегмента")
+    kb.button(text="🤖 Умное управление")
+    kb.button(text="⬅️ Назад")
+    kb.adjust(1)
+    
+    await message.answer(text, reply_markup=kb.as_markup(resize_keyboard=True))
+    await state.set_state(MenuState.edit_actions)
+
+
+@router.message(MenuState.edit_confirm)
+async def edit_school_confirm(message: types.Message, state: FSMContext):
+    txt = message.text.strip().lower()
+    data = await state.get_data()
+    matches = data.get("search_matches", [])
+
+    if txt in ("нет", "❌ нет"):
+        # остаёмся в поиске
+        await state.set_state(MenuState.edit_search)
+        cancel_kb = ReplyKeyboardMarkup(keyboard=[[KeyboardButton(text="❌ Отмена")]], resize_keyboard=True)
+        await message.answer("Введите часть названия группы ещё раз:", reply_markup=cancel_kb)
+        return
+    if txt in ("отмена", "❌ отмена"):
+        await state.clear()
+        await message.answer("✅ Действие отменено.", reply_markup=admin_reply_keyboard())
+        return
+    
+    # обработка ответа после одного варианта
+    if txt in ("✅ да", "да", "✅ Да") and data.get("selected_group_id"):
+        pass  # уже выбрано
+    elif txt.isdigit():
+        idx = int(txt)
+        if not (1 <= idx <= len(matches)):
+            await message.answer("Неверный номер. Попробуйте снова.")
+            return
+        cid, title = matches[idx-1]
+        await state.update_data(selected_group_id=cid, selected_group_title=title)
+    else:
+        await message.answer("Ответ не распознан. Напишите номер или 'да'.")
+        return
+
+    # переходим к действиям
+    data = await state.get_data()
+    title = data.get("selected_group_title")
+    group_id = data.get("selected_group_id")
+
+    await show_edit_actions(message, state, group_id, title)
+
+
+@router.message(MenuState.edit_actions)
+@admin_required
+async def edit_school_actions(message: types.Message, state: FSMContext):
+    txt = message.text or ""
+    data = await state.get_data()
+    group_id = data.get("selected_group_id")
+    title = data.get("selected_group_title")
+    
+    if txt == "⬅️ Назад":
+        await handle_groups_button(message, state)
+        return
+
+    if txt == "🗑 Удалить группу":
+        # кикаем бота
+        try:
+            await bot.leave_chat(group_id)
+        except Exception:
+            pass
+        await db.delete_group(group_id)
+        await message.answer(f"🗑 Группа <b>{title}</b> удалена.", reply_markup=admin_reply_keyboard())
+        await state.clear()
+        return
+    
+    if txt == "➕ Добавить в сегмент":
+        lists = await db.get_lists()
+        if not lists:
+            await message.answer("Сначала создайте сегмент.")
+            return
+        kb = ReplyKeyboardBuilder()
+        for lid, name in lists:
+            kb.button(text=f"📂 {name}")
+        kb.button(text="❌ Отмена")
+        kb.adjust(1)
+        await message.answer("Выберите сегмент:", reply_markup=kb.as_markup(resize_keyboard=True))
+        await state.set_state(MenuState.edit_add_segment)
+        return
+
+    if txt == "❌ Удалить из сегмента":
+        seg_names = await db.get_group_segments(group_id)
+        if not seg_names:
+            await message.answer("Группа не привязана ни к одному сегменту.")
+            return
+        kb = ReplyKeyboardBuilder()
+        for name in seg_names:
+            kb.button(text=f"📂 {name}")
+        kb.button(text="❌ Отмена")
+        kb.adjust(1)
+        await message.answer("Выберите сегмент для отвязки:", reply_markup=kb.as_markup(resize_keyboard=True))
+        await state.set_state(MenuState.edit_remove_segment)
+        return
+
+    if txt == "🤖 Умное управление":
+        await message.answer(
+            "🤖 Напишите в свободной форме, что нужно сделать с сегментами.\n\n"
+            "Примеры:\n"
+            "• «Удали из Все группы, добавь в Календарь и Тестовый»\n"
+            "• «Добавить в VIP сегмент»\n"
+            "• «Исключить из Архива»",
+            reply_markup=ReplyKeyboardMarkup(keyboard=[[KeyboardButton(text="❌ Отмена")]], resize_keyboard=True)
+        )
+        await state.set_state(MenuState.edit_ai_input)
+        return
+    
+    await message.answer("Используйте кнопки для действий.")
+
+
+@router.message(MenuState.edit_add_segment)
+@admin_required
+async def edit_add_segment(message: types.Message, state: FSMContext):
+    if message.text == "❌ Отмена":
+        await state.set_state(MenuState.edit_actions)
+        await message.answer("↩️ Возврат к действиям.")
+        return
+    if not message.text.startswith("📂 "):
+        await message.answer("Пожалуйста, выберите сегмент из кнопок.")
+        return
+    seg_name = message.text[2:].strip()
+    lists = await db.get_lists()
+    seg_id = None
+    for lid, name in lists:
+        if name == seg_name:
+            seg_id = lid
+            break
+    if not seg_id:
+        await message.answer("Сегмент не найден.")
+        return
+    data = await state.get_data()
+    group_id = data.get("selected_group_id")
+    await db.assign_group_to_list(group_id, seg_id)
+    await message.answer(f"🔗 Группа добавлена в сегмент <b>{seg_name}</b>.")
+    title = (await state.get_data()).get("selected_group_title")
+    await show_edit_actions(message, state, group_id, title)
+
+
+@router.message(MenuState.edit_remove_segment)
+@admin_required
+async def edit_remove_segment(message: types.Message, state: FSMContext):
+    if message.text == "❌ Отмена":
+        await state.set_state(MenuState.edit_actions)
+        await message.answer("↩️ Возврат к действиям.")
+        return
+    if not message.text.startswith("📂 "):
+        await message.answer("Выберите сегмент.")
+        return
+    seg_name = message.text[2:].strip()
+    lists = await db.get_lists()
+    seg_id = None
+    for lid, name in lists:
+        if name == seg_name:
+            seg_id = lid
+            break
+    if not seg_id:
+        await message.answer("Сегмент не найден.")
+        return
+    data = await state.get_data()
+    group_id = data.get("selected_group_id")
+    # проверим принадлежит ли
+    seg_names_current = await db.get_group_segments(group_id)
+    if seg_name not in seg_names_current:
+        await message.answer("Группа уже не состоит в этом сегменте.")
+        return
+    await db.remove_group_from_list(group_id, seg_id)
+    await message.answer(f"❌ Группа отвязана от сегмента <b>{seg_name}</b>.")
+    title = (await state.get_data()).get("selected_group_title")
+    await show_edit_actions(message, state, group_id, title)
+
+
+# ======= Просмотр групп сегмента ======= #
+@router.message(MenuState.segment_view_select_list)
+@admin_required
+async def process_segment_view_selection(message: types.Message, state: FSMContext):
+    txt = message.text or ""
+    if txt == "⬅️ Назад":
+        await state.clear()
+        await message.answer("🏠 Вернулись в главное меню", reply_markup=admin_reply_keyboard())
+        return
+    if txt == "📂 Выбрать другой сегмент":
+        await handle_lists_button(message, state)
+        return
+    if txt == "➕ Создать сегмент":
+        await handle_create_segment_button(message, state)
+        return
+    if not txt.startswith("📂 "):
+        await message.answer("Пожалуйста, выберите сегмент из кнопок.")
+        return
+    seg_name = txt[2:].strip()
+    segments = await db.get_lists()
+    seg_id = None
+    for lid, name in segments:
+        if name == seg_name:
+            seg_id = lid
+            break
+    if not seg_id:
+        await message.answer("Сегмент не найден.")
+        return
+    
+    groups_info = await db.get_groups_in_list_detailed(seg_id)
+    total = len(groups_info)
+
+    text_header = (
+        f"📂 <b>Сегмент: {seg_name}</b>\n"
+        f"👥 Групп в сегменте: <b>{total}</b>\n\n"
+    )
+
+    body_lines = []
+    for i, (_, title) in enumerate(groups_info, 1):
+        short_title = title if len(title) <= 25 else title[:25] + "…"
+        body_lines.append(f"{i}. {short_title}")
+
+    kb = ReplyKeyboardBuilder()
+    kb.button(text="📂 Выбрать другой сегмент")
+    kb.button(text="⬅️ Назад")
+    kb.adjust(1)
+    
+    await send_long_message_with_keyboard(
+        message,
+        text_header + "\n".join(body_lines),
+        reply_markup=kb.as_markup(resize_keyboard=True),
+    )
+
+
+# ======= ИИ управление сегментами ======= #
+
+@router.message(MenuState.edit_ai_input)
+@admin_required
+async def edit_ai_input_handler(message: types.Message, state: FSMContext):
+    if message.text == "❌ Отмена":
+        data = await state.get_data()
+        group_id = data.get("selected_group_id")
+        title = data.get("selected_group_title")
+        await show_edit_actions(message, state, group_id, title)
+        return
+    
+    text = message.text.strip()
+    if not text:
+        await message.answer("Пожалуйста, введите инструкции.")
+        return
+    
+    # Получаем все доступные сегменты
+    all_segments = await db.get_lists()
+    segment_names = [name for _, name in all_segments]
+    
+    # Парсим инструкции
+    instructions = parse_segment_instructions(text, segment_names)
+    
+    if not instructions['add'] and not instructions['remove']:
+        error_text = "🤔 Не удалось распознать операции.\n\n"
+        if instructions['errors']:
+            error_text += f"Возможно, вы имели ввиду сегменты: {', '.join(instructions['errors'])}\n\n"
+        error_text += "Попробуйте ещё раз, используя слова: добавить, удалить, включить, исключить."
+        await message.answer(error_text)
+        return
+    
+    # Формируем подтверждение
+    confirm_lines = ["🤖 Понял! Выполню следующие операции:\n"]
+    
+    if instructions['add']:
+        confirm_lines.append(f"➕ Добавить в сегменты: {', '.join(instructions['add'])}")
+    
+    if instructions['remove']:
+        confirm_lines.append(f"❌ Удалить из сегментов: {', '.join(instructions['remove'])}")
+    
+    if instructions['errors']:
+        confirm_lines.append(f"\n⚠️ Не найдены сегменты: {', '.join(instructions['errors'])}")
+    
+    confirm_lines.append("\nВсё правильно?")
+    
+    # Сохраняем операции в state
+    await state.update_data(ai_operations=instructions)
+    
+    kb = ReplyKeyboardMarkup(keyboard=[
+        [KeyboardButton(text="✅ Да, выполнить"), KeyboardButton(text="❌ Нет, исправить")]
+    ], resize_keyboard=True)
+    
+    await message.answer("\n".join(confirm_lines), reply_markup=kb)
+    await state.set_state(MenuState.edit_ai_confirm)
+
+
+@router.message(MenuState.edit_ai_confirm)
+@admin_required
+async def edit_ai_confirm_handler(message: types.Message, state: FSMContext):
+    data = await state.get_data()
+    group_id = data.get("selected_group_id")
+    title = data.get("selected_group_title")
+    
+    if message.text == "❌ Нет, исправить":
+        await message.answer(
+            "🤖 Введите инструкции ещё раз:",
+            reply_markup=ReplyKeyboardMarkup(keyboard=[[KeyboardButton(text="❌ Отмена")]], resize_keyboard=True)
+        )
+        await state.set_state(MenuState.edit_ai_input)
+        return
+    
+    if message.text == "✅ Да, выполнить":
+        operations = data.get("ai_operations", {})
+        
+        results = []
+        
+        # Все изменения сегментов группы — одной транзакцией
+        async with db.transaction():
+            # Выполняем удаления
+            for segment_name in operations.get('remove', []):
+                segments = await db.get_lists()
+                seg_id = None
+                for lid, name in segments:
+                    if name == segment_name:
+                        seg_id = lid
+                        break
+            
+                if seg_id:
+                    current_segments = await db.get_group_segments(group_id)
+                    if segment_name in current_segments:
+                        await db.remove_group_from_list(group_id, seg_id)
+                        results.append(f"❌ Удалена из «{segment_name}»")
+                    else:
+                        results.append(f"⚠️ Не была в «{segment_name}»")
+        
+            # Выполняем добавления
+            for segment_name in operations.get('add', []):
+                segments = await db.get_lists()
+                seg_id = None
+                for lid, name in segments:
+                    if name == segment_name:
+                        seg_id = lid
+                        break
+            
+                if seg_id:
+                    current_segments = await db.get_group_segments(group_id)
+                    if segment_name not in current_segments:
+                        await db.assign_group_to_list(group_id, seg_id)
+                        results.append(f"➕ Добавлена в «{segment_name}»")
+                    else:
+                        results.append(f"⚠️ Уже была в «{segment_name}»")
+        
+        if results:
+            await message.answer("✅ Операции выполнены:\n\n" + "\n".join(results))
+        else:
+            await message.answer("🤔 Нечего было изменить.")
+        
+        # Возвращаемся к меню действий
+        await show_edit_actions(message, state, group_id, title)
+        return
+    
+    await message.answer("Используйте кнопки для ответа.")
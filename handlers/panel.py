@@ -0,0 +1,76 @@
+"""Команды управления группами (/groups, /assign) и вход в админ-панель."""
+import logging
+
+from aiogram import Router, types
+from aiogram.filters import Command, CommandObject
+
+from handlers.common import admin_reply_keyboard, admin_required
+from loader import db
+
+logger = logging.getLogger(__name__)
+router = Router(name=__name__)
+
+
+# ---- Команды управления группами ---- #
+
+@router.message(Command("groups"))
+@admin_required
+async def cmd_groups(message: types.Message):
+    groups = await db.get_all_groups()
+    if not groups:
+        await message.answer("Пока нет зарегистрированных групп.")
+        return
+    
+    total = len(groups)
+    # берём последние 3 добавленные (по порядку в БД)
+    last_three = list(reversed(groups))[:3]
+
+    text = (
+        f"🎓 Всего групп: <b>{total}</b>\n\n"
+        f"🆕 Последние группы:\n"
+    )
+
+    for chat_id, title in last_three:
+        text += f"• <b>{title}</b> (ID: <code>{chat_id}</code>)\n"
+    
+    await message.answer(text)
+
+
+@router.message(Command("assign"))
+@admin_required
+async def cmd_assign_group(message: types.Message, command: CommandObject):
+    if not command.args:
+        await message.answer("Формат: /assign &lt;chat_id&gt; &lt;название_списка&gt;\nИспользуйте /groups чтобы увидеть ID групп")
+        return
+    
+    args = command.args.split(" ", 1)
+    if len(args) != 2:
+        await message.answer("Формат: /assign &lt;chat_id&gt; &lt;название_списка&gt;")
+        return
+    
+    try:
+        chat_id = int(args[0])
+        list_name = args[1].strip()
+    except ValueError:
+        await message.answer("Chat ID должен быть числом")
+        return
+    
+    # Проверяем существование списка
+    list_row = await db.get_list_by_name(list_name)
+    if not list_row:
+        await message.answer(f"Список '{list_name}' не найден. Создайте его командой /create_list")
+        return
+    
+    list_id = list_row[0]
+    await db.assign_group_to_list(chat_id, list_id)
+    await message.answer(f"✅ Группа {chat_id} привязана к списку <b>{list_name}</b>")
+
+
+@router.message(Command("panel"))
+@admin_required
+async def cmd_panel(message: types.Message):
+    await message.answer(
+        "🏠 Админ-панель активирована!\n\n"
+        "Используйте кнопки ниже для управления ⬇️",
+        reply_markup=admin_reply_keyboard()
+    )
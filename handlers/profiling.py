@@ -0,0 +1,99 @@
+"""Профилирование по команде супер-админа: /profile — CPU цикла событий, /memsnap — рост памяти."""
+import asyncio
+import html
+import logging
+from typing import Set
+
+from aiogram import Router, types
+from aiogram.filters import Command, CommandObject
+from aiogram.types import BufferedInputFile
+
+from config import PROFILE_MAX_SECONDS
+from handlers.common import super_admin_required
+from loader import cpu_profiler, memory_tracer
+from profiling import profile_files, summary_lines
+
+logger = logging.getLogger(__name__)
+router = Router(name=__name__)
+
+DEFAULT_PROFILE_SECONDS = 30
+
+# Ссылки на фоновые сеансы, чтобы задачи не собрал сборщик мусора
+_sessions: Set[asyncio.Task] = set()
+
+
+@router.message(Command("profile"))
+@super_admin_required
+async def cmd_profile(message: types.Message, command: CommandObject):
+    """/profile [секунды] — выборочный профиль цикла событий; /profile stop — завершить досрочно"""
+    arg = (command.args or "").strip().lower()
+    if arg == "stop":
+        if not cpu_profiler.active:
+            await message.answer("Профилирование не идёт")
+            return
+        cpu_profiler.stop()
+        return
+    if cpu_profiler.active:
+        await message.answer("⏳ Профилирование уже идёт. Досрочно завершить: /profile stop")
+        return
+    seconds = min(int(arg), PROFILE_MAX_SECONDS) if arg.isdigit() and int(arg) > 0 else DEFAULT_PROFILE_SECONDS
+
+    await message.answer(
+        f"🔬 Профилирую цикл событий {seconds} с (выборка каждые {cpu_profiler.interval * 1000:.0f} мс). "
+        f"Досрочно завершить: /profile stop"
+    )
+    # Сеанс идёт в фоне: обработчик не занимает обновление на всё время замера
+    task = asyncio.create_task(_profile_session(message, seconds))
+    _sessions.add(task)
+    task.add_done_callback(_sessions.discard)
+
+
+async def _profile_session(message: types.Message, seconds: int):
+    try:
+        profile = await cpu_profiler.run(seconds)
+        logger.info(
+            f"Профиль цикла событий: {profile.samples} выборок за {profile.duration:.1f} с",
+            extra={"samples": profile.samples, "idle": profile.idle},
+        )
+        files = list(profile_files(profile).items())
+        # В именах функций бывают <listcomp> и <module>, а подпись разбирается как HTML
+        caption = html.escape("\n".join(summary_lines(profile))[:1000])
+        for i, (name, content) in enumerate(files):
+            await message.answer_document(
+                BufferedInputFile(content.encode(), filename=name),
+                caption=caption if i == 0 else "Стеки для flamegraph.pl / speedscope",
+            )
+    except Exception as e:
+        logger.exception(f"Профилирование не удалось: {e}")
+        await message.answer(f"❌ Профилирование не удалось: {e}")
+
+
+@router.message(Command("memsnap"))
+@super_admin_required
+async def cmd_memsnap(message: types.Message, command: CommandObject):
+    """/memsnap — включить tracemalloc или снять снимок и сравнить с прошлым; /memsnap stop — выключить"""
+    arg = (command.args or "").strip().lower()
+    if arg == "stop":
+        if not memory_tracer.active:
+            await message.answer("Трассировка памяти не запущена")
+            return
+        memory_tracer.stop()
+        await message.answer("🧹 Трассировка памяти выключена, снимки удалены")
+        return
+
+    if not memory_tracer.active:
+        current, _ = await memory_tracer.start()
+        await message.answer(
+            f"🧠 Трассировка памяти включена ({memory_tracer.frames} кадров), исходный снимок снят "
+            f"({current / 1024 / 1024:.1f} МБ под наблюдением).\n"
+            f"Следующий /memsnap покажет рост; /memsnap stop — выключить (tracemalloc замедляет выделение памяти)"
+        )
+        return
+
+    report = await memory_tracer.snapshot()
+    taken_at = memory_tracer.last[1]
+    head = report.split("\n\n", 2)
+    await message.answer_document(
+        BufferedInputFile(report.encode(), filename=f"memsnap-{taken_at:%Y%m%d-%H%M%S}.txt"),
+        caption=html.escape("\n\n".join(head[:2])[:1000]),
+    )
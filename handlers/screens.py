@@ -0,0 +1,165 @@
+"""Экраны меню рассылок, которые открываются из нескольких роутеров."""
+from aiogram import types
+from aiogram.fsm.context import FSMContext
+from aiogram.utils.keyboard import ReplyKeyboardBuilder
+
+from handlers.common import send_long_message_with_keyboard
+from helpers import now_msk_naive, utc_str_to_msk_str, format_scheduled_str
+from loader import db
+from states import MenuState
+
+
+# ----- Меню рассылок ----- #
+
+async def show_broadcast_menu(message: types.Message, state: FSMContext):
+    """Показывает меню рассылок без проверки прав (можно вызывать из callback)."""
+    all_broadcasts = await db.get_recent_broadcasts_with_message_count(30)
+
+    kb = ReplyKeyboardBuilder()
+    # Сначала кнопка создания новой рассылки
+    kb.button(text="➕ Новая рассылка")
+    # Затем список всех рассылок
+    for b_id, date, seg_name, ctype, content, message_count, deleted in all_broadcasts:
+        content_preview = (content or ctype or "")[:30] + "…"
+        if deleted:
+            msg_info = "удалена"
+        elif message_count == 0:
+            msg_info = "нет сообщений"
+        else:
+            msg_info = f"{message_count} сообщений"
+        title = f"№{b_id}. {seg_name or 'Без сегмента'}, «{content_preview}» ({msg_info})"
+        kb.button(text=title)
+    kb.button(text="⬅️ Назад")
+    kb.adjust(1)
+    txt_lines = ["📢 Управление рассылками"]
+    if all_broadcasts:
+        txt_lines.append(f"Показаны последние {len(all_broadcasts)} рассылок")
+        txt_lines.append("Выберите рассылку для управления или создайте новую.")
+    else:
+        txt_lines.append("Пока нет рассылок. Создайте первую!")
+    await send_long_message_with_keyboard(
+        message,
+        "\n".join(txt_lines),
+        reply_markup=kb.as_markup(resize_keyboard=True),
+    )
+    await state.set_state(MenuState.broadcast_menu)
+
+
+# ----- Функция для отображения экрана управления рассылкой ----- #
+
+async def show_broadcast_manage_screen(message: types.Message, state: FSMContext, broadcast_id: int):
+    """Отображает экран управления конкретной рассылкой"""
+    cursor = await db.conn.execute(
+        "SELECT date, scheduled_at, sent, content_type, content, list_id, deleted, auto_delete_at FROM broadcasts WHERE id = ?",
+        (broadcast_id,)
+    )
+    row = await cursor.fetchone()
+    if not row:
+        await message.answer("Рассылка не найдена.")
+        return
+
+    date, scheduled_at, sent_flag, ctype, content, list_id, deleted, auto_delete_at = row
+    seg_row = await db.conn.execute("SELECT name FROM lists WHERE id = ?", (list_id,))
+    seg = await seg_row.fetchone()
+    seg_name = seg[0] if seg else "-"
+
+    # Формируем красивый preview с указанием типа контента
+    def format_content_preview(content_type: str, text_content: str) -> str:
+        """Форматирует preview содержимого рассылки в зависимости от типа"""
+        
+        # Определяем тип контента и emoji
+        type_names = {
+            "text": "Текст",
+            "photo": "Изображение",
+            "video": "Видео", 
+            "video_note": "Видеосообщение",
+            "voice": "Голосовое сообщение",
+            "audio": "Аудио",
+            "document": "Документ",
+            "animation": "GIF",
+            "sticker": "Стикер",
+            "location": "Геолокация",
+            "contact": "Контакт"
+        }
+        
+        type_name = type_names.get(content_type, "Сообщение")
+        
+        if not text_content:
+            # Если нет текста, показываем только тип
+            return f"{type_name}"
+        else:
+            # Если есть текст, показываем тип + первые 50 символов
+            short_text = text_content[:50]
+            if len(text_content) > 50:
+                short_text += "..."
+                
+            if content_type == "text":
+                return f"«{short_text}»"
+            else:
+                return f"{type_name} и текст: «{short_text}»"
+    
+    preview = format_content_preview(ctype, content)
+    
+    # Сообщения, которые не удалось удалить (например, из-за ошибок Bot API), можно удалить повторно
+    undeleted = await db.count_undeleted_messages(broadcast_id) if deleted else 0
+
+    # Определяем статус рассылки с учётом времени
+    if deleted:
+        status_text = "🗑 <b>УДАЛЕНА</b>"
+        if undeleted:
+            status_text += f" (не удалено в {undeleted} чатах)"
+    elif sent_flag:
+        status_text = "✅ <b>Отправлена</b>"
+    else:
+        # Рассылка не отправлена
+        if not scheduled_at:
+            status_text = "📝 <b>Черновик</b>"
+        else:
+            # Парсим время из строки и сравниваем с текущим временем
+            try:
+                from datetime import datetime
+                scheduled_dt = datetime.fromisoformat(scheduled_at) if isinstance(scheduled_at, str) else scheduled_at
+                current_time = now_msk_naive()
+                
+                if scheduled_dt <= current_time:
+                    status_text = "❌ <b>Просрочена</b>"
+                else:
+                    status_text = "⏳ <b>Запланирована</b>"
+            except Exception:
+                # Если что-то пошло не так с парсингом времени
+                status_text = "⏳ <b>Запланирована</b>"
+    
+    schedule_info = format_scheduled_str(scheduled_at) if scheduled_at else "не задано"
+    auto_del_info = format_scheduled_str(auto_delete_at) if auto_delete_at else "не установлено"
+    created_info = utc_str_to_msk_str(date) if isinstance(date, str) else str(date)
+    text = (
+        f"📰 <b>Рассылка #{broadcast_id}</b>\n"
+        f"📅 Создана: {created_info}\n"
+        f"⏰ Публикация: {schedule_info}\n"
+        f"🧹 Автоудаление: {auto_del_info}\n"
+        f"📂 Сегмент: <b>{seg_name}</b>\n"
+        f"📊 Статус: {status_text}\n\n"
+        f"<i>Содержимое:</i> {preview}"
+    )
+
+    kb = ReplyKeyboardBuilder()
+    if not deleted and not sent_flag:
+        kb.button(text="⏰ Изменить время публикации")
+    # Кнопки управления автоудалением, удалением и редактированием содержимого
+    # доступны до удаления рассылки, независимо от факта отправки
+    if not deleted:
+        if auto_delete_at:
+            kb.button(text="🗑️ Изменить время удаления")
+        else:
+            kb.button(text="🧹 Установить время удаления")
+        # Текст кнопки должен совпадать с обработчиком
+        kb.button(text="🗑 Удалить рассылку")
+        kb.button(text="✏️ Изменить содержимое")
+    elif undeleted:
+        kb.button(text="🗑 Удалить рассылку")
+    kb.button(text="⬅️ Назад")
+    kb.adjust(1)
+
+    await message.answer(text, reply_markup=kb.as_markup(resize_keyboard=True))
+    await state.update_data(manage_broadcast_id=broadcast_id)
+    await state.set_state(MenuState.broadcast_manage_show)
@@ -0,0 +1,165 @@
+"""Меню «📂 Сегменты» и «🎓 Группы»: создание сегментов и привязка новых групп."""
+import logging
+
+from aiogram import F, Router, types
+from aiogram.fsm.context import FSMContext
+from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, KeyboardButtonRequestChat
+from aiogram.utils.keyboard import ReplyKeyboardBuilder
+
+from handlers.common import admin_reply_keyboard, admin_required
+from handlers.panel import cmd_groups
+from loader import bot, db
+from states import MenuState
+
+logger = logging.getLogger(__name__)
+router = Router(name=__name__)
+
+
+# Сегменты
+@router.message(F.text == "📂 Сегменты")
+@admin_required
+async def handle_lists_button(message: types.Message, state: FSMContext):
+    # выводим список сегментов
+    segments = await db.get_lists()
+    kb = ReplyKeyboardBuilder()
+    kb.button(text="➕ Создать сегмент")
+    kb.button(text="⬅️ Назад")
+    kb.adjust(1)
+    if not segments:
+        await message.answer("Пока нет ни одного сегмента. Используйте ➕ Создать сегмент.", reply_markup=kb.as_markup(resize_keyboard=True))
+        return
+
+    text = "📂 <b>Сегменты</b>:\n\n"
+    text += "\n".join([f"• <b>{name}</b>" for _, name in segments])
+
+    kb = ReplyKeyboardBuilder()
+    for _, name in segments:
+        kb.button(text=f"📂 {name}")
+    kb.button(text="➕ Создать сегмент")
+    kb.button(text="⬅️ Назад")
+    kb.adjust(2, 1)
+    
+    await message.answer(text, reply_markup=kb.as_markup(resize_keyboard=True))
+    await state.set_state(MenuState.segment_view_select_list)
+
+# --- Кнопка создания сегмента --- #
+
+@router.message(F.text == "➕ Создать сегмент")
+@admin_required
+async def handle_create_segment_button(message: types.Message, state: FSMContext):
+    await message.answer(
+        "Введите название нового сегмента:",
+        reply_markup=ReplyKeyboardMarkup(keyboard=[[KeyboardButton(text="❌ Отмена")]], resize_keyboard=True)
+    )
+    await state.set_state(MenuState.list_create_wait_name)
+
+@router.message(MenuState.list_create_wait_name)
+async def process_new_segment_name(message: types.Message, state: FSMContext):
+    if message.text == "❌ Отмена":
+        await state.clear()
+        await message.answer("✅ Действие отменено.", reply_markup=admin_reply_keyboard())
+        return
+    name = message.text.strip()
+    await db.create_list(name)
+    await message.answer(f"✅ Сегмент <b>{name}</b> создан.", reply_markup=admin_reply_keyboard())
+    await state.clear()
+
+# Группы
+@router.message(F.text == "🎓 Группы")
+@admin_required
+async def handle_groups_button(message: types.Message, state: FSMContext):
+    # Показываем укороченную сводку (функция cmd_groups уже выводит короткое сообщение)
+    await cmd_groups(message)
+
+    # Клавиатура действий
+    kb = ReplyKeyboardBuilder()
+    kb.button(text="➕ Добавить группу", request_chat=KeyboardButtonRequestChat(
+        request_id=1,
+        chat_is_channel=False,
+        chat_is_forum=False,
+        bot_is_member=True,
+    ))
+    kb.button(text="✏️ Редактировать группу")
+    kb.button(text="⬅️ Назад")
+    kb.adjust(1)
+    
+    await message.answer(
+        "Выберите действие:",
+        reply_markup=kb.as_markup(resize_keyboard=True)
+    )
+    await state.set_state(MenuState.group_add_select_group)
+
+
+# --- Обработка выбранной группы (chat_shared) ---
+
+@router.message(lambda m: m.chat_shared is not None)
+@admin_required
+async def handle_chat_shared(message: types.Message, state: FSMContext):
+    chat_id = message.chat_shared.chat_id
+    try:
+        chat = await bot.get_chat(chat_id)
+        title = chat.title or "Без названия"
+    except Exception:
+        title = "Без названия"
+
+    # Регистрируем группу если новой
+    await db.add_group(chat_id, title)
+
+    await state.update_data(selected_group_id=chat_id)
+
+    # Показать список сегментов
+    lists = await db.get_lists()
+    if not lists:
+        await message.answer("Сначала создайте сегмент через /segments.", reply_markup=admin_reply_keyboard())
+        await state.clear()
+        return
+
+    kb = ReplyKeyboardBuilder()
+    for list_id, name in lists:
+        kb.button(text=f"📂 {name}")
+    kb.button(text="❌ Отмена")
+    kb.adjust(1)
+
+    await message.answer("Выберите сегмент для этой группы:", reply_markup=kb.as_markup(resize_keyboard=True))
+    await state.set_state(MenuState.group_add_select_list)
+
+
+# --- Привязка группы к выбранному сегменту ---
+
+@router.message(MenuState.group_add_select_list)
+@admin_required
+async def process_group_add_list(message: types.Message, state: FSMContext):
+    if message.text == "❌ Отмена" or message.text == "⬅️ Назад":
+        await state.clear()
+        await message.answer("✅ Действие отменено.", reply_markup=admin_reply_keyboard())
+        return
+    
+    if not message.text.startswith("📂 "):
+        await message.answer("Пожалуйста, выберите сегмент из кнопок.")
+        return
+    
+    segment_name = message.text[2:].strip()
+    lists = await db.get_lists()
+    list_id = None
+    for lid, name in lists:
+        if name == segment_name:
+            list_id = lid
+            break
+    
+    if not list_id:
+        await message.answer("Сегмент не найден.")
+        return
+    
+    data = await state.get_data()
+    group_id = data.get('selected_group_id')
+    if not group_id:
+        await message.answer("Ошибка: группа не выбрана.", reply_markup=admin_reply_keyboard())
+        await state.clear()
+        return
+    
+    await db.assign_group_to_list(group_id, list_id)
+    await message.answer(
+        f"🔗 Группа <code>{group_id}</code> добавлена в сегмент <b>{segment_name}</b>.",
+        reply_markup=admin_reply_keyboard()
+    )
+    await state.clear()
@@ -0,0 +1,417 @@
+"""Меню «⚙️ Настройки»: управление админами и передача суперправ."""
+import logging
+
+from aiogram import F, Router, types
+from aiogram.fsm.context import FSMContext
+from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
+from aiogram.utils.keyboard import ReplyKeyboardBuilder
+
+from handlers.commands import cmd_help
+from handlers.common import admin_reply_keyboard, admin_required, is_super_admin
+from loader import bot, db
+from states import MenuState
+
+logger = logging.getLogger(__name__)
+router = Router(name=__name__)
+
+
+# Настройки
+@router.message(F.text == "⚙️ Настройки")
+@admin_required
+async def handle_settings_button(message: types.Message, state: FSMContext):
+    kb = ReplyKeyboardBuilder()
+    kb.button(text="👑 Управление админами")
+    kb.button(text="📋 Справка")
+    kb.button(text="⬅️ Назад")
+    kb.adjust(1)
+    
+    await message.answer(
+        "⚙️ <b>Настройки бота</b>\n\n"
+        "Выберите раздел для настройки:",
+        reply_markup=kb.as_markup(resize_keyboard=True)
+    )
+    await state.set_state(MenuState.settings_menu)
+
+
+# --- Обработчики меню настроек --- #
+
+@router.message(MenuState.settings_menu)
+@admin_required
+async def process_settings_menu(message: types.Message, state: FSMContext):
+    txt = message.text or ""
+    
+    if txt == "⬅️ Назад":
+        await state.clear()
+        await message.answer("🏠 Вернулись в главное меню", reply_markup=admin_reply_keyboard())
+        return
+    
+    if txt == "👑 Управление админами":
+        # Получаем список всех админов
+        admins = await db.get_all_admins()
+        current_id = message.from_user.id
+        current_is_super = await is_super_admin(current_id)
+
+        # Обновляем данные о каждом админе, если имя/ник неизвестны:
+        # сначала опрашиваем Telegram, затем сохраняем всё одним коммитом
+        enriched_admins = []
+        updates = []
+        for user_id, username, first_name, added_at in admins:
+            if not username or username == "from_config" or not first_name or first_name == "Legacy Admin":
+                try:
+                    user_chat = await bot.get_chat(user_id)
+                    username = user_chat.username or username
+                    first_name = user_chat.first_name or first_name
+                    super_flag = 1 if await db.is_super_admin(user_id) else 0
+                    updates.append((user_id, username, first_name, super_flag))
+                except Exception:
+                    pass
+            enriched_admins.append((user_id, username, first_name, added_at))
+        admins = enriched_admins
+        if updates:
+            try:
+                async with db.transaction():
+                    for user_id, username, first_name, super_flag in updates:
+                        await db.add_admin(user_id, username, first_name, super_admin=super_flag)
+            except Exception as e:
+                logger.warning(f"Не удалось сохранить данные админов: {e}")
+
+        text = "👑 <b>Управление администраторами</b>\n\n"
+        visible_admins = []
+        for user_id, username, first_name, added_at in admins:
+            # Скрываем супер админа от других обычных администраторов
+            if await db.is_super_admin(user_id) and user_id != current_id:
+                continue
+            visible_admins.append((user_id, username, first_name, added_at))
+        
+        if visible_admins:
+            text += "📋 <b>Текущие администраторы:</b>\n"
+            for user_id, username, first_name, added_at in visible_admins:
+                if user_id == current_id:
+                    name = "Вы"
+                else:
+                    name = f"{first_name or 'Неизвестно'}"
+                    if username and username != "from_config":
+                        name += f" (@{username})"
+                if await db.is_super_admin(user_id):
+                    name += " 🔑"
+                text += f"• {name} (ID: <code>{user_id}</code>)\n"
+            text += f"\n📊 Всего админов: {len(visible_admins)}"
+        else:
+            text += "❌ Нет администраторов для отображения"
+        
+        text += "\n\nВыберите действие:"
+        
+        kb = ReplyKeyboardBuilder()
+        kb.button(text="➕ Добавить админа")
+        if len(visible_admins) > 1:
+            kb.button(text="❌ Удалить админа")
+        if current_is_super:
+            kb.button(text="🔑 Передать суперправа")
+        kb.button(text="⬅️ Назад")
+        kb.adjust(2, 1)
+        
+        await message.answer(text, reply_markup=kb.as_markup(resize_keyboard=True))
+        await state.set_state(MenuState.admin_management)
+        return
+    
+    if txt == "📋 Справка":
+        await cmd_help(message)
+        return
+    
+    await message.answer("Пожалуйста, используйте кнопки.")
+
+
+# --- Управление админами --- #
+
+@router.message(MenuState.admin_management)
+@admin_required
+async def process_admin_management(message: types.Message, state: FSMContext):
+    txt = message.text or ""
+    
+    if txt == "⬅️ Назад":
+        await handle_settings_button(message, state)
+        return
+    
+    if txt == "➕ Добавить админа":
+        await message.answer(
+            "👥 Выберите пользователя для назначения администратором:\n\n"
+            "• Нажмите кнопку ниже\n"
+            "• Выберите пользователя из списка контактов\n"
+            "• Убедитесь, что у пользователя есть диалог с ботом",
+            reply_markup=ReplyKeyboardMarkup(
+                keyboard=[
+                    [KeyboardButton(
+                        text="👤 Выбрать пользователя",
+                        request_user=types.KeyboardButtonRequestUser(
+                            request_id=1,
+                            user_is_bot=False
+                        )
+                    )],
+                    [KeyboardButton(text="❌ Отмена")]
+                ],
+                resize_keyboard=True
+            )
+        )
+        await state.set_state(MenuState.admin_add_wait_user)
+        return
+    
+    if txt == "🔑 Передать суперправа":
+            # список админов без текущего
+        admins = await db.get_all_admins()
+        selectable = [(uid, uname, fname) for uid, uname, fname, _ in admins if uid != message.from_user.id]
+        if not selectable:
+            await message.answer("❌ Нет админов для передачи прав.")
+            return
+        kb = ReplyKeyboardBuilder()
+        for uid, uname, fname in selectable:
+            name = f"{fname or 'Неизвестно'}"
+            if uname:
+                name += f" (@{uname})"
+            kb.button(text=f"🔑 {name}")
+        kb.button(text="❌ Отмена")
+        kb.adjust(1)
+        await message.answer("Выберите администратора, которому передать суперправа:", reply_markup=kb.as_markup(resize_keyboard=True))
+        await state.update_data(selectable_admins=selectable)
+        await state.set_state(MenuState.admin_transfer_select)
+        return
+
+    if txt == "❌ Удалить админа":
+        admins = await db.get_all_admins()
+        if not admins:
+            await message.answer("❌ Нет админов для удаления.")
+            return
+        
+        # Проверяем, что не остается только один админ
+        if len(admins) <= 1:
+            await message.answer("⚠️ Нельзя удалить последнего администратора!")
+            return
+        
+        text = "❌ <b>Удаление администратора</b>\n\n"
+        text += "Выберите администратора для удаления:\n\n"
+        
+        kb = ReplyKeyboardBuilder()
+        for user_id, username, first_name, added_at in admins:
+            # Пропускаем супер админа и самого себя
+            if await db.is_super_admin(user_id):
+                continue
+            if user_id == message.from_user.id:
+                continue
+                
+            name = f"{first_name or 'Неизвестно'}"
+            if username:
+                name += f" (@{username})"
+            kb.button(text=f"🗑 {name}")
+        
+        kb.button(text="❌ Отмена")
+        kb.adjust(1)
+        
+        if len([admin for admin in admins if admin[0] != message.from_user.id]) == 0:
+            await message.answer("⚠️ Вы не можете удалить себя из админов!")
+            return
+        
+        await message.answer(text, reply_markup=kb.as_markup(resize_keyboard=True))
+        await state.update_data(available_admins=admins)
+        await state.set_state(MenuState.admin_delete_select)
+        return
+    
+    await message.answer("Пожалуйста, используйте кнопки.")
+
+
+# --- Добавление админа --- #
+
+@router.message(lambda m: m.user_shared is not None)
+@admin_required
+async def handle_user_shared(message: types.Message, state: FSMContext):
+    current_state = await state.get_state()
+    if current_state != MenuState.admin_add_wait_user:
+        return
+    
+    user_id = message.user_shared.user_id
+    
+    # Проверяем, не является ли пользователь уже админом
+    if await db.is_admin(user_id):
+        await message.answer("⚠️ Этот пользователь уже является администратором!")
+        return
+    
+    try:
+        # Пытаемся получить информацию о пользователе
+        user = await bot.get_chat(user_id)
+        username = user.username
+        first_name = user.first_name
+    except Exception:
+        username = None
+        first_name = None
+    
+    # Добавляем админа
+    await db.add_admin(user_id, username, first_name, message.from_user.id)
+    
+    name = f"{first_name or 'Неизвестно'}"
+    if username:
+        name += f" (@{username})"
+    
+    await message.answer(
+        f"✅ Пользователь {name} (ID: <code>{user_id}</code>) назначен администратором!",
+        reply_markup=admin_reply_keyboard()
+    )
+    await state.clear()
+
+
+@router.message(MenuState.admin_add_wait_user)
+@admin_required
+async def process_admin_add_cancel(message: types.Message, state: FSMContext):
+    if message.text == "❌ Отмена":
+        await message.answer("✅ Добавление админа отменено.", reply_markup=admin_reply_keyboard())
+        await state.clear()
+        return
+    
+    await message.answer("Пожалуйста, используйте кнопку для выбора пользователя.")
+
+
+# --- Удаление админа --- #
+
+@router.message(MenuState.admin_delete_select)
+@admin_required
+async def process_admin_delete_select(message: types.Message, state: FSMContext):
+    txt = message.text or ""
+    
+    if txt == "❌ Отмена":
+        await message.answer("✅ Удаление админа отменено.", reply_markup=admin_reply_keyboard())
+        await state.clear()
+        return
+    
+    if not txt.startswith("🗑 "):
+        await message.answer("Пожалуйста, выберите админа из списка.")
+        return
+    
+    admin_name = txt[2:].strip()
+    data = await state.get_data()
+    available_admins = data.get("available_admins", [])
+    
+    # Находим выбранного админа
+    selected_admin = None
+    for user_id, username, first_name, added_at in available_admins:
+        name = f"{first_name or 'Неизвестно'}"
+        if username:
+            name += f" (@{username})"
+        if name == admin_name:
+            selected_admin = (user_id, username, first_name, added_at)
+            break
+    
+    if not selected_admin:
+        await message.answer("❌ Админ не найден.")
+        return
+    
+    user_id, username, first_name, _ = selected_admin
+    name = f"{first_name or 'Неизвестно'}"
+    if username:
+        name += f" (@{username})"
+    
+    await state.update_data(admin_to_delete=selected_admin)
+    
+    kb = ReplyKeyboardMarkup(
+        keyboard=[
+            [KeyboardButton(text="✅ Да, удалить"), KeyboardButton(text="❌ Нет, отмена")]
+        ],
+        resize_keyboard=True
+    )
+    
+    await message.answer(
+        f"⚠️ <b>Подтвердите удаление</b>\n\n"
+        f"Вы действительно хотите удалить из администраторов пользователя:\n"
+        f"👤 {name} (ID: <code>{user_id}</code>)?",
+        reply_markup=kb
+    )
+    await state.set_state(MenuState.admin_delete_confirm)
+
+
+@router.message(MenuState.admin_delete_confirm)
+@admin_required
+async def process_admin_delete_confirm(message: types.Message, state: FSMContext):
+    txt = message.text or ""
+    
+    if txt == "❌ Нет, отмена":
+        await message.answer("✅ Удаление админа отменено.", reply_markup=admin_reply_keyboard())
+        await state.clear()
+        return
+    
+    if txt == "✅ Да, удалить":
+        data = await state.get_data()
+        admin_to_delete = data.get("admin_to_delete")
+        
+        if not admin_to_delete:
+            await message.answer("❌ Ошибка: данные админа потеряны.")
+            await state.clear()
+            return
+        
+        user_id, username, first_name, _ = admin_to_delete
+        name = f"{first_name or 'Неизвестно'}"
+        if username:
+            name += f" (@{username})"
+        
+        # Удаляем админа
+        await db.remove_admin(user_id)
+        
+        await message.answer(
+            f"✅ Администратор {name} (ID: <code>{user_id}</code>) успешно удален!",
+            reply_markup=admin_reply_keyboard()
+        )
+        await state.clear()
+        return
+    
+    await message.answer("Пожалуйста, используйте кнопки для ответа.")
+
+
+# --- Передача суперправ --- #
+
+@router.message(MenuState.admin_transfer_select)
+@admin_required
+async def process_admin_transfer_select(message: types.Message, state: FSMContext):
+    if message.text == "❌ Отмена":
+        await message.answer("✅ Передача суперправ отменена.", reply_markup=admin_reply_keyboard())
+        await state.clear()
+        return
+    if not message.text.startswith("🔑 "):
+        await message.answer("Пожалуйста, выберите админа из списка.")
+        return
+    admin_name = message.text[2:].strip()
+    data = await state.get_data()
+    selectable = data.get("selectable_admins", [])
+    selected = None
+    for uid, uname, fname in selectable:
+        name = f"{fname or 'Неизвестно'}"
+        if uname:
+            name += f" (@{uname})"
+        if name == admin_name:
+            selected = (uid, uname, fname)
+            break
+    if not selected:
+        await message.answer("❌ Админ не найден.")
+        return
+    uid, uname, fname = selected
+    name = f"{fname or 'Неизвестно'}"
+    if uname:
+        name += f" (@{uname})"
+    await state.update_data(new_super_admin=uid)
+    kb = ReplyKeyboardMarkup(keyboard=[[KeyboardButton(text="✅ Да, передать"), KeyboardButton(text="❌ Нет, отмена")]], resize_keyboard=True)
+    await message.answer(f"⚠️ Подтвердите передачу суперправ пользователю {name}. Вы потеряете статус супер админа.", reply_markup=kb)
+    await state.set_state(MenuState.admin_transfer_confirm)
+
+@router.message(MenuState.admin_transfer_confirm)
+@admin_required
+async def process_admin_transfer_confirm(message: types.Message, state: FSMContext):
+    if message.text == "❌ Нет, отмена":
+        await message.answer("✅ Передача суперправ отменена.", reply_markup=admin_reply_keyboard())
+        await state.clear()
+        return
+    if message.text == "✅ Да, передать":
+        data = await state.get_data()
+        new_uid = data.get("new_super_admin")
+        if not new_uid:
+            await message.answer("❌ Ошибка передачи прав.")
+            await state.clear()
+            return
+        await db.set_super_admin(new_uid)
+        await message.answer("✅ Суперправа успешно переданы!", reply_markup=admin_reply_keyboard())
+        await state.clear()
+        return
+    await message.answer("Пожалуйста, используйте кнопки.")
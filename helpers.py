@@ -0,0 +1,247 @@
+"""
+Чистые функции бота: разбор ввода админа, форматирование времени, поиск групп.
+
+Модуль не зависит от aiogram, конфигурации и базы, поэтому его можно
+импортировать и измерять отдельно (benchmarks/bench_helpers.py).
+"""
+import re
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo
+
+# ---- Время ---- #
+
+def now_msk_naive() -> datetime:
+    """Возвращает текущее время в МСК без tzinfo (naive)"""
+    return datetime.now(ZoneInfo("Europe/Moscow")).replace(tzinfo=None)
+
+def to_msk_naive(dt: datetime) -> datetime:
+    """Приводит произвольный datetime к МСК и делает его naive (без tzinfo)."""
+    if dt.tzinfo is not None:
+        return dt.astimezone(ZoneInfo("Europe/Moscow")).replace(tzinfo=None)
+    return dt
+
+def utc_str_to_msk_str(dt_str: str) -> str:
+    """Парсит строку времени (UTC или без tz) и возвращает строку в МСК в формате DD.MM.YYYY HH:MM.
+
+    Для записей SQLite CURRENT_TIMESTAMP (UTC) без tzinfo принудительно считаем UTC.
+    """
+    if not dt_str:
+        return "-"
+    try:
+        # fromisoformat поддерживает и ' ' и 'T' как разделитель даты и времени
+        dt = datetime.fromisoformat(dt_str)
+    except Exception:
+        # Последняя попытка: заменить пробел на 'T'
+        try:
+            dt = datetime.fromisoformat(dt_str.replace(" ", "T"))
+        except Exception:
+            return dt_str
+    # Если tz отсутствует, считаем это UTC (как CURRENT_TIMESTAMP в SQLite)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    msk = dt.astimezone(ZoneInfo("Europe/Moscow"))
+    return msk.strftime('%d.%m.%Y %H:%M')
+
+def format_scheduled_str(scheduled_at_str: str) -> str:
+    """Красиво форматирует scheduled_at, хранящийся как ISO-строка.
+    Если есть tzinfo — приводим к МСК, иначе считаем, что это уже МСК (naive).
+    """
+    if not scheduled_at_str:
+        return "не задано"
+    try:
+        dt = datetime.fromisoformat(scheduled_at_str)
+    except Exception:
+        return scheduled_at_str
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(ZoneInfo("Europe/Moscow")).replace(tzinfo=None)
+    # Считаем, что naive уже в МСК
+    return dt.strftime('%d.%m.%Y %H:%M')
+
+def extract_hours(user_text: str) -> Optional[int]:
+    """Пытается извлечь число часов из текста: '2', '2ч', '2 часа', 'через 2 часа'.
+    Возвращает None, если распознать как часы нельзя."""
+    text = user_text.strip().lower()
+    m = re.match(r"^(?:через\s*)?(\d{1,2})(?:\s*(?:ч|час|часа|часов))?\s*$", text)
+    if not m:
+        return None
+    try:
+        return int(m.group(1))
+    except Exception:
+        return None
+
+def extract_minutes(user_text: str) -> Optional[int]:
+    """Извлекает количество минут: '40', '40 мин', '40 минут', 'через 40 минут'."""
+    text = user_text.strip().lower()
+    m = re.match(r"^(?:через\s*)?(\d{1,3})(?:\s*(?:м|мин|минута|минуты|минут))?\s*$", text)
+    if not m:
+        return None
+    try:
+        return int(m.group(1))
+    except Exception:
+        return None
+
+
+def parse_datetime_ru(text: str, relative_base: datetime) -> Optional[datetime]:
+    """Разбирает дату/время на русском (naive МСК); относительные фразы — от relative_base.
+
+    Вызов блокирующий и медленный; в обработчиках используется
+    schedule_parser.parse_datetime.
+    """
+    import dateparser  # тяжёлый импорт, нужен только здесь
+
+    return dateparser.parse(
+        text,
+        languages=["ru"],
+        settings={
+            "RELATIVE_BASE": relative_base,
+            "TIMEZONE": "Europe/Moscow",
+            "RETURN_AS_TIMEZONE_AWARE": False,
+        },
+    )
+
+
+# ---- Сегменты ---- #
+
+def parse_segment_instructions(text: str, available_segments: List[str]) -> dict:
+    """Парсит инструкции в свободной форме для управления сегментами.
+    
+    Возвращает словарь с операциями:
+    {
+        'add': ['сегмент1', 'сегмент2'],
+        'remove': ['сегмент3'],
+        'errors': ['неизвестный_сегмент']
+    }
+    """
+    text_lower = text.lower()
+    result = {'add': [], 'remove': [], 'errors': []}
+    
+    # Ключевые слова для операций
+    add_keywords = ['добав', 'включ', 'присое', '+', 'плюс', 'в ']
+    remove_keywords = ['удал', 'убер', 'исключ', 'из ', '-', 'минус']
+    
+    # Находим все упоминания сегментов в тексте
+    mentioned_segments = []
+    for segment in available_segments:
+        if segment.lower() in text_lower:
+            mentioned_segments.append(segment)
+    
+    # Разбиваем текст на части по запятым и союзам
+    parts = re.split(r'[,;]\s*|(?:\s+и\s+)', text_lower)
+    
+    for part in parts:
+        part = part.strip()
+        if not part:
+            continue
+            
+        # Определяем операцию для этой части
+        is_add = any(keyword in part for keyword in add_keywords)
+        is_remove = any(keyword in part for keyword in remove_keywords)
+        
+        # Находим упомянутые в этой части сегменты
+        part_segments = [seg for seg in mentioned_segments if seg.lower() in part]
+        
+        for segment in part_segments:
+            if is_remove and not is_add:  # только удаление
+                if segment not in result['remove']:
+                    result['remove'].append(segment)
+            elif is_add and not is_remove:  # только добавление
+                if segment not in result['add']:
+                    result['add'].append(segment)
+            elif is_remove and is_add:  # неоднозначность
+                # По умолчанию считаем добавлением, если не указано "из"
+                if 'из ' + segment.lower() in part:
+                    if segment not in result['remove']:
+                        result['remove'].append(segment)
+                else:
+                    if segment not in result['add']:
+                        result['add'].append(segment)
+            else:  # нет явных операций, пытаемся угадать по контексту
+                if 'из ' in part and segment.lower() in part:
+                    if segment not in result['remove']:
+                        result['remove'].append(segment)
+                else:
+                    if segment not in result['add']:
+                        result['add'].append(segment)
+    
+    # Проверяем несуществующие сегменты
+    all_mentioned = set()
+    for word in text.split():
+        word_clean = word.strip('.,!?;').lower()
+        if word_clean not in [seg.lower() for seg in available_segments]:
+            # Может быть это опечатка в названии сегмента?
+            for seg in available_segments:
+                if word_clean in seg.lower() or seg.lower() in word_clean:
+                    break
+            else:
+                # Проверяем, похоже ли на название сегмента
+                if len(word_clean) > 3 and not any(kw in word_clean for kw in 
+                    ['добав', 'удал', 'включ', 'убер', 'минус', 'плюс']):
+                    all_mentioned.add(word_clean)
+    
+    # Добавляем неопознанные слова как возможные ошибки
+    for word in all_mentioned:
+        if word not in [seg.lower() for seg in available_segments]:
+            result['errors'].append(word)
+    
+    return result
+
+
+# ---- Транслитерация RU → EN (упрощённая) и поиск групп ---- #
+
+RU2EN = str.maketrans({
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e", "ж": "zh", "з": "z",
+    "и": "i", "й": "y", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p", "р": "r",
+    "с": "s", "т": "t", "у": "u", "ф": "f", "х": "h", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "shch",
+    "ъ": "", "ы": "y", "ь": "", "э": "e", "ю": "yu", "я": "ya",
+})
+
+
+def translit_ru(text: str) -> str:
+    return text.lower().translate(RU2EN)
+
+
+def search_groups(groups: Iterable[Tuple[int, str]], query: str, limit: Optional[int] = None) -> List[Tuple[int, str]]:
+    """Группы, в названии которых есть query (как есть или в транслите), в исходном порядке.
+
+    Перебор останавливается, как только найдено limit совпадений.
+    """
+    query = query.strip().lower()
+    query_t = translit_ru(query)
+    matches = []
+    for chat_id, title in groups:
+        low = title.lower()
+        if query in low or (query_t and query_t in low.translate(RU2EN)):
+            matches.append((chat_id, title))
+            if limit is not None and len(matches) >= limit:
+                break
+    return matches
+
+
+# ---- Длинные сообщения ---- #
+
+def split_message(text: str, chunk_size: int = 4000) -> List[str]:
+    """Делит текст на части не длиннее chunk_size по границам строк"""
+    if len(text) <= chunk_size:
+        return [text]
+    chunks = []
+    buffer = ""
+    for line in text.split("\n"):
+        # +1 учитывает перевод строки, который будет добавлен при соединении
+        if len(buffer) + len(line) + 1 > chunk_size:
+            chunks.append(buffer.rstrip())
+            buffer = ""
+        buffer += line + "\n"
+    if buffer:
+        chunks.append(buffer.rstrip())
+    return chunks
+
+
+# ---- Статистика ---- #
+
+def percentiles(values: Iterable[float], qs: Sequence[float]) -> List[float]:
+    """Перцентили по ближайшему рангу (значения выборки, без интерполяции); для пустой выборки — нули"""
+    values = sorted(values)
+    if not values:
+        return [0.0 for _ in qs]
+    return [values[min(len(values) - 1, int(round(q * (len(values) - 1))))] for q in qs]
@@ -0,0 +1,100 @@
+"""
+Общие объекты бота: Bot, база, хранилище FSM, диспетчер, движок рассылки
+и очередь повторов. Их импортируют и точка входа (bot.py), и роутеры из handlers/.
+"""
+# Откладывать импорт aiogram здесь бессмысленно: любой его подмодуль
+# (aiogram.exceptions в retry_queue, aiogram.fsm в fsm_storage) выполняет
+# aiogram/__init__.py, который сам загружает Bot и Dispatcher
+from aiogram import Bot, Dispatcher
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.enums import ParseMode
+
+from config import (
+    BOT_TOKEN,
+    DATABASE_PATH,
+    FANOUT_CONCURRENCY,
+    FANOUT_RATE_PER_SEC,
+    FANOUT_PER_CHAT_LIMIT,
+    FANOUT_PER_CHAT_WINDOW,
+    RETRY_MAX_ATTEMPTS,
+    RETRY_BASE_DELAY,
+    RETRY_MAX_DELAY,
+    FSM_STATE_TTL_HOURS,
+    LOG_TRACEBACK_SAMPLES,
+    LOOP_LAG_INTERVAL_MS,
+    LOOP_LAG_THRESHOLD_MS,
+    PERF_SLOW_HANDLER_MS,
+    PERF_WINDOW,
+    PROFILE_SAMPLE_INTERVAL_MS,
+    SQLITE_READ_POOL_SIZE,
+    SQLITE_BUSY_TIMEOUT_MS,
+    SQLITE_CACHE_SIZE_KB,
+    SQLITE_MMAP_SIZE,
+    TELEGRAM_API_URL,
+    TRACEMALLOC_FRAMES,
+)
+from database import Database
+from fanout import FanoutEngine
+from fsm_storage import SQLiteStorage
+from loop_monitor import LoopLagMonitor
+from metrics import ApiMetricsMiddleware, HandlerMetricsMiddleware
+from perf import PerfMonitor
+from profiling import CpuProfiler, MemoryTracer
+from retry_queue import RetryQueue
+
+# Инициализация бота и диспетчера
+bot = Bot(
+    BOT_TOKEN,
+    session=AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL)) if TELEGRAM_API_URL else None,
+    default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+)
+# Время, исход и 429 каждого вызова Bot API — в метрики
+bot.session.middleware(ApiMetricsMiddleware())
+
+# Инициализация БД
+db = Database(
+    DATABASE_PATH,
+    read_pool_size=SQLITE_READ_POOL_SIZE,
+    busy_timeout_ms=SQLITE_BUSY_TIMEOUT_MS,
+    cache_size_kb=SQLITE_CACHE_SIZE_KB,
+    mmap_size=SQLITE_MMAP_SIZE,
+)
+
+# Состояния диалогов хранятся в той же базе и переживают перезапуск
+fsm_storage = SQLiteStorage(db, ttl=FSM_STATE_TTL_HOURS * 3600)
+dp = Dispatcher(storage=fsm_storage)
+# Время каждого обновления целиком по обработчику и состоянию (/perf), медленные — в лог
+perf_monitor = PerfMonitor(slow_threshold=PERF_SLOW_HANDLER_MS / 1000, window=PERF_WINDOW)
+dp.update.outer_middleware(perf_monitor)
+# Время обработчиков по состоянию FSM; мидлвари диспетчера действуют и во всех роутерах
+dp.message.middleware(HandlerMetricsMiddleware())
+dp.callback_query.middleware(HandlerMetricsMiddleware())
+
+# Общий движок рассылки: единый лимит скорости для всех отправок бота
+fanout = FanoutEngine(
+    concurrency=FANOUT_CONCURRENCY,
+    rate=FANOUT_RATE_PER_SEC,
+    per_chat_limit=FANOUT_PER_CHAT_LIMIT,
+    per_chat_window=FANOUT_PER_CHAT_WINDOW,
+)
+
+# Очередь повторов (состояние хранится в SQLite)
+retry_queue = RetryQueue(
+    db,
+    max_attempts=RETRY_MAX_ATTEMPTS,
+    base_delay=RETRY_BASE_DELAY,
+    max_delay=RETRY_MAX_DELAY,
+    traceback_samples=LOG_TRACEBACK_SAMPLES,
+)
+
+# Сторож цикла событий: замечает синхронный код, который держит все обработчики
+loop_monitor = LoopLagMonitor(
+    interval=LOOP_LAG_INTERVAL_MS / 1000,
+    threshold=LOOP_LAG_THRESHOLD_MS / 1000,
+)
+
+# Профилировщики по команде (/profile, /memsnap): работают только во время сеанса
+cpu_profiler = CpuProfiler(interval=PROFILE_SAMPLE_INTERVAL_MS / 1000)
+memory_tracer = MemoryTracer(frames=TRACEMALLOC_FRAMES)
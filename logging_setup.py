@@ -0,0 +1,177 @@
+"""
+Логирование без блокировок цикла событий.
+
+Обработчик в вызывающем потоке только кладёт запись в очередь; форматирование
+(включая трейсбеки) и запись в поток/файл выполняет QueueListener в отдельном
+потоке. Формат — JSON-строка на запись (LOG_FORMAT=json) или прежний текстовый.
+
+ChatErrorSummary сворачивает однотипные ошибки по чатам одной рассылки
+в одну итоговую строку; полный трейсбек пишется только для первых
+нескольких ошибок каждого вида.
+"""
+import atexit
+import json
+import logging
+import queue
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, List, Optional, Tuple
+
+TEXT_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+
+# Поля LogRecord, которые есть у любой записи; всё остальное — поля из extra=
+_RECORD_FIELDS = set(logging.LogRecord("", 0, "", 0, "", (), None).__dict__) | {"message", "asctime", "taskName"}
+
+_listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись — одна JSON-строка: время, уровень, логгер, сообщение, поля из extra и трейсбек"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_FIELDS and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exc"] = record.exc_text
+        if record.stack_info:
+            data["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class DeferredQueueHandler(QueueHandler):
+    """QueueHandler, который не форматирует запись в вызывающем потоке.
+
+    Стандартный prepare() форматирует сообщение и трейсбек ещё до постановки
+    в очередь, то есть в цикле событий. Здесь в очередь уходит копия записи
+    с подставленными аргументами, а трейсбек форматируется в потоке слушателя.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = logging.makeLogRecord(record.__dict__)
+        # Аргументы подставляем сейчас: к моменту записи объекты могут измениться
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def setup_logging(level: str = "INFO", fmt: str = "json", stream=None) -> QueueListener:
+    """Настраивает корневой логгер: очередь в вызывающем потоке, запись в потоке слушателя"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(DeferredQueueHandler(log_queue))
+    root.setLevel(level.upper())
+
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+@atexit.register
+def stop_logging():
+    """Дописывает очередь и останавливает поток слушателя"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def _error_text(error: BaseException, limit: int = 200) -> str:
+    """Текст ошибки без подробностей конкретного чата, чтобы однотипные ошибки сворачивались"""
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is not None:
+        # Текст TelegramRetryAfter содержит chat_id — группируем по паузе
+        return f"Too Many Requests: retry_after={retry_after}"
+    text = (getattr(error, "message", None) or str(error)).strip().split("\n")[0]
+    return text if len(text) <= limit else text[:limit] + "…"
+
+
+class ChatErrorSummary:
+    """Сводка ошибок по чатам одной рассылки (или удаления, правки).
+
+    add() вызывается на каждую неудачу, flush() пишет одну строку с числом
+    ошибок каждого вида и несколькими chat_id для примера. Трейсбек пишется
+    отдельной записью только для первых traceback_samples ошибок каждого вида.
+    """
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        action: str,
+        broadcast_id: int,
+        traceback_samples: int = 1,
+        sample_chats: int = 5,
+    ):
+        self.logger = logger
+        self.action = action
+        self.broadcast_id = broadcast_id
+        self.traceback_samples = traceback_samples
+        self.sample_chats = sample_chats
+        # (исход, класс ошибки, текст) -> [число, примеры chat_id]
+        self._errors: Dict[Tuple[str, str, str], List] = {}
+        self._tracebacks: Dict[str, int] = {}
+
+    def add(self, chat_id: int, error: BaseException, outcome: str = "failed"):
+        """outcome: failed — не удалось окончательно, retry — отложено в очередь повторов"""
+        kind = type(error).__name__
+        key = (outcome, kind, _error_text(error))
+        entry = self._errors.setdefault(key, [0, []])
+        entry[0] += 1
+        if len(entry[1]) < self.sample_chats:
+            entry[1].append(chat_id)
+
+        logged = self._tracebacks.get(kind, 0)
+        if logged < self.traceback_samples and error.__traceback__ is not None:
+            self._tracebacks[kind] = logged + 1
+            self.logger.warning(
+                f"Рассылка {self.broadcast_id}, {self.action}: пример ошибки {kind} в чате {chat_id}",
+                exc_info=error,
+                extra={"broadcast_id": self.broadcast_id, "action": self.action, "chat_id": chat_id},
+            )
+
+    def flush(self):
+        """Пишет итоговую строку (если были ошибки) и очищает сводку"""
+        if not self._errors:
+            return
+        failed = sum(count for (outcome, _, _), (count, _) in self._errors.items() if outcome == "failed")
+        retry = sum(count for (outcome, _, _), (count, _) in self._errors.items() if outcome == "retry")
+        items = sorted(self._errors.items(), key=lambda item: -item[1][0])
+        parts = [
+            f"{'повтор' if outcome == 'retry' else 'ошибка'} {kind} «{text}» ×{count} (например, {', '.join(map(str, chats))})"
+            for (outcome, kind, text), (count, chats) in items
+        ]
+        self.logger.log(
+            logging.ERROR if failed else logging.WARNING,
+            f"Рассылка {self.broadcast_id}, {self.action}: не удалось в {failed} чатах, "
+            f"отложено для повтора {retry}: " + "; ".join(parts),
+            extra={
+                "broadcast_id": self.broadcast_id,
+                "action": self.action,
+                "failed": failed,
+                "retry": retry,
+                "errors": [
+                    {"outcome": outcome, "error": kind, "message": text, "count": count, "chats": chats}
+                    for (outcome, kind, text), (count, chats) in items
+                ],
+            },
+        )
+        self._errors.clear()
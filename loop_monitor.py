@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, List, NamedTuple, Optional, Tuple
+
+from helpers import percentiles
+
+logger = logging.getLogger(__name__)
+
+# Файлы проекта: по ним в стеке ищется код, который держал цикл событий
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+_VENDOR_MARKERS = (os.sep + "site-packages" + os.sep, os.sep + "dist-packages" + os.sep)
+
+
+class Stall(NamedTuple):
+    at: datetime
+    lag: float
+    task: str
+    culprit: str
+    stack: List[str]
+
+
+def _is_project_file(filename: str) -> bool:
+    return filename.startswith(PROJECT_ROOT) and not any(m in filename for m in _VENDOR_MARKERS)
+
+
+def find_culprit(stack: traceback.StackSummary) -> str:
+    """Самый глубокий кадр из кода проекта (иначе — самый глубокий вообще)"""
+    for frame in reversed(stack):
+        if _is_project_file(frame.filename):
+            return f"{frame.name} ({os.path.relpath(frame.filename, PROJECT_ROOT)}:{frame.lineno})"
+    if stack:
+        frame = stack[-1]
+        return f"{frame.name} ({frame.filename}:{frame.lineno})"
+    return "?"
+
+
+class LoopLagMonitor:
+    """Сторож задержки цикла событий.
+
+    Задача в цикле каждые interval секунд засыпает и замеряет, насколько позже
+    положенного она проснулась (задержка планирования). Отдельный поток
+    следит за её «пульсом»: если цикл опаздывает больше чем на threshold,
+    значит, сейчас работает синхронный код, и поток снимает стек главного
+    потока и имя текущей задачи asyncio. Когда цикл освобождается, задержка
+    записывается как зависание вместе с этим стеком и пишется в лог.
+    """
+
+    def __init__(self, interval: float = 0.1, threshold: float = 0.25, window: int = 600, keep_stalls: int = 20):
+        self.interval = interval
+        self.threshold = threshold
+        self.lags: Deque[float] = deque(maxlen=window)
+        self.stalls: Deque[Stall] = deque(maxlen=keep_stalls)
+        self.stall_count = 0
+        self.max_lag = 0.0
+        self.started_at: Optional[datetime] = None
+        self._lock = threading.Lock()
+        self._heartbeat: Optional[float] = None
+        self._captured: Optional[Tuple[str, traceback.StackSummary]] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+
+    async def run(self):
+        """Фоновая задача: замеры задержки и поток-сторож на время её работы"""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self.started_at = datetime.now()
+        stop = threading.Event()
+        watchdog = threading.Thread(target=self._watch, args=(stop,), name="loop-lag-watchdog", daemon=True)
+        watchdog.start()
+        try:
+            while True:
+                with self._lock:
+                    self._heartbeat = time.monotonic()
+                    self._captured = None
+                await asyncio.sleep(self.interval)
+                with self._lock:
+                    lag = max(0.0, time.monotonic() - self._heartbeat - self.interval)
+                    captured = self._captured
+                    self._heartbeat = None
+                self._record(lag, captured)
+        finally:
+            stop.set()
+
+    def _record(self, lag: float, captured: Optional[Tuple[str, traceback.StackSummary]]):
+        self.lags.append(lag)
+        self.max_lag = max(self.max_lag, lag)
+        if lag < self.threshold:
+            return
+        self.stall_count += 1
+        if captured is None:
+            # Поток не успел заглянуть в стек (зависание чуть выше порога)
+            stall = Stall(datetime.now(), lag, "?", "стек не снят", [])
+        else:
+            task, stack = captured
+            stall = Stall(datetime.now(), lag, task, find_culprit(stack), stack.format())
+        self.stalls.append(stall)
+        logger.warning(
+            f"Цикл событий заблокирован на {lag * 1000:.0f} мс: {stall.culprit}, задача {stall.task}\n"
+            + "".join(stall.stack)
+        )
+
+    def _watch(self, stop: threading.Event):
+        poll = min(self.interval, self.threshold) / 2
+        while not stop.wait(poll):
+            with self._lock:
+                beat = self._heartbeat
+                if beat is None or self._captured is not None:
+                    continue
+                if time.monotonic() - beat - self.interval < self.threshold:
+                    continue
+            captured = self._capture()
+            with self._lock:
+                # Цикл мог проснуться, пока снимался стек, — тогда снимок уже не о том
+                if self._heartbeat == beat:
+                    self._captured = captured
+
+    def _capture(self) -> Tuple[str, traceback.StackSummary]:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = traceback.extract_stack(frame) if frame is not None else traceback.StackSummary()
+        # Кадры самого цикла (run_forever → _run_once → Handle._run) ничего не говорят
+        for i in range(len(stack) - 1, -1, -1):
+            if stack[i].name == "_run" and stack[i].filename.endswith(os.path.join("asyncio", "events.py")):
+                stack = traceback.StackSummary.from_list(stack[i + 1:])
+                break
+        try:
+            task = asyncio.current_task(self._loop)
+        except RuntimeError:
+            task = None
+        if task is None:
+            return "вне задачи (обратный вызов цикла)", stack
+        coro = task.get_coro()
+        return f"{task.get_name()} [{getattr(coro, '__qualname__', coro)}]", stack
+
+    def stats(self) -> Dict[str, float]:
+        lags = list(self.lags)
+        p50, p99 = percentiles(lags, (0.5, 0.99))
+        return {
+            "samples": len(lags),
+            "p50": p50,
+            "p99": p99,
+            "window_max": max(lags, default=0.0),
+            "max": self.max_lag,
+            "stalls": self.stall_count,
+        }
@@ -0,0 +1,332 @@
+"""
+Метрики в текстовом формате Prometheus без сторонних зависимостей.
+
+Счётчики, измерители и гистограммы с метками регистрируются в общем реестре
+REGISTRY; бот (bot.py, HTTP-сервер на METRICS_PORT) и веб-интерфейс
+(webapp/app.py) отдают его на /metrics. Каждый процесс публикует свои
+значения: бот — отправки, Bot API, планировщик и обработчики, веб-интерфейс —
+запросы к SQLite, которые он сам выполняет.
+"""
+import functools
+import inspect
+import logging
+import math
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+import perf
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)) + "}"
+
+
+class Metric:
+    """Общая часть метрик: имя, описание, имена меток и значения по наборам меток"""
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, object] = {}
+
+    def _key(self, labels: Dict[str, object]) -> LabelValues:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name}: ожидаются метки {self.labelnames}, получены {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterable[Tuple[str, LabelValues, float]]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {_escape(self.documentation)}", f"# TYPE {self.name} {self.type}"]
+        for suffix, labels, value in self.samples():
+            names = self.labelnames + (("le",) if suffix == "_bucket" else ())
+            lines.append(f"{self.name}{suffix}{_format_labels(names, labels)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    """Монотонно растущий счётчик"""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        if not self.labelnames:
+            self._values[()] = 0.0
+
+    def inc(self, amount: float = 1.0, **labels):
+        if amount < 0:
+            raise ValueError(f"{self.name}: счётчик не может уменьшаться")
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self):
+        for labels, value in self._values.items():
+            yield "", labels, value
+
+
+class Gauge(Metric):
+    """Текущее значение: может расти и уменьшаться"""
+
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        if not self.labelnames:
+            self._values[()] = 0.0
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self):
+        for labels, value in self._values.items():
+            yield "", labels, value
+
+
+class Histogram(Metric):
+    """Распределение значений по корзинам (накопительно, как в Prometheus) плюс сумма и число"""
+
+    type = "histogram"
+
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            # [число попаданий в каждую корзину (не накопительно) + «+Inf», сумма, число]
+            state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def samples(self):
+        for labels, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, hits in zip(self.buckets + (math.inf,), counts):
+                cumulative += hits
+                yield "_bucket", labels + (_format_value(bound),), cumulative
+            yield "_sum", labels, total
+            yield "_count", labels, count
+
+
+class Registry:
+    """Набор метрик процесса и их отрисовка в текстовом формате Prometheus"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = Histogram.DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# ---- Метрики бота и веб-интерфейса ---- #
+
+MESSAGES = REGISTRY.counter(
+    "teleblast_messages_total",
+    "Сообщения рассылок: sent — доставлено, retry — отложено в очередь повторов, failed — не доставлено; error — класс ошибки",
+    ("result", "error"),
+)
+DELETIONS = REGISTRY.counter(
+    "teleblast_deletions_total",
+    "Удаление сообщений рассылок: deleted — удалено, retry — отложено в очередь повторов, failed — не удалено; error — класс ошибки",
+    ("result", "error"),
+)
+API_REQUEST_SECONDS = REGISTRY.histogram(
+    "teleblast_api_request_seconds",
+    "Время одного вызова Bot API по методам",
+    ("method",),
+)
+API_REQUESTS = REGISTRY.counter(
+    "teleblast_api_requests_total",
+    "Вызовы Bot API по методам и исходу (ok или класс ошибки)",
+    ("method", "outcome"),
+)
+API_FLOOD_WAITS = REGISTRY.counter(
+    "teleblast_api_flood_waits_total",
+    "Ответы 429 Too Many Requests от Bot API",
+)
+API_RETRY_AFTER_SECONDS = REGISTRY.counter(
+    "teleblast_api_retry_after_seconds_total",
+    "Сумма пауз retry_after из ответов 429, с",
+)
+SCHEDULER_LAG_SECONDS = REGISTRY.histogram(
+    "teleblast_scheduler_lag_seconds",
+    "Опоздание запуска публикации или автоудаления относительно срока, с",
+    ("kind",),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0),
+)
+FANOUT_QUEUE_DEPTH = REGISTRY.gauge(
+    "teleblast_fanout_queue_depth",
+    "Чаты в очередях движка рассылки, ещё не взятые воркерами",
+)
+FANOUT_IN_FLIGHT = REGISTRY.gauge(
+    "teleblast_fanout_in_flight",
+    "Отправки движка рассылки, которые сейчас ждут лимита или ответа Bot API",
+)
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    "teleblast_db_query_seconds",
+    "Время выполнения методов Database (SQLite), с",
+    ("method",),
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+)
+HANDLER_SECONDS = REGISTRY.histogram(
+    "teleblast_handler_seconds",
+    "Время обработчика сообщения или нажатия кнопки по состоянию FSM, с",
+    ("state", "handler"),
+)
+
+
+def instrument_methods(cls: type, histogram: Histogram, skip: Iterable[str] = ()) -> type:
+    """Оборачивает публичные async-методы класса замером времени в histogram (метка method)"""
+    skip = set(skip)
+    for name, func in list(vars(cls).items()):
+        if name.startswith("_") or name in skip or not inspect.iscoroutinefunction(func):
+            continue
+        setattr(cls, name, _timed(func, histogram, name))
+    return cls
+
+
+def _timed(func: Callable, histogram: Histogram, name: str) -> Callable:
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - started, method=name)
+
+    return wrapper
+
+
+class ApiMetricsMiddleware:
+    """Мидлварь сессии aiogram: время и исход каждого вызова Bot API, ответы 429 и их retry_after"""
+
+    async def __call__(self, make_request, bot, method):
+        name = method.__api_method__
+        started = time.perf_counter()
+        try:
+            response = await make_request(bot, method)
+        except Exception as e:
+            retry_after = getattr(e, "retry_after", None)
+            if retry_after is not None:
+                API_FLOOD_WAITS.inc()
+                API_RETRY_AFTER_SECONDS.inc(retry_after)
+            API_REQUESTS.inc(method=name, outcome=type(e).__name__)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            API_REQUEST_SECONDS.observe(elapsed, method=name)
+            perf.note_api_call(elapsed)
+        API_REQUESTS.inc(method=name, outcome="ok")
+        return response
+
+
+def handler_name(data: Dict) -> str:
+    """Имя обработчика aiogram из данных мидлвари (модуль.функция)"""
+    handler = data.get("handler")
+    callback = getattr(handler, "callback", None)
+    if callback is None:
+        return "?"
+    module = getattr(callback, "__module__", "") or ""
+    return f"{module.rsplit('.', 1)[-1]}.{getattr(callback, '__qualname__', callback)}"
+
+
+class HandlerMetricsMiddleware:
+    """Внутренняя мидлварь диспетчера: время работы обработчика по состоянию FSM.
+
+    Заодно сообщает perf, какой обработчик обрабатывает обновление.
+    """
+
+    async def __call__(self, handler, event, data):
+        name = handler_name(data)
+        state = data.get("raw_state") or perf.NO_STATE
+        perf.attribute(name, state)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - started, state=state, handler=name)
+
+
+async def start_server(host: str, port: int, registry: Registry = REGISTRY):
+    """Поднимает HTTP-сервер с /metrics; возвращает AppRunner (остановка — runner.cleanup())"""
+    # aiohttp.web нужен, только если сервер метрик включён
+    from aiohttp import web
+
+    async def handle(request: web.Request) -> web.Response:
+        return web.Response(body=registry.render().encode(), headers={"Content-Type": CONTENT_TYPE})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Метрики: http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,255 @@
+import logging
+from typing import Awaitable, Callable, Dict, List
+
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+Migration = Callable[[aiosqlite.Connection], Awaitable[None]]
+
+
+async def _table_columns(conn: aiosqlite.Connection, table: str) -> List[str]:
+    cursor = await conn.execute(f"PRAGMA table_info({table})")
+    return [col[1] for col in await cursor.fetchall()]
+
+
+async def _add_missing_columns(conn: aiosqlite.Connection, table: str, columns: Dict[str, str]):
+    """Добавляет колонки, которых нет в таблицах, созданных старыми версиями бота"""
+    existing = await _table_columns(conn, table)
+    for name, definition in columns.items():
+        if name not in existing:
+            await conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+            logger.info(f"Колонка {table}.{name} добавлена")
+
+
+async def _add_cache_version_triggers(conn: aiosqlite.Connection, name: str, tables: List[str]):
+    """Заводит счётчик name и триггеры, увеличивающие его при изменении tables"""
+    await conn.execute("INSERT OR IGNORE INTO cache_versions(name, version) VALUES (?, 0)", (name,))
+    for table in tables:
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            await conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_{name}
+            AFTER {event} ON {table}
+            BEGIN
+                UPDATE cache_versions SET version = version + 1 WHERE name = '{name}';
+            END
+            """)
+
+
+async def _v1_base_schema(conn: aiosqlite.Connection):
+    """Исходные таблицы; базы старых версий дополняются недостающими колонками"""
+    await conn.execute("""
+    CREATE TABLE IF NOT EXISTS lists (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT UNIQUE
+    )
+    """)
+    await conn.execute("""
+    CREATE TABLE IF NOT EXISTS groups (
+        chat_id INTEGER PRIMARY KEY,
+        title TEXT
+    )
+    """)
+    await conn.execute("""
+    CREATE TABLE IF NOT EXISTS list_groups (
+        list_id INTEGER,
+        group_id INTEGER,
+        PRIMARY KEY (list_id, group_id),
+        FOREIGN KEY (list_id) REFERENCES lists(id) ON DELETE CASCADE,
+        FOREIGN KEY (group_id) REFERENCES groups(chat_id) ON DELETE CASCADE
+    )
+    """)
+    await conn.execute("""
+    CREATE TABLE IF NOT EXISTS broadcasts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        list_id INTEGER,
+        content_type TEXT,
+        content TEXT,
+        date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        scheduled_at TIMESTAMP,
+        sent INTEGER DEFAULT 0,
+        source_chat_id INTEGER,
+        source_message_id INTEGER,
+        auto_delete_at TIMESTAMP,
+        deleted INTEGER DEFAULT 0
+    )
+    """)
+    await conn.execute("""
+    CREATE TABLE IF NOT EXISTS broadcast_messages (
+        broadcast_id INTEGER,
+        chat_id INTEGER,
+        message_id INTEGER,
+        PRIMARY KEY (broadcast_id, chat_id)
+    )
+    """)
+    await conn.execute("""
+    CREATE TABLE IF NOT EXISTS admins (
+        user_id INTEGER PRIMARY KEY,
+        username TEXT,
+        first_name TEXT,
+        added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        added_by INTEGER,
+        super_admin INTEGER DEFAULT 0
+    )
+    """)
+    # Поля, появившиеся после первых релизов (раньше их добавляли _migrate_* в Database.init)
+    await _add_missing_columns(conn, "broadcasts", {
+        "deleted": "INTEGER DEFAULT 0",
+        "scheduled_at": "TIMESTAMP",
+        "sent": "INTEGER DEFAULT 0",
+        "source_chat_id": "INTEGER",
+        "source_message_id": "INTEGER",
+        "auto_delete_at": "TIMESTAMP",
+    })
+    await _add_missing_columns(conn, "admins", {"super_admin": "INTEGER DEFAULT 0"})
+
+
+async def _v2_delivery_ledger_and_retries(conn: aiosqlite.Connection):
+    """Журнал доставки по чатам и очередь повторов Bot API"""
+    await conn.execute("""
+    CREATE TABLE IF NOT EXISTS broadcast_deliveries (
+        broadcast_id INTEGER,
+        chat_id INTEGER,
+        status TEXT NOT NULL DEFAULT 'pending',
+        message_id INTEGER,
+        error TEXT,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (broadcast_id, chat_id)
+    )
+    """)
+    await conn.execute("""
+    CREATE TABLE IF NOT EXISTS pending_retries (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        action TEXT NOT NULL,
+        broadcast_id INTEGER NOT NULL,
+        chat_id INTEGER NOT NULL,
+        message_id INTEGER,
+        attempts INTEGER DEFAULT 0,
+        next_attempt_at REAL NOT NULL,
+        last_error TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE (action, broadcast_id, chat_id)
+    )
+    """)
+    await conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_pending_retries_next ON pending_retries(next_attempt_at)"
+    )
+
+
+async def _v3_hot_query_indexes(conn: aiosqlite.Connection):
+    """Индексы под запросы планировщика, дашборда и привязок групп.
+
+    Частичные индексы работают, только если WHERE запроса совпадает с
+    условием индекса буквально, поэтому в запросах database.py эти условия
+    записаны литералами, а не параметрами.
+    Проверка планов запросов: python -m pytest tests/test_query_plans.py
+    """
+    # get_due_broadcasts / get_broadcast_deadlines
+    await conn.execute("""
+    CREATE INDEX IF NOT EXISTS idx_broadcasts_due_publish ON broadcasts(scheduled_at)
+    WHERE sent = 0 AND deleted = 0 AND scheduled_at IS NOT NULL
+    """)
+    # get_due_auto_deletions / get_broadcast_deadlines
+    await conn.execute("""
+    CREATE INDEX IF NOT EXISTS idx_broadcasts_due_auto_delete ON broadcasts(auto_delete_at)
+    WHERE sent = 1 AND deleted = 0 AND auto_delete_at IS NOT NULL
+    """)
+    # Поиск сегментов группы: первичный ключ list_groups начинается с list_id
+    await conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_list_groups_group ON list_groups(group_id, list_id)"
+    )
+    # get_interrupted_broadcasts: только незавершённые доставки
+    await conn.execute("""
+    CREATE INDEX IF NOT EXISTS idx_deliveries_unfinished ON broadcast_deliveries(broadcast_id)
+    WHERE status IN ('pending', 'in_flight')
+    """)
+
+
+async def _v4_cache_versions(conn: aiosqlite.Connection):
+    """Счётчики изменений для кешей в памяти (см. Database._sync_caches).
+
+    Триггеры увеличивают счётчик при любом изменении таблицы — в том числе
+    из другого процесса (веб-интерфейс), поэтому процесс, увидевший новый
+    PRAGMA data_version, по счётчикам понимает, какой кеш устарел.
+    """
+    await conn.execute("""
+    CREATE TABLE IF NOT EXISTS cache_versions (
+        name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+    # Имя счётчика совпадает с database.CACHE_SEGMENTS
+    await _add_cache_version_triggers(conn, "segments", ["lists", "list_groups"])
+
+
+async def _v5_admin_cache_version(conn: aiosqlite.Connection):
+    """Счётчик изменений таблицы admins для кеша прав (database.CACHE_ADMINS)"""
+    await _add_cache_version_triggers(conn, "admins", ["admins"])
+
+
+async def _v6_fsm_storage(conn: aiosqlite.Connection):
+    """Состояния диалогов aiogram (fsm_storage.SQLiteStorage)"""
+    await conn.execute("""
+    CREATE TABLE IF NOT EXISTS fsm_storage (
+        key TEXT PRIMARY KEY,
+        state TEXT,
+        data TEXT,
+        updated_at REAL NOT NULL
+    )
+    """)
+    await conn.execute("CREATE INDEX IF NOT EXISTS idx_fsm_storage_updated ON fsm_storage(updated_at)")
+
+
+async def _v7_deletion_outcomes(conn: aiosqlite.Connection):
+    """Исход удаления сообщения рассылки в каждом чате (database.DELETION_*)"""
+    await _add_missing_columns(conn, "broadcast_messages", {
+        "delete_status": "TEXT",
+        "delete_error": "TEXT",
+    })
+
+
+# Порядок менять нельзя: номер миграции — её позиция в списке (считая с 1).
+# Новые изменения схемы добавляются только в конец.
+MIGRATIONS: List[Migration] = [
+    _v1_base_schema,
+    _v2_delivery_ledger_and_retries,
+    _v3_hot_query_indexes,
+    _v4_cache_versions,
+    _v5_admin_cache_version,
+    _v6_fsm_storage,
+    _v7_deletion_outcomes,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+async def get_schema_version(conn: aiosqlite.Connection) -> int:
+    cursor = await conn.execute("PRAGMA user_version")
+    row = await cursor.fetchone()
+    return row[0] if row else 0
+
+
+async def migrate(conn: aiosqlite.Connection) -> int:
+    """Применяет недостающие миграции и возвращает версию схемы.
+
+    Версия хранится в PRAGMA user_version, поэтому на актуальной базе
+    проверка стоит одного чтения PRAGMA. Все недостающие миграции
+    выполняются в одной транзакции: при ошибке база остаётся в прежней версии.
+    """
+    version = await get_schema_version(conn)
+    if version >= SCHEMA_VERSION:
+        return version
+    # IMMEDIATE сразу берёт блокировку записи: бот и веб-интерфейс,
+    # стартующие одновременно, не применят миграции дважды
+    await conn.execute("BEGIN IMMEDIATE")
+    try:
+        version = await get_schema_version(conn)
+        for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            await migration(conn)
+            logger.info(f"Миграция схемы {number} ({migration.__name__}) применена")
+        await conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        await conn.commit()
+    except BaseException:
+        await conn.rollback()
+        raise
+    return SCHEMA_VERSION
@@ -0,0 +1,172 @@
+"""
+Время обработки обновлений по обработчикам и состояниям FSM (/perf).
+
+Внешняя мидлварь на dp.update замеряет каждое обновление целиком и
+кладёт в контекст задачи UpdateTrace. Внутренняя мидлварь метрик
+(metrics.HandlerMetricsMiddleware) записывает в него сработавший
+обработчик и состояние, а Database (каждый запрос на чтение и каждая
+транзакция записи) и мидлварь сессии Bot API — число обращений и время в них. По каждой паре
+(обработчик, состояние) хранится скользящее окно длительностей для
+p50/p95/p99; обновления дольше порога пишутся в лог и в список медленных.
+"""
+import logging
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Deque, Dict, List, NamedTuple, Optional, Tuple
+
+from helpers import percentiles
+
+logger = logging.getLogger(__name__)
+
+NO_STATE = "none"
+
+
+class UpdateTrace:
+    """Что произошло при обработке одного обновления"""
+
+    __slots__ = ("handler", "state", "db_calls", "db_time", "api_calls", "api_time")
+
+    def __init__(self):
+        self.handler: Optional[str] = None
+        self.state: str = NO_STATE
+        self.db_calls = 0
+        self.db_time = 0.0
+        self.api_calls = 0
+        self.api_time = 0.0
+
+
+class SlowUpdate(NamedTuple):
+    at: datetime
+    handler: str
+    state: str
+    duration: float
+    db_calls: int
+    db_time: float
+    api_calls: int
+    api_time: float
+
+
+# Трейс текущего обновления; задачи, созданные обработчиком, наследуют его вместе с контекстом
+_current: ContextVar[Optional[UpdateTrace]] = ContextVar("update_trace", default=None)
+
+
+def attribute(handler: str, state: Optional[str]):
+    """Отмечает, какой обработчик и в каком состоянии обрабатывает текущее обновление"""
+    trace = _current.get()
+    if trace is not None:
+        trace.handler = handler
+        trace.state = state or NO_STATE
+
+
+def note_db_call(elapsed: float):
+    trace = _current.get()
+    if trace is not None:
+        trace.db_calls += 1
+        trace.db_time += elapsed
+
+
+def note_api_call(elapsed: float):
+    trace = _current.get()
+    if trace is not None:
+        trace.api_calls += 1
+        trace.api_time += elapsed
+
+
+class HandlerStats:
+    """Скользящее окно длительностей одного обработчика в одном состоянии"""
+
+    def __init__(self, window: int):
+        self.durations: Deque[float] = deque(maxlen=window)
+        self.count = 0
+        self.slow = 0
+        self.max = 0.0
+        self.db_calls = 0
+        self.api_calls = 0
+
+    def add(self, duration: float, trace: UpdateTrace, slow: bool):
+        self.durations.append(duration)
+        self.count += 1
+        self.slow += slow
+        self.max = max(self.max, duration)
+        self.db_calls += trace.db_calls
+        self.api_calls += trace.api_calls
+
+    def summary(self) -> Dict[str, float]:
+        p50, p95, p99 = percentiles(self.durations, (0.5, 0.95, 0.99))
+        return {
+            "count": self.count,
+            "p50": p50,
+            "p95": p95,
+            "p99": p99,
+            "max": self.max,
+            "slow": self.slow,
+            "db_per_update": self.db_calls / self.count if self.count else 0.0,
+            "api_per_update": self.api_calls / self.count if self.count else 0.0,
+        }
+
+
+class PerfMonitor:
+    """Внешняя мидлварь диспетчера: время обновлений по (обработчик, состояние).
+
+    Обновления, которые не дошли ни до одного обработчика (фильтры не подошли),
+    в статистику не попадают.
+    """
+
+    def __init__(self, slow_threshold: float = 1.0, window: int = 500, keep_slow: int = 20):
+        self.slow_threshold = slow_threshold
+        self.window = window
+        self.stats: Dict[Tuple[str, str], HandlerStats] = {}
+        self.slow: Deque[SlowUpdate] = deque(maxlen=keep_slow)
+        self.started_at = datetime.now()
+
+    async def __call__(self, handler, event, data):
+        trace = UpdateTrace()
+        token = _current.set(trace)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            _current.reset(token)
+            if trace.handler is not None:
+                self._record(time.perf_counter() - started, trace)
+
+    def _record(self, duration: float, trace: UpdateTrace):
+        key = (trace.handler, trace.state)
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = HandlerStats(self.window)
+        slow = duration >= self.slow_threshold
+        stats.add(duration, trace, slow)
+        if not slow:
+            return
+        self.slow.append(SlowUpdate(
+            datetime.now(), trace.handler, trace.state, duration,
+            trace.db_calls, trace.db_time, trace.api_calls, trace.api_time,
+        ))
+        logger.warning(
+            f"Медленный обработчик {trace.handler} (состояние {trace.state}): {duration * 1000:.0f} мс, "
+            f"запросов к БД {trace.db_calls} ({trace.db_time * 1000:.0f} мс), "
+            f"вызовов Bot API {trace.api_calls} ({trace.api_time * 1000:.0f} мс)",
+            extra={
+                "handler": trace.handler,
+                "state": trace.state,
+                "duration_ms": round(duration * 1000, 1),
+                "db_calls": trace.db_calls,
+                "db_ms": round(trace.db_time * 1000, 1),
+                "api_calls": trace.api_calls,
+                "api_ms": round(trace.api_time * 1000, 1),
+            },
+        )
+
+    def report(self) -> List[Tuple[str, str, Dict[str, float]]]:
+        """[(обработчик, состояние, сводка)] — самые медленные по p95 первыми"""
+        rows = [(handler, state, stats.summary()) for (handler, state), stats in self.stats.items()]
+        rows.sort(key=lambda row: -row[2]["p95"])
+        return rows
+
+    def reset(self):
+        self.stats.clear()
+        self.slow.clear()
+        self.started_at = datetime.now()
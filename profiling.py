@@ -0,0 +1,353 @@
+"""
+Профилирование работающего бота по команде (/profile, /memsnap).
+
+CpuProfiler — выборочный профиль цикла событий: пока идёт сеанс, поток
+раз в interval секунд снимает стек главного потока через
+sys._current_frames(). Вне сеанса потока нет и накладных расходов тоже.
+
+MemoryTracer — снимки tracemalloc и разница между ними: где выросла
+память с прошлого снимка и с начала трассировки. tracemalloc включается
+первым снимком и выключается командой остановки; снимки сравнивает
+отдельный процесс (python profiling.py ...), а не бот.
+"""
+import asyncio
+import linecache
+import os
+import shutil
+import sys
+import sysconfig
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+STDLIB_ROOT = sysconfig.get_paths()["stdlib"]
+
+# (файл, первая строка функции, имя функции)
+FuncKey = Tuple[str, int, str]
+
+
+def short_path(filename: str) -> str:
+    """Путь файла проекта — относительно корня, пакета — начиная с имени пакета"""
+    for marker in ("site-packages", "dist-packages"):
+        marker = os.sep + marker + os.sep
+        if marker in filename:
+            return filename.split(marker, 1)[1]
+    if filename.startswith(PROJECT_ROOT + os.sep):
+        return os.path.relpath(filename, PROJECT_ROOT)
+    if filename.startswith(STDLIB_ROOT + os.sep):
+        return os.path.relpath(filename, STDLIB_ROOT)
+    return filename
+
+
+def _is_loop_internals(code) -> bool:
+    """Кадры самого цикла событий (run_forever → _run_once → Handle._run)"""
+    return code.co_name == "_run" and code.co_filename.endswith(os.path.join("asyncio", "events.py"))
+
+
+def _is_idle(code) -> bool:
+    """Цикл ждёт событий в select/epoll — ничего не выполняет"""
+    return code.co_name == "select" and code.co_filename.endswith("selectors.py")
+
+
+class CpuProfile:
+    """Результат сеанса: число выборок и стеки (от внешнего кадра к текущему)"""
+
+    def __init__(self, started_at: datetime, interval: float):
+        self.started_at = started_at
+        self.interval = interval
+        self.duration = 0.0
+        self.samples = 0
+        self.idle = 0
+        self.stacks: Counter = Counter()
+
+    def top(self, limit: int) -> List[Tuple[FuncKey, int, int]]:
+        """[(функция, собственные выборки, выборки со вложенными вызовами)] по убыванию собственных"""
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for func in set(stack):
+                total[func] += count
+        return [(func, count, total[func]) for func, count in own.most_common(limit)]
+
+    @staticmethod
+    def format_func(func: FuncKey) -> str:
+        filename, lineno, name = func
+        return f"{name} ({short_path(filename)}:{lineno})"
+
+    def busy(self) -> int:
+        return self.samples - self.idle
+
+    def report(self, limit: int = 40) -> str:
+        busy = self.busy()
+        lines = [
+            f"Профиль цикла событий с {self.started_at:%d.%m.%Y %H:%M:%S}, {self.duration:.1f} с, "
+            f"выборка каждые {self.interval * 1000:.0f} мс",
+            f"Выборок: {self.samples}, цикл занят в {busy} ({busy / max(1, self.samples):.0%}), простаивает в {self.idle}",
+            "",
+            "Доля — от выборок, когда цикл был занят; «всего» — вместе с вложенными вызовами.",
+            f"{'собств.':>8} {'%':>6} {'всего':>8} {'%':>6}  функция",
+        ]
+        for func, own, total in self.top(limit):
+            lines.append(
+                f"{own:>8} {own / max(1, busy):>6.1%} {total:>8} {total / max(1, busy):>6.1%}  {self.format_func(func)}"
+            )
+        return "\n".join(lines) + "\n"
+
+    def collapsed(self) -> str:
+        """Стеки в формате flamegraph.pl / speedscope: «внешний;...;текущий число»"""
+        lines = []
+        for stack, count in self.stacks.most_common():
+            names = ";".join(f"{name} ({short_path(filename)})" for filename, _, name in stack)
+            lines.append(f"{names} {count}")
+        return "\n".join(lines) + "\n"
+
+
+class CpuProfiler:
+    """Выборочный профилировщик главного потока; одновременно — один сеанс"""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self._stop: Optional[asyncio.Event] = None
+
+    @property
+    def active(self) -> bool:
+        return self._stop is not None
+
+    def stop(self):
+        """Досрочно завершает текущий сеанс"""
+        if self._stop is not None:
+            self._stop.set()
+
+    async def run(self, duration: float) -> CpuProfile:
+        """Снимает профиль duration секунд (или до stop()) и возвращает его"""
+        if self.active:
+            raise RuntimeError("Профилирование уже идёт")
+        self._stop = asyncio.Event()
+        profile = CpuProfile(datetime.now(), self.interval)
+        finished = threading.Event()
+        sampler = threading.Thread(
+            target=self._sample,
+            args=(threading.get_ident(), profile, finished),
+            name="cpu-profiler",
+            daemon=True,
+        )
+        # Поток-сэмплер получает GIL, только когда главный поток его отдаёт: сам
+        # (в select — тогда выборка «простой») или по истечении switch interval
+        # (5 мс). Без уменьшения интервала куски работы короче 5 мс в профиль не попадают.
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(switch_interval, self.interval / 10))
+        started = time.monotonic()
+        sampler.start()
+        try:
+            await asyncio.wait_for(self._stop.wait(), timeout=duration)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            finished.set()
+            sys.setswitchinterval(switch_interval)
+            await asyncio.to_thread(sampler.join)
+            profile.duration = time.monotonic() - started
+            self._stop = None
+        return profile
+
+    def _sample(self, thread_id: int, profile: CpuProfile, finished: threading.Event):
+        while not finished.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            if frame is None:
+                continue
+            if _is_idle(frame.f_code):
+                profile.samples += 1
+                profile.idle += 1
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                if _is_loop_internals(code):
+                    break
+                stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                frame = frame.f_back
+            del frame
+            stack.reverse()
+            profile.samples += 1
+            profile.stacks[tuple(stack)] += 1
+
+
+def _is_excluded(filename: str) -> bool:
+    """Память самого tracemalloc и импорта модулей к делу не относится"""
+    return filename == tracemalloc.__file__ or filename == "<unknown>" or filename.startswith("<frozen importlib.")
+
+
+def _group(snapshot: tracemalloc.Snapshot, key_type: str) -> Dict[tracemalloc.Traceback, Tuple[int, int]]:
+    """{место: (байты, блоки)}; место определяется по самому свежему кадру"""
+    return {
+        stat.traceback: (stat.size, stat.count)
+        for stat in snapshot.statistics(key_type)
+        if not _is_excluded(stat.traceback[-1].filename)
+    }
+
+
+def _diff(new: Dict, old: Dict) -> List[Tuple[tracemalloc.Traceback, int, int, int]]:
+    """[(место, рост в байтах, всего байт, рост числа блоков)] по убыванию роста"""
+    rows = []
+    for key, (size, count) in new.items():
+        old_size, old_count = old.get(key, (0, 0))
+        rows.append((key, size - old_size, size, count - old_count))
+    for key, (old_size, old_count) in old.items():
+        if key not in new:
+            rows.append((key, -old_size, 0, -old_count))
+    rows.sort(key=lambda row: -row[1])
+    return rows
+
+
+def memory_report(
+    first: Tuple[str, str],
+    previous: Tuple[str, str],
+    new: Tuple[str, str],
+    title: str,
+    limit: int = 25,
+    tracebacks: int = 5,
+) -> str:
+    """Отчёт о росте памяти по файлам снимков; first, previous, new — пары (путь, время снимка)"""
+    loaded: Dict[str, tracemalloc.Snapshot] = {}
+    for path, _ in (first, previous, new):
+        if path not in loaded:
+            loaded[path] = tracemalloc.Snapshot.load(path)
+    by_line = {path: _group(snapshot, "lineno") for path, snapshot in loaded.items()}
+
+    lines = [title]
+    for caption, (base, base_at) in (("с прошлого снимка", previous), ("с начала трассировки", first)):
+        diff = _diff(by_line[new[0]], by_line[base])
+        growth = sum(row[1] for row in diff)
+        lines += ["", f"Рост {caption} ({base_at}): {_signed_mb(growth)}", f"{'рост':>11} {'всего':>10} {'блоков':>8}  строка"]
+        for key, size_diff, size, count_diff in diff[:limit]:
+            frame = key[-1]
+            lines.append(
+                f"{_signed_mb(size_diff):>11} {_mb(size):>10} {count_diff:>+8}  "
+                f"{short_path(frame.filename)}:{frame.lineno}  {linecache.getline(frame.filename, frame.lineno).strip()}"
+            )
+    # Для самых заметных мест роста — откуда их вызывали
+    lines += ["", f"Стеки {tracebacks} мест с наибольшим ростом с прошлого снимка:"]
+    stacks = _diff(_group(loaded[new[0]], "traceback"), _group(loaded[previous[0]], "traceback"))
+    for key, size_diff, _, count_diff in stacks[:tracebacks]:
+        lines.append(f"\n{_signed_mb(size_diff)} в {count_diff:+} блоках:")
+        lines.extend(key.format(most_recent_first=True, limit=12))
+    return "\n".join(lines) + "\n"
+
+
+class MemoryTracer:
+    """Снимки tracemalloc и отчёт о росте памяти между ними.
+
+    Снимки сохраняются в файлы (Snapshot.dump), а сравнивает их отдельный
+    процесс (этот же модуль как скрипт). В процессе бота группировка трасс
+    идёт в десятки раз медленнее: tracemalloc отслеживает и её собственные
+    выделения памяти, — и держала бы GIL секундами.
+    """
+
+    def __init__(self, frames: int = 25):
+        self.frames = frames
+        self.first: Optional[Tuple[str, datetime]] = None
+        self.last: Optional[Tuple[str, datetime]] = None
+        self.snapshots = 0
+        self._dir: Optional[str] = None
+        self._started_here = False
+
+    @property
+    def active(self) -> bool:
+        return self.first is not None
+
+    async def start(self) -> Tuple[int, int]:
+        """Включает трассировку и снимает исходный снимок; возвращает (текущий, пиковый) объём"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started_here = True
+        self._dir = tempfile.mkdtemp(prefix="teleblast-memsnap-")
+        self.snapshots = 1
+        self.first = self.last = await asyncio.to_thread(self._take)
+        return tracemalloc.get_traced_memory()
+
+    def stop(self):
+        """Выключает трассировку (если её включили здесь) и удаляет снимки"""
+        if self._started_here:
+            tracemalloc.stop()
+            self._started_here = False
+        if self._dir is not None:
+            shutil.rmtree(self._dir, ignore_errors=True)
+            self._dir = None
+        self.first = self.last = None
+        self.snapshots = 0
+
+    def _take(self) -> Tuple[str, datetime]:
+        taken_at = datetime.now()
+        path = os.path.join(self._dir, f"{self.snapshots:04d}.snapshot")
+        tracemalloc.take_snapshot().dump(path)
+        return path, taken_at
+
+    async def snapshot(self, limit: int = 25, tracebacks: int = 5) -> str:
+        """Новый снимок; отчёт о росте с прошлого снимка и с начала трассировки"""
+        if not self.active:
+            raise RuntimeError("Трассировка памяти не запущена")
+        previous = self.last
+        self.snapshots += 1
+        self.last = await asyncio.to_thread(self._take)
+        current, peak = tracemalloc.get_traced_memory()
+        title = (
+            f"Снимок памяти №{self.snapshots} в {self.last[1]:%d.%m.%Y %H:%M:%S}\n"
+            f"Под наблюдением tracemalloc сейчас {_mb(current)}, пик {_mb(peak)}"
+        )
+        args = [sys.executable, os.path.abspath(__file__), "--title", title, "--limit", str(limit), "--tracebacks", str(tracebacks)]
+        for path, taken_at in (self.first, previous, self.last):
+            args += [path, f"{taken_at:%H:%M:%S}"]
+        proc = await asyncio.create_subprocess_exec(*args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+        stdout, stderr = await proc.communicate()
+        if previous[0] != self.first[0]:
+            os.remove(previous[0])
+        if proc.returncode != 0:
+            raise RuntimeError(f"сравнение снимков завершилось с кодом {proc.returncode}: {stderr.decode()[-500:]}")
+        return stdout.decode()
+
+
+def _mb(size: int) -> str:
+    return f"{size / 1024 / 1024:.2f} МБ"
+
+
+def _signed_mb(size: int) -> str:
+    return f"{size / 1024 / 1024:+.2f} МБ"
+
+
+def summary_lines(profile: CpuProfile, limit: int = 5) -> List[str]:
+    """Короткая сводка профиля для подписи к файлу"""
+    busy = profile.busy()
+    lines = [f"Выборок {profile.samples} за {profile.duration:.0f} с, цикл занят {busy / max(1, profile.samples):.0%}"]
+    for func, own, _ in profile.top(limit):
+        lines.append(f"{own / max(1, busy):.0%} {CpuProfile.format_func(func)}")
+    return lines
+
+
+def profile_files(profile: CpuProfile, limit: int = 40) -> Dict[str, str]:
+    """{имя файла: содержимое} для отправки админу"""
+    stamp = profile.started_at.strftime("%Y%m%d-%H%M%S")
+    return {
+        f"profile-{stamp}.txt": profile.report(limit),
+        f"profile-{stamp}.collapsed.txt": profile.collapsed(),
+    }
+
+
+if __name__ == "__main__":
+    # Сравнение снимков памяти в отдельном процессе (его запускает MemoryTracer.snapshot)
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Отчёт о росте памяти по снимкам tracemalloc")
+    parser.add_argument("--title", default="")
+    parser.add_argument("--limit", type=int, default=25)
+    parser.add_argument("--tracebacks", type=int, default=5)
+    parser.add_argument("first", nargs=2, metavar=("ПУТЬ", "ВРЕМЯ"))
+    parser.add_argument("previous", nargs=2, metavar=("ПУТЬ", "ВРЕМЯ"))
+    parser.add_argument("new", nargs=2, metavar=("ПУТЬ", "ВРЕМЯ"))
+    cli = parser.parse_args()
+    sys.stdout.write(memory_report(tuple(cli.first), tuple(cli.previous), tuple(cli.new), cli.title, cli.limit, cli.tracebacks))
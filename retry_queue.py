@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramNotFound,
+    TelegramRetryAfter,
+    TelegramServerError,
+    TelegramUnauthorizedError,
+)
+
+from database import Database
+from logging_setup import ChatErrorSummary
+
+logger = logging.getLogger(__name__)
+
+TRANSIENT = "transient"
+PERMANENT = "permanent"
+
+# Действия, которые умеет повторять очередь
+ACTION_SEND = "send"
+ACTION_DELETE = "delete"
+
+
+def classify_error(error: BaseException) -> Tuple[str, Optional[float]]:
+    """Определяет тип ошибки Bot API и, если он известен, минимальную паузу до повтора.
+
+    Временные: 429 (retry_after), сетевые ошибки, 5xx, таймауты.
+    Постоянные: бот исключён из чата, чат/сообщение не найдены, неверный запрос.
+    """
+    if isinstance(error, TelegramRetryAfter):
+        return TRANSIENT, float(error.retry_after)
+    if isinstance(error, (TelegramNetworkError, TelegramServerError, asyncio.TimeoutError, ConnectionError)):
+        return TRANSIENT, None
+    if isinstance(error, (TelegramForbiddenError, TelegramBadRequest, TelegramNotFound, TelegramUnauthorizedError)):
+        return PERMANENT, None
+    # Неизвестные ошибки повторяем, но число попыток ограничено
+    return TRANSIENT, None
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Экспоненциальная задержка с полным джиттером: случайное число в [0, min(cap, base * 2^attempt)]"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+RetryHandler = Callable[[int, int, Optional[int]], Awaitable[None]]
+GiveUpHandler = Callable[[int, int, Optional[int], BaseException], Awaitable[None]]
+
+
+class RetryQueue:
+    """Очередь повторов неудачных вызовов Bot API.
+
+    Задания хранятся в таблице pending_retries, поэтому переживают перезапуск.
+    Обработчики регистрируются по имени действия и получают
+    (broadcast_id, chat_id, message_id); необязательный on_give_up
+    вызывается, когда задание отброшено окончательно.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        max_attempts: int,
+        base_delay: float,
+        max_delay: float,
+        batch_size: int = 100,
+        traceback_samples: int = 1,
+    ):
+        self.db = db
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.batch_size = batch_size
+        self.traceback_samples = traceback_samples
+        self._handlers: Dict[str, RetryHandler] = {}
+        self._give_up: Dict[str, GiveUpHandler] = {}
+        self._wakeup = asyncio.Event()
+        # Отброшенные в текущей пачке повторы: сводка пишется одной строкой на (действие, рассылку)
+        self._dropped: Dict[Tuple[str, int], ChatErrorSummary] = {}
+
+    def register(self, action: str, handler: RetryHandler, on_give_up: Optional[GiveUpHandler] = None):
+        self._handlers[action] = handler
+        if on_give_up:
+            self._give_up[action] = on_give_up
+
+    def _next_delay(self, attempts: int, retry_after: Optional[float]) -> float:
+        delay = backoff_delay(attempts, self.base_delay, self.max_delay)
+        if retry_after is not None:
+            # retry_after — нижняя граница, джиттер сверху разводит повторы во времени
+            delay = retry_after + delay / 4
+        return delay
+
+    async def schedule(
+        self,
+        action: str,
+        broadcast_id: int,
+        chat_id: int,
+        error: BaseException,
+        message_id: Optional[int] = None,
+        attempts: int = 0,
+    ) -> bool:
+        """Ставит неудачный вызов в очередь. Возвращает False, если ошибка постоянная."""
+        kind, retry_after = classify_error(error)
+        if kind == PERMANENT or attempts >= self.max_attempts:
+            return False
+        next_at = time.time() + self._next_delay(attempts, retry_after)
+        await self.db.add_pending_retry(action, broadcast_id, chat_id, message_id, attempts, next_at, str(error))
+        self._wakeup.set()
+        return True
+
+    async def _process(self, row):
+        retry_id, action, broadcast_id, chat_id, message_id, attempts = row
+        handler = self._handlers.get(action)
+        if handler is None:
+            logger.error(f"Retry {retry_id}: неизвестное действие {action}")
+            await self.db.delete_pending_retry(retry_id)
+            return
+        try:
+            await handler(broadcast_id, chat_id, message_id)
+        except Exception as e:
+            kind, retry_after = classify_error(e)
+            attempts += 1
+            if kind == PERMANENT or attempts >= self.max_attempts:
+                summary = self._dropped.get((action, broadcast_id))
+                if summary is None:
+                    summary = self._dropped[(action, broadcast_id)] = ChatErrorSummary(
+                        logger, f"повтор {action} отброшен", broadcast_id, traceback_samples=self.traceback_samples
+                    )
+                summary.add(chat_id, e)
+                await self.db.delete_pending_retry(retry_id)
+                give_up = self._give_up.get(action)
+                if give_up:
+                    await give_up(broadcast_id, chat_id, message_id, e)
+            else:
+                next_at = time.time() + self._next_delay(attempts, retry_after)
+                await self.db.update_pending_retry(retry_id, attempts, next_at, str(e))
+            # Пробрасываем дальше, чтобы движок рассылки учёл retry_after
+            raise
+        await self.db.delete_pending_retry(retry_id)
+
+    async def run(self, fanout):
+        """Фоновая задача: выполняет созревшие повторы через общий движок рассылки"""
+        while True:
+            try:
+                self._wakeup.clear()
+                due = await self.db.get_due_retries(time.time(), self.batch_size)
+                if due:
+                    # Ключ — chat_id, чтобы повторы соблюдали лимит на группу
+                    try:
+                        await fanout.run(due, self._process, key=lambda row: row[3])
+                    finally:
+                        for summary in self._dropped.values():
+                            summary.flush()
+                        self._dropped.clear()
+                    continue
+                next_at = await self.db.get_next_retry_time()
+                timeout = self.max_delay if next_at is None else max(0.0, next_at - time.time())
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+            except Exception as e:
+                logger.error(f"Retry queue error: {e}")
+                await asyncio.sleep(5)
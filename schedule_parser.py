@@ -0,0 +1,126 @@
+"""
+Разбор времени публикации и автоудаления, которое вводит админ.
+
+Частые формы («15.03.2026 14:30», «завтра в 10:00», «через 2 часа», «сейчас»)
+разбираются регулярными выражениями за микросекунды. Остальное уходит в
+dateparser в отдельном потоке: его первый вызов загружает данные локалей,
+а каждый следующий занимает миллисекунды, и в цикле событий это задерживало
+бы все остальные обновления. Результаты dateparser запоминаются по
+(текст, минута отсчёта).
+"""
+import asyncio
+import logging
+import re
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_NOW_RE = re.compile(r"^сейчас$")
+_DATE_RE = re.compile(r"^(\d{1,2})\.(\d{1,2})\.(\d{4})(?:\s+(?:в\s+)?(\d{1,2}):(\d{2}))?$")
+_DAY_RE = re.compile(r"^(сегодня|завтра|послезавтра)(?:\s+(?:в\s+)?(\d{1,2}):(\d{2}))?$")
+_TIME_RE = re.compile(r"^(?:в\s+)?(\d{1,2}):(\d{2})$")
+_IN_RE = re.compile(r"^через\s+(?:(\d{1,4})\s*)?(час|часа|часов|ч|минуту|минуты|минут|мин)$")
+
+_DAY_OFFSETS = {"сегодня": 0, "завтра": 1, "послезавтра": 2}
+_HOUR_UNITS = {"час", "часа", "часов", "ч"}
+# «через час», «через минуту» — без числа допустимы только эти формы
+_SINGULAR_UNITS = {"час", "минуту"}
+
+CACHE_SIZE = 512
+
+_cache: "OrderedDict[Tuple[str, datetime], Optional[datetime]]" = OrderedDict()
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def parse_datetime_fast(text: str, relative_base: datetime) -> Optional[datetime]:
+    """Разбирает частые формы ввода; None — форма не распознана (нужен dateparser).
+
+    Результат совпадает с тем, что для этих форм вернул бы dateparser.
+    """
+    text = " ".join(text.lower().split())
+    try:
+        if _NOW_RE.match(text):
+            return relative_base
+        m = _DATE_RE.match(text)
+        if m:
+            day, month, year, hour, minute = m.groups()
+            return datetime(int(year), int(month), int(day), int(hour or 0), int(minute or 0))
+        m = _DAY_RE.match(text)
+        if m:
+            day = relative_base + timedelta(days=_DAY_OFFSETS[m.group(1)])
+            if m.group(2) is None:
+                return day
+            return day.replace(hour=int(m.group(2)), minute=int(m.group(3)), second=0, microsecond=0)
+        m = _TIME_RE.match(text)
+        if m:
+            return relative_base.replace(hour=int(m.group(1)), minute=int(m.group(2)), second=0, microsecond=0)
+        m = _IN_RE.match(text)
+        if m:
+            amount, unit = m.groups()
+            if amount is None and unit not in _SINGULAR_UNITS:
+                return None
+            amount = int(amount or 1)
+            if unit in _HOUR_UNITS:
+                return relative_base + timedelta(hours=amount)
+            return relative_base + timedelta(minutes=amount)
+    except (ValueError, OverflowError):
+        # 31.02, 25:00 и т. п. — пусть решает dateparser (обычно он тоже вернёт None)
+        return None
+    return None
+
+
+def _dateparser_parse(text: str, relative_base: datetime) -> Optional[datetime]:
+    # Импорт здесь: dateparser тяжёлый и нужен только для редких форм
+    from helpers import parse_datetime_ru
+
+    return parse_datetime_ru(text, relative_base)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        # Одного потока достаточно: ввод времени редкий, зато данные
+        # локалей гарантированно загружаются один раз, без гонок
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dateparser")
+    return _executor
+
+
+async def parse_datetime(text: str, relative_base: datetime) -> Optional[datetime]:
+    """Разбирает дату/время (naive МСК), не блокируя цикл событий"""
+    result = parse_datetime_fast(text, relative_base)
+    if result is not None:
+        return result
+    # Относительные фразы считаются от начала минуты, чтобы повторный ввод
+    # того же текста в ту же минуту брался из кеша
+    key = (text.strip().lower(), relative_base.replace(second=0, microsecond=0))
+    if key in _cache:
+        _cache.move_to_end(key)
+        return _cache[key]
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(_get_executor(), _dateparser_parse, key[0], key[1])
+    _cache[key] = result
+    if len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+    return result
+
+
+async def warm_up():
+    """Загружает dateparser и данные русской локали заранее, в фоновом потоке"""
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    try:
+        await loop.run_in_executor(_get_executor(), _dateparser_parse, "через 3 дня", datetime.now())
+    except Exception as e:
+        logger.warning(f"Не удалось прогреть dateparser: {e}")
+        return
+    logger.info(f"dateparser прогрет за {loop.time() - started:.2f} с")
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,222 @@
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from zoneinfo import ZoneInfo
+
+from database import Database
+from metrics import SCHEDULER_LAG_SECONDS
+
+logger = logging.getLogger(__name__)
+
+MSK = ZoneInfo("Europe/Moscow")
+
+KIND_PUBLISH = "publish"
+KIND_AUTO_DELETE = "auto_delete"
+
+
+def parse_deadline(value) -> Optional[datetime]:
+    """Разбирает ISO-строку из broadcasts в naive datetime по МСК"""
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(value) if isinstance(value, str) else value
+    except ValueError:
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(MSK).replace(tzinfo=None)
+    return dt
+
+
+class DeadlineScheduler:
+    """Планировщик публикаций и автоудаления по точным срокам.
+
+    Ближайшие сроки хранятся в куче в памяти (загружаются из SQLite при
+    старте), и цикл спит ровно до первого из них. Изменения расписания
+    приходят через notify(broadcast_id) и будят цикл сразу. Какие рассылки
+    действительно пора обрабатывать, по-прежнему решают запросы
+    get_due_broadcasts / get_due_auto_deletions: куча отвечает только за время.
+
+    Публикация, которая упала и оставила рассылку неотправленной, повторяется
+    через publish_retry_delay секунд.
+
+    Каждая публикация и каждое автоудаление выполняются отдельной задачей,
+    одновременно — не больше max_concurrent_jobs. Лимит Bot API общий:
+    задачи отправляют сообщения через один движок рассылки.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        now: Callable[[], datetime],
+        publish: Callable[[int], Awaitable[None]],
+        auto_delete: Callable[[int], Awaitable[None]],
+        max_concurrent_jobs: int = 4,
+        resync_interval: float = 300,
+        publish_retry_delay: float = 30,
+    ):
+        self.db = db
+        self.now = now
+        self.publish = publish
+        self.auto_delete = auto_delete
+        self.resync_interval = resync_interval
+        self.publish_retry_delay = publish_retry_delay
+        self._heap: List[Tuple[datetime, str, int]] = []
+        # Актуальный срок для каждой пары (вид, рассылка); устаревшие записи кучи пропускаются
+        self._deadlines: Dict[Tuple[str, int], datetime] = {}
+        self._dirty: Set[int] = set()
+        self._wakeup = asyncio.Event()
+        self._job_slots = asyncio.Semaphore(max(1, max_concurrent_jobs))
+        # Запущенные задачи по ключу (вид, рассылка): одна и та же работа не стартует дважды
+        self._jobs: Dict[Tuple[str, int], asyncio.Task] = {}
+        # Сроки наступивших работ до их запуска: по ним считается опоздание планировщика
+        self._due_at: Dict[Tuple[str, int], datetime] = {}
+
+    @property
+    def running_jobs(self) -> List[Tuple[str, int]]:
+        return list(self._jobs)
+
+    def notify(self, broadcast_id: int):
+        """Сообщает, что сроки рассылки изменились. Можно вызывать синхронно из любых обработчиков."""
+        self._dirty.add(broadcast_id)
+        self._wakeup.set()
+
+    def _push(self, kind: str, broadcast_id: int, due: Optional[datetime]):
+        key = (kind, broadcast_id)
+        if due is None:
+            self._deadlines.pop(key, None)
+            return
+        if self._deadlines.get(key) == due:
+            return
+        self._deadlines[key] = due
+        heapq.heappush(self._heap, (due, kind, broadcast_id))
+
+    def _apply_rows(self, rows):
+        for b_id, scheduled_at, sent, deleted, auto_delete_at in rows:
+            if deleted:
+                self._push(KIND_PUBLISH, b_id, None)
+                self._push(KIND_AUTO_DELETE, b_id, None)
+                continue
+            self._push(KIND_PUBLISH, b_id, None if sent else parse_deadline(scheduled_at))
+            self._push(KIND_AUTO_DELETE, b_id, parse_deadline(auto_delete_at) if sent else None)
+
+    async def load(self):
+        """Полностью перечитывает сроки из базы"""
+        self._heap.clear()
+        self._deadlines.clear()
+        self._apply_rows(await self.db.get_broadcast_deadlines())
+
+    async def _refresh_dirty(self):
+        dirty, self._dirty = self._dirty, set()
+        for b_id in dirty:
+            rows = await self.db.get_broadcast_deadlines(b_id)
+            if rows:
+                self._apply_rows(rows)
+            else:
+                self._push(KIND_PUBLISH, b_id, None)
+                self._push(KIND_AUTO_DELETE, b_id, None)
+
+    def _pop_due(self, now: datetime) -> Set[str]:
+        kinds = set()
+        while self._heap and self._heap[0][0] <= now:
+            due, kind, b_id = heapq.heappop(self._heap)
+            if self._deadlines.get((kind, b_id)) != due:
+                continue  # срок уже изменили
+            del self._deadlines[(kind, b_id)]
+            self._due_at[(kind, b_id)] = due
+            kinds.add(kind)
+        return kinds
+
+    def next_deadline(self) -> Optional[datetime]:
+        while self._heap and self._deadlines.get((self._heap[0][1], self._heap[0][2])) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    async def _run_job(self, kind: str, broadcast_id: int, job: Callable[[int], Awaitable[None]], due: Optional[datetime]):
+        try:
+            async with self._job_slots:
+                if due is not None:
+                    # Опоздание включает и ожидание свободного слота
+                    SCHEDULER_LAG_SECONDS.observe(max(0.0, (self.now() - due).total_seconds()), kind=kind)
+                await job(broadcast_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception(f"Scheduler job {kind} for broadcast {broadcast_id} failed: {e}")
+        finally:
+            self._jobs.pop((kind, broadcast_id), None)
+        if kind == KIND_PUBLISH:
+            await self._retry_unsent(broadcast_id)
+
+    async def _retry_unsent(self, broadcast_id: int):
+        """Ставит повтор публикации, если после задачи рассылка так и не отправлена"""
+        try:
+            rows = await self.db.get_broadcast_deadlines(broadcast_id)
+        except Exception as e:
+            logger.error(f"Scheduler: cannot check broadcast {broadcast_id} after publish: {e}")
+            rows = []
+        for b_id, scheduled_at, sent, deleted, _ in rows:
+            scheduled = parse_deadline(scheduled_at)
+            if sent or deleted or scheduled is None:
+                continue
+            retry_at = self.now() + timedelta(seconds=self.publish_retry_delay)
+            logger.warning(f"Broadcast {b_id} was not sent, retrying at {retry_at:%H:%M:%S}")
+            # Срок могли перенести на более позднее время — тогда ждём его
+            self._push(KIND_PUBLISH, b_id, max(scheduled, retry_at))
+            self._wakeup.set()
+
+    def _start_job(self, kind: str, broadcast_id: int, job: Callable[[int], Awaitable[None]]):
+        key = (kind, broadcast_id)
+        due = self._due_at.pop(key, None)
+        if key in self._jobs:
+            return
+        self._jobs[key] = asyncio.create_task(self._run_job(kind, broadcast_id, job, due))
+
+    async def _dispatch(self, kinds: Set[str], now: datetime):
+        # Задачи запускаются независимо: большая рассылка не задерживает
+        # маленькую срочную и автоудаления, наступившие в ту же минуту
+        if KIND_PUBLISH in kinds:
+            for row in await self.db.get_due_broadcasts(now):
+                self._start_job(KIND_PUBLISH, row[0], self.publish)
+        if KIND_AUTO_DELETE in kinds:
+            for (b_id,) in await self.db.get_due_auto_deletions(now):
+                self._start_job(KIND_AUTO_DELETE, b_id, self.auto_delete)
+        # Сроки работ, которые запросы уже не вернули (рассылку успели отправить или удалить)
+        self._due_at.clear()
+
+    async def stop(self):
+        """Отменяет выполняющиеся задачи (при остановке бота)"""
+        tasks = list(self._jobs.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def run(self):
+        await self.load()
+        last_resync = asyncio.get_running_loop().time()
+        while True:
+            try:
+                self._wakeup.clear()
+                if asyncio.get_running_loop().time() - last_resync >= self.resync_interval:
+                    # Страховка от изменений, сделанных в обход notify (например, другим процессом)
+                    await self.load()
+                    last_resync = asyncio.get_running_loop().time()
+                if self._dirty:
+                    await self._refresh_dirty()
+                now = self.now()
+                kinds = self._pop_due(now)
+                if kinds:
+                    await self._dispatch(kinds, now)
+                    continue
+                timeout = self.resync_interval
+                deadline = self.next_deadline()
+                if deadline is not None:
+                    timeout = min(timeout, max(0.0, (deadline - now).total_seconds()))
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+            except Exception as e:
+                logger.error(f"Scheduler error: {e}")
+                await asyncio.sleep(1)
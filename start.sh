@@ -16,16 +16,7 @@ echo "📁 Рабочая директория: $(pwd)"
 echo "🔑 BOT_TOKEN: ${BOT_TOKEN:0:10}..."
 echo "👤 ADMIN_IDS: $ADMIN_IDS"
 
-# Создаем базу данных если её нет
-python -c "
-import asyncio
-from database import Database
-async def init_db():
-    db = Database('bot.db')
-    await db.init()
-    print('📊 База данных инициализирована')
-asyncio.run(init_db())
-"
+# Схему базы создаёт и обновляет сам бот при старте (migrations.py)
 
 # Запускаем основного бота
 echo "🤖 Запуск основного бота..."
@@ -0,0 +1,63 @@
+"""Состояния диалогов (FSM) админа."""
+from aiogram.fsm.state import State, StatesGroup
+
+
+class BroadcastState(StatesGroup):
+    waiting_for_message = State()
+    waiting_for_list_choice = State()
+    waiting_for_schedule_input = State()
+    waiting_for_schedule_confirm = State()
+    waiting_for_auto_delete = State()
+    waiting_for_auto_delete_confirm = State()
+
+
+class MenuState(StatesGroup):
+    main = State()
+    broadcast_wait_message = State()
+    broadcast_choose_list = State()
+    # --- new states for lists & groups ---
+    list_create_wait_name = State()
+    group_assign_select_group = State()
+    group_assign_select_list = State()
+    # --- lists menu ---
+    lists_menu = State()
+    list_delete_select_list = State()
+    group_name_wait = State() # Added for manual group naming
+    # --- group management ---
+    group_move_select_group = State()
+    group_move_select_list = State()
+    group_delete_select_group = State()
+    group_delete_confirm = State()
+    group_add_select_group = State()
+    group_add_select_list = State()
+    # --- list viewing ---
+    list_view_select_list = State()
+
+    # управление рассылками
+    broadcast_menu = State()
+    broadcast_manage_show = State()
+    broadcast_manage_edit_time = State()
+    broadcast_edit_content_wait = State()
+
+    # --- редактирование группы ---
+    edit_search = State()
+    edit_confirm = State()
+    edit_actions = State()
+    edit_add_segment = State()
+    edit_remove_segment = State()
+
+    # просмотр сегментов
+    segment_view_select_list = State()
+
+    # управление сегментами через ИИ
+    edit_ai_input = State()
+    edit_ai_confirm = State()
+
+    # управление админами
+    settings_menu = State()
+    admin_management = State()
+    admin_add_wait_user = State()
+    admin_delete_select = State()
+    admin_delete_confirm = State()
+    admin_transfer_select = State()
+    admin_transfer_confirm = State()
@@ -0,0 +1,34 @@
+import os
+import sys
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+import pytest
+
+# Модули бота лежат в корне репозитория
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+
+
+@pytest.fixture(scope="session")
+def open_db(tmp_path_factory):
+    """Открывает базу бота со всеми миграциями; без пути — новую пустую во временном каталоге.
+
+    Пул читателей выключен, чтобы запросы сразу видели незакоммиченные изменения
+    в тестах и шли через db.conn:
+
+        async with open_db() as db:
+            ...
+    """
+
+    @asynccontextmanager
+    async def open_database(path: Optional[str] = None) -> AsyncIterator[Database]:
+        db = Database(path or str(tmp_path_factory.mktemp("db") / "bot.db"), read_pool_size=0)
+        await db.init()
+        try:
+            yield db
+        finally:
+            await db.close()
+
+    return open_database
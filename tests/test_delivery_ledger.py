@@ -0,0 +1,55 @@
+import asyncio
+
+from database import DELIVERY_FAILED, DELIVERY_IN_FLIGHT, DELIVERY_SENT
+from retry_queue import ACTION_SEND
+
+
+def test_resume_skips_delivered_failed_and_retried_chats(open_db):
+    async def scenario():
+        async with open_db() as db:
+            broadcast_id = await db.record_broadcast(1, "text", "hello")
+            await db.create_delivery_ledger(broadcast_id, [10, 20, 30, 40, 50])
+            await db.mark_delivery_sent(broadcast_id, 10, 1001)
+            await db.set_delivery_status(broadcast_id, 20, DELIVERY_FAILED, "kicked")
+            await db.set_delivery_status(broadcast_id, 30, DELIVERY_IN_FLIGHT)
+            await db.add_pending_retry(ACTION_SEND, broadcast_id, 40, None, 1, 0.0, "429")
+
+            # Обрыв посреди отправки: остались 30 (в полёте) и 50 (не начат)
+            assert sorted(await db.get_undelivered_chats(broadcast_id)) == [30, 50]
+            assert await db.get_interrupted_broadcasts() == [broadcast_id]
+
+            # Повторное создание журнала при возобновлении ничего не сбрасывает
+            await db.create_delivery_ledger(broadcast_id, [10, 20, 30, 40, 50])
+            assert await db.count_deliveries(broadcast_id, DELIVERY_SENT) == 1
+            assert await db.count_deliveries(broadcast_id, DELIVERY_FAILED) == 1
+
+            await db.mark_delivery_sent(broadcast_id, 30, 1003)
+            await db.mark_delivery_sent(broadcast_id, 50, 1005)
+            assert await db.get_undelivered_chats(broadcast_id) == []
+            # Чат 40 ждёт в очереди повторов — возобновлять рассылку не нужно
+            assert await db.get_interrupted_broadcasts() == []
+
+    asyncio.run(scenario())
+
+
+def test_ledger_imports_deliveries_made_before_it(open_db):
+    async def scenario():
+        async with open_db() as db:
+            broadcast_id = await db.record_broadcast(1, "text", "hello")
+            await db.record_broadcast_message(broadcast_id, 10, 1001)
+            await db.create_delivery_ledger(broadcast_id, [10, 20])
+            assert await db.get_undelivered_chats(broadcast_id) == [20]
+            assert await db.count_deliveries(broadcast_id, DELIVERY_SENT) == 1
+
+    asyncio.run(scenario())
+
+
+def test_deleted_broadcast_is_not_resumed(open_db):
+    async def scenario():
+        async with open_db() as db:
+            broadcast_id = await db.record_broadcast(1, "text", "hello")
+            await db.create_delivery_ledger(broadcast_id, [10, 20])
+            await db.mark_broadcast_as_deleted(broadcast_id)
+            assert await db.get_interrupted_broadcasts() == []
+
+    asyncio.run(scenario())
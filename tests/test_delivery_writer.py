@@ -0,0 +1,66 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from database import DELIVERY_FAILED, DELIVERY_IN_FLIGHT, DELIVERY_SENT
+
+
+async def break_writes(db, broken: bool):
+    """Включает/выключает ошибку записи в broadcast_messages (как при нехватке места на диске)"""
+    async with db.transaction() as conn:
+        if broken:
+            await conn.execute(
+                "CREATE TRIGGER fail_writes BEFORE INSERT ON broadcast_messages BEGIN SELECT RAISE(ABORT, 'disk full'); END"
+            )
+        else:
+            await conn.execute("DROP TRIGGER fail_writes")
+
+
+def test_failed_flush_keeps_rows_for_next_flush(open_db):
+    async def scenario():
+        async with open_db() as db:
+            broadcast_id = await db.record_broadcast(1, "text", "hello")
+            await db.create_delivery_ledger(broadcast_id, [10, 20])
+            writer = db.delivery_writer(max_delay=60)
+            await writer.set_status(broadcast_id, 10, DELIVERY_IN_FLIGHT)
+            await writer.mark_sent(broadcast_id, 10, 1001)
+            await writer.set_status(broadcast_id, 20, DELIVERY_FAILED, "kicked")
+
+            await break_writes(db, True)
+            with pytest.raises(sqlite3.DatabaseError):
+                await writer.flush()
+            # Транзакция откатилась целиком, строки ждут в буфере
+            assert len(writer) == 3
+            assert sorted(await db.get_undelivered_chats(broadcast_id)) == [10, 20]
+
+            await break_writes(db, False)
+            await writer.close()
+            assert len(writer) == 0
+            assert await db.get_broadcast_messages(broadcast_id) == [(10, 1001)]
+            assert await db.count_deliveries(broadcast_id, DELIVERY_SENT) == 1
+            assert await db.count_deliveries(broadcast_id, DELIVERY_FAILED) == 1
+
+    asyncio.run(scenario())
+
+
+def test_timer_retries_failed_flush(open_db):
+    async def scenario():
+        async with open_db() as db:
+            broadcast_id = await db.record_broadcast(1, "text", "hello")
+            await db.create_delivery_ledger(broadcast_id, [10, 20])
+            await break_writes(db, True)
+            writer = db.delivery_writer(max_batch=2, max_delay=0.05)
+            await writer.mark_sent(broadcast_id, 10, 1001)
+            # Пачка заполнена: запись падает, но отправившему не мешает
+            await writer.mark_sent(broadcast_id, 20, 1002)
+            await asyncio.sleep(0.2)
+            assert len(writer) == 2
+
+            await break_writes(db, False)
+            await asyncio.sleep(0.2)
+            assert len(writer) == 0
+            assert sorted(await db.get_broadcast_messages(broadcast_id)) == [(10, 1001), (20, 1002)]
+            await writer.close()
+
+    asyncio.run(scenario())
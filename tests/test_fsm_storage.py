@@ -0,0 +1,65 @@
+import asyncio
+import time
+from datetime import date, datetime
+
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+
+from fsm_storage import SQLiteStorage
+
+KEY = StorageKey(bot_id=1, chat_id=100, user_id=100)
+
+
+def test_state_and_data_survive_restart(open_db):
+    data = {"broadcast_id": 7, "scheduled": datetime(2025, 1, 2, 10, 30), "day": date(2025, 1, 2), "groups": [1, 2]}
+
+    async def scenario():
+        async with open_db() as db:
+            storage = SQLiteStorage(db, flush_delay=60)
+            await storage.set_state(KEY, "Broadcast:waiting_time")
+            await storage.set_data(KEY, data)
+            # close() записывает изменения, не дожидаясь flush_delay
+            await storage.close()
+
+            restarted = SQLiteStorage(db)
+            state = await restarted.get_state(KEY)
+            restored = await restarted.get_data(KEY)
+            await restarted.close()
+            return state, restored
+
+    assert asyncio.run(scenario()) == ("Broadcast:waiting_time", data)
+
+
+def test_cleared_and_expired_sessions_are_removed(open_db):
+    other = StorageKey(bot_id=1, chat_id=200, user_id=200)
+
+    async def scenario():
+        async with open_db() as db:
+            storage = SQLiteStorage(db, ttl=3600)
+            await storage.set_state(KEY, "Broadcast:waiting_time")
+            await storage.set_state(other, "Broadcast:waiting_time")
+            await storage.flush()
+            await storage.set_state(KEY, None)
+            await storage.flush()
+            # Сессия, брошенная дольше ttl назад
+            await db.save_fsm_records([("1:300:300::default", "Broadcast:waiting_time", "{}", time.time() - 7200)], [])
+            await storage.close()
+
+            restarted = SQLiteStorage(db, ttl=3600)
+            await restarted.load()
+            return sorted(key for key, *_ in await db.get_fsm_records()), await restarted.get_state(KEY)
+
+    keys, state = asyncio.run(scenario())
+    assert keys == ["1:200:200::default"]
+    assert state is None
+
+
+def test_unserializable_data_fails_in_handler(open_db):
+    async def scenario():
+        async with open_db() as db:
+            storage = SQLiteStorage(db)
+            with pytest.raises(TypeError):
+                await storage.set_data(KEY, {"message": object()})
+            await storage.close()
+
+    asyncio.run(scenario())
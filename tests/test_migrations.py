@@ -0,0 +1,70 @@
+import asyncio
+import sqlite3
+
+import aiosqlite
+import pytest
+
+import migrations
+from migrations import SCHEMA_VERSION, get_schema_version, migrate
+
+
+def columns(path, table):
+    with sqlite3.connect(path) as conn:
+        return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def tables(path):
+    with sqlite3.connect(path) as conn:
+        return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def test_new_database_gets_current_schema(open_db):
+    async def scenario():
+        async with open_db() as db:
+            return db.path, await get_schema_version(db.conn)
+
+    path, version = asyncio.run(scenario())
+    assert version == SCHEMA_VERSION
+    assert {"broadcast_deliveries", "pending_retries", "cache_versions", "fsm_storage"} <= tables(path)
+    assert {"delete_status", "delete_error"} <= columns(path, "broadcast_messages")
+
+
+def test_old_database_is_upgraded_without_data_loss(tmp_path):
+    path = str(tmp_path / "bot.db")
+    # Схема первых релизов: без сроков, источника и удаления
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE broadcasts (id INTEGER PRIMARY KEY AUTOINCREMENT, list_id INTEGER, content_type TEXT, content TEXT, date TIMESTAMP)")
+        conn.execute("CREATE TABLE admins (user_id INTEGER PRIMARY KEY, username TEXT, first_name TEXT, added_at TIMESTAMP, added_by INTEGER)")
+        conn.execute("INSERT INTO broadcasts(list_id, content_type, content) VALUES (1, 'text', 'old')")
+
+    async def scenario():
+        async with aiosqlite.connect(path) as conn:
+            assert await migrate(conn) == SCHEMA_VERSION
+            # Повторный запуск на актуальной базе ничего не делает
+            assert await migrate(conn) == SCHEMA_VERSION
+            cursor = await conn.execute("SELECT content, sent, deleted FROM broadcasts")
+            return await cursor.fetchall()
+
+    assert asyncio.run(scenario()) == [("old", 0, 0)]
+    assert {"scheduled_at", "sent", "deleted", "auto_delete_at", "source_chat_id"} <= columns(path, "broadcasts")
+    assert "super_admin" in columns(path, "admins")
+
+
+def test_failed_migration_keeps_previous_version(tmp_path, monkeypatch):
+    path = str(tmp_path / "bot.db")
+
+    async def broken(conn):
+        await conn.execute("CREATE TABLE half_done (id INTEGER)")
+        raise RuntimeError("migration failed")
+
+    monkeypatch.setattr(migrations, "MIGRATIONS", migrations.MIGRATIONS + [broken])
+    monkeypatch.setattr(migrations, "SCHEMA_VERSION", SCHEMA_VERSION + 1)
+
+    async def scenario():
+        async with aiosqlite.connect(path) as conn:
+            with pytest.raises(RuntimeError):
+                await migrate(conn)
+            return await get_schema_version(conn)
+
+    assert asyncio.run(scenario()) == 0
+    assert "half_done" not in tables(path)
@@ -0,0 +1,30 @@
+import asyncio
+
+import perf
+
+
+def test_db_calls_count_queries_not_methods(open_db):
+    async def scenario():
+        async with open_db() as db:
+            await db.add_admin(1, "alice", "Alice", super_admin=1)
+            trace = perf.UpdateTrace()
+            perf._current.set(trace)
+            counts = {}
+
+            # Первое чтение загружает кеш прав, повторные его не трогают
+            await db.is_admin(1)
+            await db.is_super_admin(1)
+            await db.is_admin(2)
+            counts["cached reads"] = trace.db_calls
+
+            # Вложенные методы и чтения внутри транзакции — одно обращение
+            async with db.transaction():
+                await db.add_admin(2, "bob", "Bob")
+                await db.add_admin(3, "carol", "Carol")
+                await db.get_all_admins()
+            counts["transaction"] = trace.db_calls - counts["cached reads"]
+            return counts, trace.db_time
+
+    counts, db_time = asyncio.run(scenario())
+    assert counts == {"cached reads": 1, "transaction": 1}
+    assert db_time > 0
@@ -0,0 +1,126 @@
+"""
+Планы запросов database.py (EXPLAIN QUERY PLAN).
+
+Каждый «горячий» метод Database вызывается на временной базе, выполненные
+им SQL-запросы с параметрами перехватываются, и проверяются их планы:
+полный просмотр таблицы (SCAN) и временное B-дерево (GROUP BY, ORDER BY)
+допустимы только там, где это явно разрешено ниже. Так изменение схемы
+или запроса не сможет незаметно вернуть полные просмотры.
+
+Запуск (-s печатает планы):
+    python -m pytest tests/test_query_plans.py
+"""
+import asyncio
+import re
+from datetime import datetime
+
+import pytest
+
+from database import Database
+
+NOW = datetime(2025, 1, 1, 12, 0)
+
+# метод -> (аргументы, разрешённые SCAN, разрешён ли TEMP B-TREE).
+# SCAN разрешается по таблице/псевдониму («g») или только через конкретный
+# индекс («d:idx_...»), например просмотр частичного индекса.
+HOT_QUERIES = {
+    "get_due_broadcasts": ((NOW,), set(), False),
+    "get_due_auto_deletions": ((NOW,), set(), False),
+    "get_broadcast_deadlines": ((), set(), False),
+    # ORDER BY id DESC LIMIT читает таблицу с конца и останавливается после limit строк
+    "get_recent_broadcasts_with_message_count": ((30,), {"b"}, False),
+    "get_recent_broadcasts": ((3,), {"b"}, False),
+    "get_last_broadcast_id": ((), {"broadcasts"}, False),
+    "get_groups_in_list": ((1,), set(), False),
+    "get_groups_in_list_detailed": ((1,), set(), True),
+    "get_group_segments": ((1,), set(), True),
+    "get_group_current_list": ((1,), set(), False),
+    # Дашборд выводит все группы, поэтому просмотр groups ожидаем
+    "get_unassigned_groups": ((), {"g"}, False),
+    "get_groups_with_lists": ((), {"g"}, True),
+    # Ищет по закешированному списку сегментов: загружается он целиком
+    "get_list_by_name": (("seg",), {"lists"}, False),
+    "get_broadcast_messages": ((1,), set(), False),
+    "get_broadcast_message_count": ((1,), set(), False),
+    "get_undeleted_messages": ((1,), set(), False),
+    "count_undeleted_messages": ((1,), set(), False),
+    "get_undelivered_chats": ((1,), set(), False),
+    "count_deliveries": ((1, "sent"), set(), False),
+    "get_interrupted_broadcasts": ((), {"d:idx_deliveries_unfinished"}, False),
+    "get_due_retries": ((0.0,), set(), False),
+    # Права проверяются по кешу, который загружает таблицу admins целиком
+    "is_admin": ((1,), {"admins"}, False),
+    "is_super_admin": ((1,), {"admins"}, False),
+}
+
+SCAN_RE = re.compile(r"\bSCAN (\w+)(?: USING (?:COVERING )?INDEX (\w+))?")
+
+
+class RecordingConnection:
+    """Обёртка над соединением: запоминает выполненные запросы с параметрами"""
+
+    def __init__(self, conn):
+        self._conn = conn
+        self.queries = []
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    async def execute(self, sql, parameters=()):
+        self.queries.append((sql, parameters))
+        return await self._conn.execute(sql, parameters)
+
+
+async def explain(conn, sql, params):
+    cursor = await conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+    return [row[3] for row in await cursor.fetchall()]
+
+
+async def collect_plans(db: Database):
+    """Метод -> список планов выполненных им запросов"""
+    real_conn = db.conn
+    plans = {}
+    for method, (args, _, _) in HOT_QUERIES.items():
+        # Пустые кеши: методы с кешем тоже должны выполнить свой запрос
+        for name in list(db._caches):
+            db._invalidate_cache(name)
+        recorder = RecordingConnection(real_conn)
+        db.conn = recorder
+        try:
+            await getattr(db, method)(*args)
+        finally:
+            db.conn = real_conn
+        plans[method] = [await explain(real_conn, sql, params) for sql, params in recorder.queries]
+    return plans
+
+
+def plan_problems(plan, allowed_scans, allow_temp_btree):
+    problems = []
+    for line in plan:
+        for table, index in SCAN_RE.findall(line):
+            if table in allowed_scans or f"{table}:{index}" in allowed_scans:
+                continue
+            if not line.startswith("SCAN CONSTANT"):
+                problems.append(line)
+        if "TEMP B-TREE" in line and not allow_temp_btree:
+            problems.append(line)
+    return problems
+
+
+@pytest.fixture(scope="module")
+def plans(open_db):
+    # Без пула читателей (open_db) все запросы идут через db.conn и попадают в запись
+    async def collect():
+        async with open_db() as db:
+            return await collect_plans(db)
+
+    return asyncio.run(collect())
+
+
+@pytest.mark.parametrize("method", HOT_QUERIES)
+def test_hot_query_uses_indexes(plans, method):
+    _, allowed_scans, allow_temp_btree = HOT_QUERIES[method]
+    assert plans[method], f"{method} не выполнил ни одного запроса"
+    for plan in plans[method]:
+        print(f"{method}:\n    " + "\n    ".join(plan))
+        assert not plan_problems(plan, allowed_scans, allow_temp_btree), "\n".join(plan)
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+from aiogram.methods import CopyMessage
+
+from retry_queue import ACTION_SEND, PERMANENT, TRANSIENT, RetryQueue, backoff_delay, classify_error
+
+METHOD = CopyMessage(chat_id=1, from_chat_id=2, message_id=3)
+
+
+@pytest.mark.parametrize(
+    "error, expected",
+    [
+        (TelegramRetryAfter(method=METHOD, message="Too Many Requests", retry_after=7), (TRANSIENT, 7.0)),
+        (TelegramNetworkError(method=METHOD, message="timeout"), (TRANSIENT, None)),
+        (TelegramServerError(method=METHOD, message="Bad Gateway"), (TRANSIENT, None)),
+        (asyncio.TimeoutError(), (TRANSIENT, None)),
+        (TelegramForbiddenError(method=METHOD, message="bot was kicked"), (PERMANENT, None)),
+        (TelegramBadRequest(method=METHOD, message="chat not found"), (PERMANENT, None)),
+        # Неизвестные ошибки повторяются (число попыток ограничено)
+        (RuntimeError("boom"), (TRANSIENT, None)),
+    ],
+)
+def test_classify_error(error, expected):
+    assert classify_error(error) == expected
+
+
+def test_backoff_delay_is_bounded_by_exponent_and_cap():
+    for attempt in range(12):
+        limit = min(60.0, 2.0 * 2 ** attempt)
+        delays = [backoff_delay(attempt, base=2.0, cap=60.0) for _ in range(200)]
+        assert all(0 <= delay <= limit for delay in delays)
+    # Полный джиттер: задержки разбросаны, а не одинаковы
+    assert len({backoff_delay(5, base=2.0, cap=60.0) for _ in range(20)}) > 1
+
+
+def test_retry_after_is_lower_bound():
+    queue = RetryQueue(db=None, max_attempts=5, base_delay=2.0, max_delay=60.0)
+    for attempt in range(5):
+        assert 30.0 <= queue._next_delay(attempt, retry_after=30.0) <= 30.0 + 60.0 / 4
+
+
+def test_schedule_stores_transient_and_drops_permanent(open_db):
+    async def scenario():
+        async with open_db() as db:
+            queue = RetryQueue(db, max_attempts=3, base_delay=0.0, max_delay=0.0)
+            assert await queue.schedule(ACTION_SEND, 1, 100, TelegramServerError(method=METHOD, message="Bad Gateway"))
+            assert not await queue.schedule(ACTION_SEND, 1, 200, TelegramForbiddenError(method=METHOD, message="kicked"))
+            # Исчерпанные попытки не ставятся в очередь
+            assert not await queue.schedule(ACTION_SEND, 1, 300, RuntimeError("boom"), attempts=3)
+            due = await db.get_due_retries(float("inf"))
+            assert [(row[1], row[2], row[3]) for row in due] == [(ACTION_SEND, 1, 100)]
+
+    asyncio.run(scenario())
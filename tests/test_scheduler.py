@@ -0,0 +1,91 @@
+import asyncio
+import os
+from datetime import datetime
+
+import pytest
+from aiogram.exceptions import TelegramForbiddenError
+from aiogram.methods import CopyMessage
+
+# broadcasting берёт Bot и базу из loader, а тот — из окружения
+os.environ.setdefault("BOT_TOKEN", "123456:TEST")
+os.environ.setdefault("DATABASE_PATH", ":memory:")
+
+import broadcasting
+from database import DELIVERY_FAILED
+from retry_queue import RetryQueue
+from scheduler import DeadlineScheduler
+
+NOW = datetime(2025, 1, 1, 12, 0)
+
+
+class KickedBot:
+    """Бот, которого исключили из всех групп"""
+
+    async def copy_message(self, chat_id, from_chat_id, message_id):
+        raise TelegramForbiddenError(method=CopyMessage(chat_id=chat_id, from_chat_id=from_chat_id, message_id=message_id), message="bot was kicked")
+
+
+@pytest.mark.parametrize("groups", [[10, 20], []], ids=["all-failed", "empty-segment"])
+def test_publish_without_deliveries_is_not_retried_forever(open_db, monkeypatch, groups):
+    async def scenario():
+        async with open_db() as db:
+            await db.create_list("seg")
+            list_id = (await db.get_list_by_name("seg"))[0]
+            for chat_id in groups:
+                await db.add_group(chat_id, f"group {chat_id}")
+                await db.assign_group_to_list(chat_id, list_id)
+            broadcast_id = await db.record_broadcast(list_id, "text", "hello")
+            await db.set_broadcast_schedule(broadcast_id, datetime(2025, 1, 1, 11, 59), 1, 1)
+
+            monkeypatch.setattr(broadcasting, "db", db)
+            monkeypatch.setattr(broadcasting, "bot", KickedBot())
+            monkeypatch.setattr(broadcasting, "retry_queue", RetryQueue(db, max_attempts=3, base_delay=0, max_delay=0))
+            publishes = []
+
+            async def publish(b_id):
+                publishes.append(b_id)
+                await broadcasting.send_broadcast_by_id(b_id)
+
+            async def auto_delete(b_id):
+                pass
+
+            scheduler = DeadlineScheduler(db, now=lambda: NOW, publish=publish, auto_delete=auto_delete, publish_retry_delay=0.05)
+            db.add_schedule_listener(scheduler.notify)
+            task = asyncio.create_task(scheduler.run())
+            await asyncio.sleep(0.5)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await scheduler.stop()
+
+            deadlines = await db.get_broadcast_deadlines(broadcast_id)
+            failed = await db.count_deliveries(broadcast_id, DELIVERY_FAILED)
+            return publishes, deadlines[0][2], failed
+
+    publishes, sent, failed = asyncio.run(scenario())
+    # Одна попытка вместо повторов каждые publish_retry_delay секунд
+    assert len(publishes) == 1
+    assert sent == 1
+    assert failed == len(groups)
+
+
+def test_deleted_broadcast_leaves_the_schedule(open_db):
+    async def noop(b_id):
+        pass
+
+    async def scenario():
+        async with open_db() as db:
+            broadcast_id = await db.record_broadcast(1, "text", "hello")
+            await db.set_broadcast_schedule(broadcast_id, datetime(2025, 1, 1, 13, 0), 1, 1)
+            scheduler = DeadlineScheduler(db, now=lambda: NOW, publish=noop, auto_delete=noop)
+            db.add_schedule_listener(scheduler.notify)
+            await scheduler.load()
+            before = scheduler.next_deadline()
+
+            await db.mark_broadcast_as_deleted(broadcast_id)
+            await scheduler._refresh_dirty()
+            return before, scheduler.next_deadline()
+
+    before, after = asyncio.run(scenario())
+    assert before == datetime(2025, 1, 1, 13, 0)
+    # Без уведомления срок висел бы в куче до пересинхронизации (300 с)
+    assert after is None
@@ -0,0 +1,57 @@
+import asyncio
+import json
+
+from webhook import SECRET_HEADER, RecentUpdateIds, WebhookHandler
+
+
+def test_recent_update_ids_remembers_bounded_window():
+    recent = RecentUpdateIds(maxsize=3)
+    assert [recent.seen(i) for i in (1, 2, 3)] == [False, False, False]
+    assert recent.seen(2)
+    recent.seen(4)
+    # Самый старый id вытеснен из окна
+    assert not recent.seen(1)
+
+
+class FakeSession:
+    json_loads = staticmethod(json.loads)
+
+
+class FakeBot:
+    session = FakeSession()
+
+
+class FakeDispatcher:
+    def __init__(self):
+        self.update_ids = []
+
+    async def feed_raw_update(self, bot, update):
+        self.update_ids.append(update["update_id"])
+
+
+class FakeRequest:
+    def __init__(self, body, token="secret"):
+        self.headers = {SECRET_HEADER: token}
+        self._body = body
+
+    async def json(self, loads=json.loads):
+        return loads(self._body)
+
+
+def test_handler_drops_duplicates_and_rejects_bad_requests():
+    async def scenario():
+        dispatcher = FakeDispatcher()
+        handler = WebhookHandler(dispatcher, FakeBot(), secret_token="secret")
+        statuses = [
+            (await handler.handle(FakeRequest(json.dumps({"update_id": update_id})))).status
+            for update_id in (1, 2, 1, 3, 2)
+        ]
+        statuses.append((await handler.handle(FakeRequest(json.dumps({"update_id": 4}), token="wrong"))).status)
+        statuses.append((await handler.handle(FakeRequest("{not json"))).status)
+        await handler.drain()
+        return dispatcher.update_ids, handler.duplicates, statuses
+
+    update_ids, duplicates, statuses = asyncio.run(scenario())
+    assert update_ids == [1, 2, 3]
+    assert duplicates == 2
+    assert statuses == [200, 200, 200, 200, 200, 401, 400]
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Локальный заменитель Telegram Bot API для нагрузочных проверок рассылки.
+
+Бот направляется на него переменной TELEGRAM_API_URL, после чего рассылки,
+удаления и правки уходят сюда, а не в настоящие группы. Поддерживаются
+copyMessage, deleteMessage, editMessageText, getChat (и getMe/sendMessage/getUpdates
+для запуска бота целиком: getUpdates всегда возвращает пустой список). Сервер умеет имитировать:
+
+  * задержку ответа (--latency-ms, --jitter-ms);
+  * 429 Too Many Requests с retry_after — при превышении --max-rps
+    и случайно с долей --flood-ratio;
+  * «chat not found» и «bot was kicked» — для постоянной доли чатов
+    (--missing-ratio, --kicked-ratio): один и тот же чат всегда отвечает
+    одинаково, как настоящая удалённая группа.
+
+GET /stats возвращает счётчики ответов по методам.
+
+Запуск:
+    python tools/fake_bot_api.py --port 8081 --latency-ms 40 --kicked-ratio 0.02
+    TELEGRAM_API_URL=http://127.0.0.1:8081 python bot.py
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter, deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from aiohttp import web
+
+
+@dataclass
+class FakeApiOptions:
+    latency_ms: float = 30.0
+    jitter_ms: float = 20.0
+    max_rps: float = 0.0
+    flood_ratio: float = 0.0
+    retry_after: int = 1
+    missing_ratio: float = 0.0
+    kicked_ratio: float = 0.0
+    seed: int = 0
+
+
+class FakeBotApi:
+    def __init__(self, options: FakeApiOptions):
+        self.options = options
+        self.random = random.Random(options.seed)
+        self.stats: Counter = Counter()
+        self._recent: Deque[float] = deque()
+        self._message_ids = 1000
+        # Момент первого вызова каждого метода (time.monotonic) — для замера времени запуска бота
+        self.first_calls: Dict[str, float] = {}
+
+    def chat_fate(self, chat_id: int) -> Optional[str]:
+        """Постоянная «судьба» чата: None, 'missing' или 'kicked'"""
+        roll = random.Random(chat_id ^ self.options.seed).random()
+        if roll < self.options.missing_ratio:
+            return "missing"
+        if roll < self.options.missing_ratio + self.options.kicked_ratio:
+            return "kicked"
+        return None
+
+    def _flooded(self) -> bool:
+        now = time.monotonic()
+        if self.options.max_rps > 0:
+            while self._recent and now - self._recent[0] >= 1.0:
+                self._recent.popleft()
+            if len(self._recent) >= self.options.max_rps:
+                return True
+            self._recent.append(now)
+        return self.random.random() < self.options.flood_ratio
+
+    def _next_message_id(self) -> int:
+        self._message_ids += 1
+        return self._message_ids
+
+    def _message(self, chat_id: int, message_id: Optional[int] = None, text: Optional[str] = None) -> Dict[str, Any]:
+        message = {
+            "message_id": message_id or self._next_message_id(),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "supergroup" if chat_id < 0 else "private", "title": f"Fake {chat_id}"},
+        }
+        if text is not None:
+            message["text"] = text
+        return message
+
+    def call(self, method: str, params: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        """Результат вызова метода: (HTTP-статус, тело ответа Bot API)"""
+        if self._flooded():
+            retry_after = self.options.retry_after
+            return 429, {
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {retry_after}",
+                "parameters": {"retry_after": retry_after},
+            }
+        if method == "getMe":
+            return 200, {"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}}
+        if method == "getUpdates":
+            return 200, {"ok": True, "result": []}
+
+        chat_id = int(params.get("chat_id", 0))
+        fate = self.chat_fate(chat_id)
+        if fate == "missing":
+            return 400, {"ok": False, "error_code": 400, "description": "Bad Request: chat not found"}
+        if fate == "kicked":
+            return 403, {"ok": False, "error_code": 403, "description": "Forbidden: bot was kicked from the supergroup chat"}
+
+        if method == "copyMessage":
+            return 200, {"ok": True, "result": {"message_id": self._next_message_id()}}
+        if method == "deleteMessage":
+            return 200, {"ok": True, "result": True}
+        if method == "editMessageText":
+            return 200, {"ok": True, "result": self._message(chat_id, int(params.get("message_id", 0)), params.get("text", ""))}
+        if method == "sendMessage":
+            return 200, {"ok": True, "result": self._message(chat_id, text=params.get("text", ""))}
+        if method == "getChat":
+            return 200, {"ok": True, "result": {"id": chat_id, "type": "supergroup", "title": f"Fake {chat_id}"}}
+        return 404, {"ok": False, "error_code": 404, "description": "Not Found: method not found"}
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.first_calls.setdefault(method, time.monotonic())
+        if request.content_type == "application/json":
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+        delay = self.options.latency_ms + self.random.uniform(-1, 1) * self.options.jitter_ms
+        if method == "getUpdates":
+            # Длинный опрос: обновлений нет, отвечаем по таймауту (не дольше секунды,
+            # чтобы остановка сервера не ждала висящие запросы)
+            delay = max(delay, min(float(params.get("timeout") or 0), 1.0) * 1000)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        status, body = self.call(method, params)
+        self.stats[f"{method} {status}"] += 1
+        return web.json_response(body, status=status)
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(dict(self.stats))
+
+
+def create_app(options: FakeApiOptions) -> web.Application:
+    api = FakeBotApi(options)
+    app = web.Application()
+    app["api"] = api
+    app.router.add_post("/bot{token}/{method}", api.handle)
+    app.router.add_get("/stats", api.handle_stats)
+    return app
+
+
+async def start_server(options: FakeApiOptions, host: str = "127.0.0.1", port: int = 0) -> Tuple[web.AppRunner, str]:
+    """Запускает сервер в текущем цикле событий и возвращает (runner, базовый URL)"""
+    runner = web.AppRunner(create_app(options), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{bound_port}"
+
+
+def add_options_arguments(parser: argparse.ArgumentParser):
+    defaults = FakeApiOptions()
+    parser.add_argument("--latency-ms", type=float, default=defaults.latency_ms, help="средняя задержка ответа")
+    parser.add_argument("--jitter-ms", type=float, default=defaults.jitter_ms, help="разброс задержки (±)")
+    parser.add_argument("--max-rps", type=float, default=defaults.max_rps, help="выше этого числа запросов/с — 429 (0 — без лимита)")
+    parser.add_argument("--flood-ratio", type=float, default=defaults.flood_ratio, help="доля случайных 429")
+    parser.add_argument("--retry-after", type=int, default=defaults.retry_after, help="retry_after в ответах 429, с")
+    parser.add_argument("--missing-ratio", type=float, default=defaults.missing_ratio, help="доля чатов с «chat not found»")
+    parser.add_argument("--kicked-ratio", type=float, default=defaults.kicked_ratio, help="доля чатов с «bot was kicked»")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+
+
+def options_from_args(args: argparse.Namespace) -> FakeApiOptions:
+    return FakeApiOptions(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        max_rps=args.max_rps,
+        flood_ratio=args.flood_ratio,
+        retry_after=args.retry_after,
+        missing_ratio=args.missing_ratio,
+        kicked_ratio=args.kicked_ratio,
+        seed=args.seed,
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    add_options_arguments(parser)
+    args = parser.parse_args()
+
+    runner, url = await start_server(options_from_args(args), args.host, args.port)
+    print(f"Fake Bot API: {url} (TELEGRAM_API_URL={url}), статистика: {url}/stats")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        print(json.dumps(dict(runner.app["api"].stats), ensure_ascii=False, indent=2))
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
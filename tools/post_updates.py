@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Локальная проверка вебхука: отправляет боту синтетические обновления так,
+как это делает Telegram (POST JSON с заголовком X-Telegram-Bot-Api-Secret-Token).
+
+Часть обновлений отправляется повторно с тем же update_id (как при повторной
+доставке Telegram), плюс один запрос с неверным секретом — он должен получить 401.
+Бот при этом запускается с BOT_MODE=webhook без WEBHOOK_URL, поэтому в
+Telegram ничего не регистрируется.
+
+Запуск:
+    BOT_MODE=webhook WEBHOOK_SECRET=test python bot.py
+    python tools/post_updates.py --secret test --count 500 --concurrency 50
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+import aiohttp
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helpers import percentiles
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def make_update(update_id: int, user_id: int, text: str) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private", "first_name": "Load"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Load"},
+            "text": text,
+            **({"entities": [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]} if text.startswith("/") else {}),
+        },
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Отправка синтетических обновлений на локальный вебхук")
+    parser.add_argument("--url", default="http://127.0.0.1:8080/telegram/webhook")
+    parser.add_argument("--secret", required=True, help="значение WEBHOOK_SECRET бота")
+    parser.add_argument("--count", type=int, default=200, help="сколько разных обновлений отправить")
+    parser.add_argument("--concurrency", type=int, default=20, help="одновременных запросов")
+    parser.add_argument("--duplicates", type=float, default=0.1, help="доля обновлений, отправляемых повторно")
+    parser.add_argument("--user-id", type=int, default=1, help="id отправителя (например, id админа)")
+    parser.add_argument("--text", default="/start", help="текст сообщений")
+    parser.add_argument("--start-id", type=int, default=None, help="первый update_id (по умолчанию от времени)")
+    args = parser.parse_args()
+
+    first_id = args.start_id if args.start_id is not None else int(time.time() * 1000) % 10**9
+    updates = [make_update(first_id + i, args.user_id, args.text) for i in range(args.count)]
+    sends = updates + random.sample(updates, int(len(updates) * args.duplicates))
+    random.shuffle(sends)
+
+    statuses: Counter = Counter()
+    latencies = []
+    queue: asyncio.Queue = asyncio.Queue()
+    for update in sends:
+        queue.put_nowait(update)
+
+    async with aiohttp.ClientSession() as session:
+        async with session.post(args.url, json=updates[0], headers={SECRET_HEADER: args.secret + "-wrong"}) as resp:
+            bad_secret_status = resp.status
+
+        async def worker():
+            while not queue.empty():
+                update = queue.get_nowait()
+                started = time.perf_counter()
+                try:
+                    async with session.post(args.url, json=update, headers={SECRET_HEADER: args.secret}) as resp:
+                        await resp.read()
+                        statuses[resp.status] += 1
+                except aiohttp.ClientError as e:
+                    statuses[type(e).__name__] += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(max(1, args.concurrency))))
+        elapsed = time.perf_counter() - started
+
+    print(f"Неверный секрет: HTTP {bad_secret_status} ({'OK' if bad_secret_status == 401 else 'ожидался 401'})")
+    print(f"Отправлено запросов: {len(sends)} (уникальных update_id: {len(updates)}, повторов: {len(sends) - len(updates)})")
+    print(f"Время: {elapsed:.2f} с, {len(sends) / elapsed:.0f} запросов/с")
+    p50, p99 = percentiles(latencies, (0.5, 0.99))
+    print(f"Задержка ответа: p50 {p50 * 1000:.1f} мс, p99 {p99 * 1000:.1f} мс")
+    print("Ответы: " + ", ".join(f"{k}: {v}" for k, v in sorted(statuses.items(), key=str)))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,5 +1,5 @@
 from fastapi import FastAPI, Request, Form, status, Depends, HTTPException
-from fastapi.responses import RedirectResponse, HTMLResponse
+from fastapi.responses import RedirectResponse, HTMLResponse, Response
 from fastapi.templating import Jinja2Templates
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 import uvicorn
@@ -13,13 +13,21 @@ import secrets
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from config import DATABASE_PATH as DB_PATH_RELATIVE, WEBAPP_USERNAME, WEBAPP_PASSWORD  # Используем тот же путь БД, что и бот
+from config import SQLITE_READ_POOL_SIZE, SQLITE_BUSY_TIMEOUT_MS, SQLITE_CACHE_SIZE_KB, SQLITE_MMAP_SIZE
 DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), DB_PATH_RELATIVE)
 from database import Database
+import metrics
 from typing import List, Optional
 # Pydantic v2 supports Union directly
 from typing import Union
 
-db = Database(DB_PATH)
+db = Database(
+    DB_PATH,
+    read_pool_size=SQLITE_READ_POOL_SIZE,
+    busy_timeout_ms=SQLITE_BUSY_TIMEOUT_MS,
+    cache_size_kb=SQLITE_CACHE_SIZE_KB,
+    mmap_size=SQLITE_MMAP_SIZE,
+)
 security = HTTPBasic()
 
 def authenticate(credentials: HTTPBasicCredentials = Depends(security)):
@@ -40,7 +48,8 @@ async def lifespan(app: FastAPI):
     # Startup
     await db.init()
     yield
-    # Shutdown (если нужно)
+    # Shutdown
+    await db.close()
 
 app = FastAPI(title="TeleBlast Admin", lifespan=lifespan)
 
@@ -152,21 +161,31 @@ async def bulk_groups(request: Request, credentials: HTTPBasicCredentials = Depe
     if not chat_ids_list:
         return RedirectResponse("/", status_code=status.HTTP_302_FOUND)
 
-    if action == "assign":
-        list_id = int(form.get("list_id"))
-        for chat_id in chat_ids_list:
-            await db.assign_group_to_list(int(chat_id), list_id)
-    elif action == "unassign":
-        list_id = int(form.get("list_id"))
-        for chat_id in chat_ids_list:
-            await db.remove_group_from_list(int(chat_id), list_id)
-    elif action == "delete":
-        # Полное удаление групп из базы данных
-        for chat_id in chat_ids_list:
-            await db.delete_group(int(chat_id))
+    # Вся пачка фиксируется одним коммитом
+    async with db.transaction():
+        if action == "assign":
+            list_id = int(form.get("list_id"))
+            for chat_id in chat_ids_list:
+                await db.assign_group_to_list(int(chat_id), list_id)
+        elif action == "unassign":
+            list_id = int(form.get("list_id"))
+            for chat_id in chat_ids_list:
+                await db.remove_group_from_list(int(chat_id), list_id)
+        elif action == "delete":
+            # Полное удаление групп из базы данных
+            for chat_id in chat_ids_list:
+                await db.delete_group(int(chat_id))
 
     return RedirectResponse("/", status_code=status.HTTP_302_FOUND)
 
 
+# --- Metrics --- #
+
+@app.get("/metrics")
+async def metrics_endpoint(credentials: HTTPBasicCredentials = Depends(authenticate)):
+    """Метрики веб-интерфейса (время запросов к SQLite) в текстовом формате Prometheus"""
+    return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
 if __name__ == "__main__":
     uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True)
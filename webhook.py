@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import secrets
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set
+
+from aiogram import Bot, Dispatcher
+from aiogram.methods import TelegramMethod
+from aiogram.webhook.aiohttp_server import setup_application
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class RecentUpdateIds:
+    """Последние увиденные update_id (ограниченное окно).
+
+    Telegram повторяет доставку, если не получил ответ вовремя, поэтому
+    одно и то же обновление может прийти несколько раз.
+    """
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self._ids: "OrderedDict[int, None]" = OrderedDict()
+
+    def seen(self, update_id: int) -> bool:
+        """Возвращает True, если update_id уже был; иначе запоминает его"""
+        if update_id in self._ids:
+            return True
+        self._ids[update_id] = None
+        if len(self._ids) > self.maxsize:
+            self._ids.popitem(last=False)
+        return False
+
+
+class WebhookHandler:
+    """Приём обновлений от Telegram по HTTP.
+
+    Проверяет секретный токен, отбрасывает повторы по update_id и обрабатывает
+    обновления в фоне, одновременно — не больше max_concurrency. Когда все
+    слоты заняты, ответ Telegram задерживается до освобождения слота: так
+    нагрузка сдерживается на стороне Telegram, а не копится в памяти.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, secret_token: str, max_concurrency: int = 32, dedup_size: int = 10000):
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.secret_token = secret_token
+        self.recent = RecentUpdateIds(dedup_size)
+        self._slots = asyncio.Semaphore(max(1, max_concurrency))
+        self._tasks: Set[asyncio.Task] = set()
+        self.duplicates = 0
+
+    async def handle(self, request: web.Request) -> web.Response:
+        token = request.headers.get(SECRET_HEADER, "")
+        if not secrets.compare_digest(token, self.secret_token):
+            return web.Response(status=401, text="unauthorized")
+        try:
+            update: Dict[str, Any] = await request.json(loads=self.bot.session.json_loads)
+            update_id = int(update["update_id"])
+        except (ValueError, KeyError, TypeError):
+            return web.Response(status=400, text="bad update")
+        if self.recent.seen(update_id):
+            self.duplicates += 1
+            return web.json_response({})
+        await self._slots.acquire()
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.json_response({})
+
+    async def _process(self, update: Dict[str, Any]):
+        try:
+            result = await self.dispatcher.feed_raw_update(self.bot, update)
+            if isinstance(result, TelegramMethod):
+                await self.dispatcher.silent_call_request(self.bot, result)
+        except Exception as e:
+            logger.exception(f"Webhook update {update.get('update_id')} failed: {e}")
+        finally:
+            self._slots.release()
+
+    async def drain(self):
+        """Дожидается обработки уже принятых обновлений"""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+async def run_webhook(
+    dispatcher: Dispatcher,
+    bot: Bot,
+    host: str,
+    port: int,
+    path: str,
+    secret_token: str,
+    base_url: Optional[str] = None,
+    max_concurrency: int = 32,
+):
+    """Запускает HTTP-сервер для вебхука и работает до отмены.
+
+    Если задан base_url, вебхук регистрируется в Telegram (setWebhook);
+    без него сервер просто принимает обновления — так его проверяют
+    локально через tools/post_updates.py.
+    """
+    handler = WebhookHandler(dispatcher, bot, secret_token, max_concurrency=max_concurrency)
+    app = web.Application()
+    app.router.add_post(path, handler.handle)
+    setup_application(app, dispatcher, bot=bot)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    logger.info(f"Вебхук слушает http://{host}:{port}{path}")
+
+    if base_url:
+        await bot.set_webhook(
+            base_url.rstrip("/") + path,
+            secret_token=secret_token,
+            allowed_updates=dispatcher.resolve_used_update_types(),
+            max_connections=max_concurrency,
+        )
+        logger.info(f"Вебхук зарегистрирован в Telegram: {base_url.rstrip('/')}{path}")
+    else:
+        logger.warning("WEBHOOK_URL не задан: вебхук в Telegram не регистрируется (локальный режим)")
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await handler.drain()
+        await runner.cleanup()
+        if handler.duplicates:
+            logger.info(f"Вебхук: отброшено повторных обновлений: {handler.duplicates}")